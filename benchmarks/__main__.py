@@ -0,0 +1,70 @@
+"""
+Runs the benchmark suite and writes the results as one JSON document.
+
+    python -m benchmarks --output results/$(git rev-parse --short HEAD).json
+    python -m benchmarks --quick --suite compute,routes
+
+The document holds the run metadata (commit, Python, platform, NumPy) and the results of each
+suite: `compute` (moving-average math), `storage` (populate-db write throughput), `routes`
+(`/v1` latency through the Flask test client), `serialization` (response encoding and
+compression) and `startup` (boot time of the web app and the CLI commands). Compare two documents with
+`python -m benchmarks.compare`. `--quick` shrinks the datasets for a smoke run; only compare
+runs made with the same options.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks import compute, harness, routes, serialization, startup, storage
+
+SUITES = {
+    'compute': lambda quick, db_url: compute.run(
+        lengths=(365, 3650) if quick else compute.LENGTHS, repeat=5 if quick else 20),
+    'storage': lambda quick, db_url: storage.run(
+        db_url=db_url, pairs=2 if quick else 10, days=730 if quick else 3650, repeat=1 if quick else 3),
+    'routes': lambda quick, db_url: routes.run(
+        db_url=db_url, pairs=4 if quick else 20, days=730 if quick else 3650,
+        spans=(30, 365) if quick else routes.SPANS, requests=10 if quick else 50, repeat=2 if quick else 5),
+    'serialization': lambda quick, db_url: serialization.run(
+        spans=(365,) if quick else serialization.SPANS, repeat=5 if quick else 30),
+    'startup': lambda quick, db_url: startup.run(repeat=2 if quick else 10),
+}
+
+
+def run(suites=tuple(SUITES), quick: bool = False, db_url: str = None):
+    """
+    Runs the given suites and returns the results document.
+    """
+    results = {}
+    for name in suites:
+        print(f'running {name}...', file=sys.stderr)
+        results[name] = SUITES[name](quick, db_url)
+    return {'meta': {**harness.metadata(), 'quick': quick}, 'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suite', default=','.join(SUITES), help='Comma-separated suites to run.')
+    parser.add_argument('--quick', action='store_true', help='Small datasets and few repetitions.')
+    parser.add_argument('--db-url', default=None,
+                        help='Scratch database of the storage and routes suites (its application tables are '
+                             'dropped). Defaults to a temporary SQLite file.')
+    parser.add_argument('--output', default=None, help='File to write; prints to stdout when omitted.')
+    args = parser.parse_args()
+
+    suites = [name for name in args.suite.split(',') if name]
+    unknown = [name for name in suites if name not in SUITES]
+    if unknown:
+        parser.error(f'unknown suites: {", ".join(unknown)}')
+
+    document = json.dumps(run(suites, args.quick, args.db_url), indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(document + '\n')
+    else:
+        print(document)
+
+
+if __name__ == '__main__':
+    main()
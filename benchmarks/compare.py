@@ -0,0 +1,69 @@
+"""
+Compares two results documents of `python -m benchmarks` case by case.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.10
+
+Cases are matched by their parameters (every field that is not a measurement) and compared on
+the median. Exits with status 1 when a case got slower than `threshold` (a fraction of the base
+median), so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+METRICS = {'runs', 'median_ms', 'p95_ms', 'min_ms', 'mean_ms', 'values_per_s', 'rows_per_s', 'cpu_ms', 'bytes'}
+
+
+def case_key(suite: str, case: dict) -> str:
+    params = {name: value for name, value in case.items() if name not in METRICS}
+    return f'{suite} ' + json.dumps(params, sort_keys=True)
+
+
+def index(document: dict) -> dict:
+    return {
+        case_key(suite, case): case
+        for suite, result in document['results'].items()
+        for case in result.get('cases', [])
+    }
+
+
+def compare(base: dict, head: dict, threshold: float = 0.10):
+    """
+    Returns one row per case present in both documents, and the cases found in only one.
+    """
+    base_cases, head_cases = index(base), index(head)
+    rows = []
+    for key in base_cases.keys() & head_cases.keys():
+        before, after = base_cases[key]['median_ms'], head_cases[key]['median_ms']
+        change = (after - before) / before if before else 0.0
+        rows.append({'case': key, 'base_ms': before, 'head_ms': after, 'change': change,
+                     'regression': change > threshold})
+    rows.sort(key=lambda row: row['change'], reverse=True)
+    missing = sorted(base_cases.keys() ^ head_cases.keys())
+    return rows, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=0.10)
+    args = parser.parse_args()
+
+    with open(args.base) as file:
+        base = json.load(file)
+    with open(args.head) as file:
+        head = json.load(file)
+
+    rows, missing = compare(base, head, args.threshold)
+    print(f'base {base["meta"].get("commit")} -> head {head["meta"].get("commit")}')
+    for row in rows:
+        flag = 'REGRESSION' if row['regression'] else ''
+        print(f'{row["change"]:+8.1%}  {row["base_ms"]:10.3f} ms -> {row["head_ms"]:10.3f} ms  {row["case"]}  {flag}')
+    for key in missing:
+        print(f'     n/a  {key}')
+    sys.exit(1 if any(row['regression'] for row in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+CPU benchmark of the moving-average computations.
+
+Times `MB_API.sliding_mms` and `MB_API.mms` for every window size and series length, plus the
+multi-window paths used by the writers (`sliding_mms_multi`, and `sliding_mms_columns`, which
+runs on NumPy when it is installed).
+
+    python -m benchmarks.compute --windows 20,50,200 --lengths 365,3650,36500
+"""
+import argparse
+import json
+from typing import List
+
+from benchmarks import harness
+from mb_mms.services.mb_api.mb_api import MB_API
+
+WINDOWS = (20, 50, 200)
+LENGTHS = (365, 3650, 36500)
+
+
+def run(windows: List[int] = WINDOWS, lengths: List[int] = LENGTHS, repeat: int = 20):
+    """
+    Runs the benchmark and returns one timing per (function, window, length).
+    """
+    mb = MB_API()
+    cases = []
+    for length in lengths:
+        rates = harness.synthetic_rates(length)
+        closes, timestamps = [rate[0] for rate in rates], [rate[1] for rate in rates]
+        for window in windows:
+            if window > length:
+                continue
+            cases.append({'name': 'sliding_mms', 'window': window, 'length': length, 'values': length,
+                          **harness.measure(lambda: mb.sliding_mms(delta=window, rates=rates), repeat)})
+            cases.append({'name': 'mms', 'window': window, 'length': length, 'values': window,
+                          **harness.measure(lambda: mb.mms(rates=rates[-window:]), repeat)})
+        cases.append({'name': 'sliding_mms_multi', 'window': list(windows), 'length': length, 'values': length,
+                      **harness.measure(lambda: mb.sliding_mms_multi(deltas=list(windows), rates=rates), repeat)})
+        cases.append({'name': 'sliding_mms_columns', 'window': list(windows), 'length': length, 'values': length,
+                      **harness.measure(lambda: mb.sliding_mms_columns(deltas=list(windows), closes=closes,
+                                                                       timestamps=timestamps), repeat)})
+    for case in cases:
+        case['values_per_s'] = case['values'] / (case['median_ms'] / 1000) if case['median_ms'] else None
+    return {'benchmark': 'compute', 'cases': cases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--windows', default=','.join(map(str, WINDOWS)))
+    parser.add_argument('--lengths', default=','.join(map(str, LENGTHS)))
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    windows = [int(window) for window in args.windows.split(',')]
+    lengths = [int(length) for length in args.lengths.split(',')]
+    print(json.dumps(run(windows, lengths, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Shared helpers of the benchmark suite: timing, synthetic data and run metadata.
+"""
+import gc
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+DAY = 86400
+ORIGIN = 1262304000  # 2010-01-01
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    """
+    Returns the median, p95, min and mean of timings given in seconds, in milliseconds.
+    """
+    return {
+        'runs': len(timings),
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'min_ms': min(timings) * 1000,
+        'mean_ms': statistics.fmean(timings) * 1000,
+    }
+
+
+def measure(func: Callable[[], Any], repeat: int = 20, warmup: int = 1) -> Dict[str, float]:
+    """
+    Calls `func` `warmup` times untimed, then `repeat` times, and summarizes the timings.
+
+    The garbage collector is paused while timing, like `timeit`, so a collection triggered by an
+    earlier run does not land on an arbitrary sample.
+    """
+    for _ in range(warmup):
+        func()
+    timings = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    finally:
+        if enabled:
+            gc.enable()
+    return summarize(timings)
+
+
+def synthetic_rates(days: int, seed: int = 0, origin: int = ORIGIN) -> List[Tuple[float, int]]:
+    """
+    Returns `days` daily (close, timestamp) candles following a seeded random walk.
+    """
+    rng = random.Random(seed)
+    close, rates = 100_000.0, []
+    for day in range(days):
+        close = max(1.0, close * (1 + rng.gauss(0, 0.03)))
+        rates.append((close, origin + day * DAY))
+    return rates
+
+
+def pair_names(count: int) -> List[str]:
+    return [f'BRL{idx:05d}' for idx in range(count)]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metadata() -> Dict[str, Any]:
+    """
+    Describes the run, so results of different commits and machines can be told apart.
+    """
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'numpy': numpy_version,
+        'argv': sys.argv[1:],
+        'timestamp': int(time.time()),
+    }
+
+
+@contextmanager
+def scratch_database(db_url: str = None):
+    """
+    Points the application at a database with empty application tables for the duration of a run.
+
+    Without `db_url` a temporary SQLite file is used. A given database must be a scratch one:
+    the application tables are dropped and recreated before the run and dropped after it.
+    Yields the application engine.
+    """
+    from mb_mms.models import checkpoints, closes, indicators, leases, rolling_state, rollups  # noqa: F401
+    from mb_mms.models.pair_averages import Base
+    from mb_mms.services.cache import backends, series
+    from mb_mms.services.data import db
+    from mb_mms.services.data import pairs as pair_store
+
+    with tempfile.TemporaryDirectory() as directory:
+        previous = os.environ.get('DB_URL')
+        os.environ['DB_URL'] = db_url or f'sqlite:///{directory}/bench.db'
+        db.dispose_db_engine()
+        backends.reset_backend()
+        series.reset_series_cache()
+        engine = db.get_db_engine()
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        pair_store.reset_pair_ids()
+        try:
+            yield engine
+        finally:
+            Base.metadata.drop_all(engine)
+            db.dispose_db_engine()
+            backends.reset_backend()
+            series.reset_series_cache()
+            pair_store.reset_pair_ids()
+            if previous is None:
+                os.environ.pop('DB_URL', None)
+            else:
+                os.environ['DB_URL'] = previous
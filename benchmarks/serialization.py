@@ -0,0 +1,109 @@
+"""
+Benchmark of the JSON serialization and compression of the search responses.
+
+Encodes the rows of year-long (and longer) searches the way the routes used to, one dict per
+row through Flask's `jsonify` (`dicts+jsonify`), and through `api.serialization` with the stdlib
+encoder (`columns+stdlib`) and with orjson (`columns+orjson`, when installed). Each body is then
+compressed with every coding available. Cases report the wall time and the CPU time per
+response, and the body size.
+
+    python -m benchmarks.serialization --spans 365,1825 --repeat 50
+"""
+import argparse
+import json
+import time
+from typing import List
+from unittest.mock import patch
+
+from flask import Flask, jsonify
+
+from benchmarks import harness
+from mb_mms.api import serialization
+from mb_mms.services.data.rows import Rows
+
+SPANS = (365, 1825)
+
+
+def single_rows(days: int) -> Rows:
+    rates = harness.synthetic_rates(days)
+    return Rows(('timestamp', 'mms'), [(timestamp, close) for close, timestamp in rates])
+
+
+def batch_rows(days: int, pairs: int) -> dict:
+    res = {}
+    for idx, pair in enumerate(harness.pair_names(pairs)):
+        rates = harness.synthetic_rates(days, seed=idx)
+        res[pair] = Rows(('timestamp', 'mms_20', 'mms_50', 'mms_200'),
+                         [(timestamp, close, close * 1.01, close * 0.99) for close, timestamp in rates])
+    return res
+
+
+def cpu_ms(func, repeat: int) -> float:
+    # Process time of one call, averaged: the work a worker spends on the response
+    started = time.process_time()
+    for _ in range(repeat):
+        func()
+    return (time.process_time() - started) / repeat * 1000
+
+
+def encoders(app: Flask):
+    def dicts(value):
+        # What the routes did before: one dict per row, then `jsonify`
+        if isinstance(value, Rows):
+            value = [dict(zip(value.columns, row)) for row in value.tuples]
+        else:
+            value = {key: [dict(zip(rows.columns, row)) for row in rows.tuples] for key, rows in value.items()}
+        with app.app_context():
+            return jsonify(value).get_data()
+
+    def stdlib(value):
+        with patch.object(serialization, 'orjson', None):
+            return serialization.dumps(value)
+
+    yield 'dicts+jsonify', dicts
+    yield 'columns+stdlib', stdlib
+    if serialization.orjson is not None:
+        yield 'columns+orjson', serialization.dumps
+
+
+def run(spans: List[int] = SPANS, pairs: int = 5, repeat: int = 30):
+    """
+    Runs the benchmark and returns the cost of each (shape, span, encoder) and (shape, span, coding).
+    """
+    app = Flask(__name__)
+    cases = []
+    for span in spans:
+        for shape, value in (('single', single_rows(span)), ('batch', batch_rows(span, pairs))):
+            body = None
+            for name, encode in encoders(app):
+                body = encode(value)
+                cases.append({'shape': shape, 'span_days': span, 'encoder': name, 'bytes': len(body),
+                              'cpu_ms': cpu_ms(lambda: encode(value), repeat),
+                              **harness.measure(lambda: encode(value), repeat=repeat)})
+            for coding in serialization.ENCODINGS:
+                compressed = serialization.compress(body, coding)
+                cases.append({'shape': shape, 'span_days': span, 'coding': coding, 'bytes': len(compressed),
+                              'cpu_ms': cpu_ms(lambda: serialization.compress(body, coding), repeat),
+                              **harness.measure(lambda: serialization.compress(body, coding), repeat=repeat)})
+
+    return {
+        'benchmark': 'serialization',
+        'orjson': serialization.orjson is not None,
+        'encodings': list(serialization.ENCODINGS),
+        'batch_pairs': pairs,
+        'cases': cases,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--spans', default=','.join(map(str, SPANS)), help='Range lengths in days.')
+    parser.add_argument('--pairs', type=int, default=5, help='Pairs of the batch responses.')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+    spans = [int(span) for span in args.spans.split(',')]
+    print(json.dumps(run(spans, args.pairs, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Load test of the sync (gunicorn + Flask) and async (uvicorn + mb_mms.asgi) serving modes.
+
+Drives keep-alive HTTP/1.1 clients against each server for a fixed duration and reports the
+requests/sec and latency percentiles of the same `/v1/<pair>/mms` query. The servers share the
+database in `DB_URL`, which should already hold the pair's moving averages.
+
+    # against servers started by hand
+    python -m benchmarks.serving --sync-url http://127.0.0.1:8000 --async-url http://127.0.0.1:8001
+
+    # or let the benchmark start them with the same number of workers
+    python -m benchmarks.serving --spawn --workers 4 --concurrency 256
+
+`--path` sets the request (default: a one-year 20-day MMS search of BRLBTC). Set
+`MMS_CACHE_SIZE=0` in the servers' environment to measure database round trips, not cache hits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.harness import percentile
+
+DEFAULT_PATH = '/v1/BRLBTC/mms?precision=20d&from=1577836800&to=1609459200'
+
+
+class ServerClosed(ConnectionError):
+    """
+    The server closed the connection before answering.
+    """
+
+
+async def _read_response(reader):
+    """
+    Reads one response and returns its status and whether the server keeps the connection open.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ServerClosed('connection closed')
+    status = int(status_line.split()[1])
+    length, keep_alive = None, True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection':
+            keep_alive = value.strip().lower() != 'close'
+    if length is None:
+        raise ConnectionError('response without content-length')
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _client(host, port, request, deadline, latencies, errors):
+    reader = writer = None
+    reused = False
+    while time.perf_counter() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+                reused = False
+            start = time.perf_counter()
+            writer.write(request)
+            status, keep_alive = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+            reused = True
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (ConnectionError, OSError, asyncio.IncompleteReadError) as err:
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            # An idle keep-alive connection the server dropped is retried, not counted
+            if not (reused and isinstance(err, ServerClosed)):
+                errors[type(err).__name__] = errors.get(type(err).__name__, 0) + 1
+    if writer is not None:
+        writer.close()
+
+
+async def _load(url: str, path: str, concurrency: int, duration: float):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    request = f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: keep-alive\r\n\r\n'.encode()
+    latencies, errors = [], {}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*[_client(host, port, request, deadline, latencies, errors) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'rps': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'errors': errors,
+    }
+
+
+def load(url: str, path: str = DEFAULT_PATH, concurrency: int = 64, duration: float = 10.0):
+    """
+    Runs `concurrency` keep-alive clients against `url` for `duration` seconds and returns the stats.
+    """
+    return asyncio.run(_load(url, path, concurrency, duration))
+
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f'nothing listening on port {port}')
+
+
+def spawn(workers: int, sync_port: int, async_port: int):
+    """
+    Starts gunicorn and uvicorn with the same number of workers and returns the processes.
+    """
+    env = dict(os.environ)
+    commands = [
+        [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{sync_port}', 'mb_mms.wsgi:app'],
+        [sys.executable, '-m', 'uvicorn', 'mb_mms.asgi:app', '--workers', str(workers),
+         '--port', str(async_port), '--no-access-log'],
+    ]
+    processes = [subprocess.Popen(command, env=env) for command in commands]
+    for port in (sync_port, async_port):
+        wait_for_port(port)
+    return processes
+
+
+def run(sync_url: str, async_url: str, path: str = DEFAULT_PATH, concurrency: int = 64, duration: float = 10.0):
+    """
+    Loads both servers with the same request and returns their stats side by side.
+    """
+    sync_stats = load(sync_url, path, concurrency, duration)
+    async_stats = load(async_url, path, concurrency, duration)
+    return {
+        'benchmark': 'serving',
+        'path': path,
+        'concurrency': concurrency,
+        'duration_s': duration,
+        'sync': sync_stats,
+        'async': async_stats,
+        'rps_ratio': async_stats['rps'] / sync_stats['rps'] if sync_stats['rps'] else None,
+        'p99_ratio': async_stats['p99_ms'] / sync_stats['p99_ms'] if sync_stats['p99_ms'] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--async-url', default='http://127.0.0.1:8001')
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--spawn', action='store_true', help='Start gunicorn and uvicorn on the url ports.')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    processes = []
+    if args.spawn:
+        processes = spawn(args.workers, urlsplit(args.sync_url).port, urlsplit(args.async_url).port)
+    try:
+        print(json.dumps(run(args.sync_url, args.async_url, args.path, args.concurrency, args.duration), indent=2))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Startup-time benchmark of the web app and the CLI entry points.
+
+Times fresh interpreters (so nothing is already imported) that:
+    - import `mb_mms.wsgi` (what a gunicorn worker does at boot), with the default lazy
+      imports and with `MMS_PRELOAD`, which imports the services during boot like it used to;
+    - import `mb_mms.wsgi` and serve a first search, which pays for the deferred imports;
+    - run `flask --help` and `flask <command> --help` for each CLI command.
+
+    python -m benchmarks.startup --repeat 10
+
+Every process gets a temporary SQLite `DB_URL` and no `SCHEDULER_ENABLED`; none of them opens
+a connection.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks import harness
+from mb_mms import COMMANDS
+
+FIRST_REQUEST = 'import mb_mms.wsgi; mb_mms.wsgi.app.test_client().get("/v1/BRLBTC/mms?precision=20d")'
+
+
+def entry_points() -> Dict[str, List[str]]:
+    python, flask = [sys.executable, '-c'], [sys.executable, '-m', 'flask', '--app', 'mb_mms.wsgi']
+    points = {
+        'wsgi.app': python + ['import mb_mms.wsgi'],
+        'wsgi.app preload': python + ['import os; os.environ["MMS_PRELOAD"] = "1"; import mb_mms.wsgi'],
+        'wsgi.app first request': python + [FIRST_REQUEST],
+        'flask --help': flask + ['--help'],
+    }
+    for name in COMMANDS:
+        points[f'flask {name} --help'] = flask + [name, '--help']
+    return points
+
+
+def time_process(argv: List[str], env: Dict[str, str]) -> float:
+    started = time.perf_counter()
+    subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - started
+
+
+def run(repeat: int = 10, points: List[str] = None):
+    """
+    Runs every entry point `repeat` times, after one untimed run, and returns their wall times.
+    """
+    available = entry_points()
+    cases = []
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, 'DB_URL': f'sqlite:///{directory}/startup.db'}
+        env.pop('SCHEDULER_ENABLED', None)
+        env.pop('MMS_PRELOAD', None)
+        for name in points or available:
+            argv = available[name]
+            time_process(argv, env)
+            timings = [time_process(argv, env) for _ in range(repeat)]
+            cases.append({'entry_point': name, **harness.summarize(timings)})
+    return {'benchmark': 'startup', 'cases': cases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--points', default=None, help=f'Comma-separated entry points, of: {", ".join(entry_points())}.')
+    args = parser.parse_args()
+    points = args.points.split(',') if args.points else None
+    print(json.dumps(run(args.repeat, points), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,61 @@
+import importlib
+import os
+import threading
+import time
+
 from flask import Flask
 from dotenv import load_dotenv
 
+from mb_mms.cli import LazyCommand
+
+COMMANDS = {
+    'init-db': 'mb_mms.services.data.commands:init_db_command',
+    'rebuild-rollups': 'mb_mms.services.data.commands:rebuild_rollups_command',
+    'populate-db': 'mb_mms.services.mb_api.commands:populate_db',
+    'backfill': 'mb_mms.services.mb_api.commands:backfill',
+    'run-jobs': 'mb_mms.services.job.commands:run_jobs',
+}
+
+# Imported by `create_app` when `MMS_PRELOAD` is set, instead of on the first request that needs them
+PRELOAD = (
+    'mb_mms.api.conditional',
+    'mb_mms.services.cache.backends',
+    'mb_mms.services.data.db',
+    'mb_mms.services.mb_api.mb_api',
+)
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def start_scheduler(scheduler, wait: float = 1.0, max_wait: float = 60.0) -> None:
+    """
+    Starts an APScheduler, retrying with exponential backoff until its job store reaches the database.
+    """
+    while True:
+        try:
+            scheduler.start()
+            return
+        except Exception as err:
+            print(f'scheduler start failed, retrying in {wait:.0f}s: ', err)
+            time.sleep(wait)
+            wait = min(wait * 2, max_wait)
+
 
 def create_app():
+    """
+    Builds the Flask app without importing the services or connecting to anything.
+
+    The routes import the services on their first request and every CLI command is imported when
+    it runs (`LazyCommand`), so booting a worker or starting `flask init-db` only pays for what it
+    uses, and boot does not fail while the database is down: connections are opened on first use.
+
+    Settings:
+        - `MMS_PRELOAD`: Import the services during boot instead (default false), e.g. under
+          `gunicorn --preload` so the workers share them and no request pays for the imports.
+        - `SCHEDULER_ENABLED`: Run the scheduled jobs in this process (default false).
+    """
     load_dotenv()
 
     app = Flask(__name__)
@@ -10,16 +63,20 @@ def create_app():
     from mb_mms.api.routes import currency_bp
     app.register_blueprint(currency_bp)
 
+    for name, import_name in COMMANDS.items():
+        app.cli.add_command(LazyCommand(name, import_name))
 
-    from mb_mms.services.data import commands as db_commands
-    app.cli.add_command(db_commands.init_db_command)
-
-    from mb_mms.services.mb_api import commands as mb_commads
-    app.cli.add_command(mb_commads.populate_db)
+    if _env_bool('MMS_PRELOAD'):
+        for module in PRELOAD:
+            importlib.import_module(module)
 
-    from mb_mms.services.job.scheduler import Scheduler
-    app.config['SCHEDULER_API_ENABLED'] = True
-    s = Scheduler(app)
-    s.scheduler.start()
+    # The jobs run in the `run-jobs` process; starting the scheduler in every web worker
+    # duplicates them, so it is only kept for single-process deployments
+    if _env_bool('SCHEDULER_ENABLED'):
+        from mb_mms.services.job.scheduler import Scheduler
+        app.config['SCHEDULER_API_ENABLED'] = True
+        s = Scheduler(app)
+        # Starting creates the job store table, which needs the database
+        threading.Thread(target=start_scheduler, args=(s.scheduler,), name='scheduler-start', daemon=True).start()
 
     return app
@@ -0,0 +1,106 @@
+"""
+Validators and caching headers of the `/<pair>/mms` responses.
+
+A search answers with the same body for as long as the stored moving averages of the pair do
+not change. Writers do not only append days: backfills fill older ranges and indicators and
+rollups are rewritten. Every writer calls `backends.invalidate_pair`, which bumps the write
+generation of the pair, so the ETag of a search is derived from its parameters and that
+generation, known without running the search: a matching `If-None-Match` is answered with a 304
+straight away.
+
+With the shared backend (`MMS_CACHE_BACKEND=shared`) every process sees the same generation, so
+an ETag changes as soon as a writer commits. The memory backend only sees the writes of its own
+process; the nightly writes run in `run-jobs`, so a web worker's generation just rolls over every
+`MMS_CACHE_TTL`. A body cached late in one period is then still served, and confirmed by 304s,
+under the ETag of the next one: responses may be up to twice `MMS_CACHE_TTL` stale.
+
+Stored SMA ranges that end before today and whose whole look-back lies inside the stored span
+of the pair, with no missing day in it, can no longer change, so they are sent with a long-lived
+`Cache-Control` for clients and CDNs; any other range must be revalidated. EMA and WMA values
+depend on every older close, so a backfill before the span rewrites them all.
+"""
+import hashlib
+import os
+import time
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from werkzeug.http import parse_etags, quote_etag
+
+from mb_mms.services.data import rollups
+from mb_mms.services.mb_api import indicators
+
+DAY = 86400
+
+
+def today_start() -> int:
+    """
+    Returns the start of the current day, in the local time `routes.default_end` uses.
+    """
+    return int(time.mktime(date.today().timetuple()))
+
+
+def etag(params: Dict[str, Any], generation: str) -> str:
+    """
+    Returns the weak ETag of a search, from its `search_params` and the write generation of the pair.
+
+    The ETag is weak since the gzip and brotli encodings of the body share it.
+    """
+    key = repr((sorted(params.items()), generation)).encode()
+    return quote_etag(hashlib.blake2b(key, digest_size=12).hexdigest(), weak=True)
+
+
+def not_modified(if_none_match: Optional[str], tag: Optional[str]) -> bool:
+    """
+    Tells whether an `If-None-Match` header matches the ETag, with the weak comparison of RFC 9110.
+    """
+    if not if_none_match or tag is None:
+        return False
+    return parse_etags(if_none_match).contains_weak(tag.removeprefix('W/').strip('"'))
+
+
+def is_historical(params: Dict[str, Any], span: Optional[Tuple[int, int, int]], today: Optional[int] = None) -> bool:
+    """
+    Tells whether the values of the search can no longer change.
+
+    Only the stored SMA windows qualify: their value on a day depends on the `precision` days
+    up to it, so the range is settled when that look-back of `start` and the whole range lie
+    inside the stored span. `span` is the (first, last, count) of the days stored for the pair,
+    as `MB_API.stored_span` returns it; a backfill may still write the days before `first` or
+    inside a gap, so no day of the span may be missing. A rollup depends on the whole buckets
+    holding `start` and `end`, which may run past them.
+    """
+    if span is None or params.get('indicator', indicators.SMA.name) != indicators.SMA.name:
+        return False
+    if params['precision'] not in rollups.WINDOWS:
+        return False
+    first, last, count = span
+    if count != (last - first) // DAY + 1:
+        return False
+    if today is None:
+        today = today_start()
+    start, end = params['start'], params['end']
+    if params.get('resolution', rollups.DAILY) != rollups.DAILY:
+        start = rollups.bucket_start(start, params['resolution'])
+        end = rollups.bucket_end(end, params['resolution']) - DAY
+    return end < today and first + (params['precision'] - 1) * DAY <= start and end < last + DAY
+
+
+def validators(params: Dict[str, Any], generation: Optional[str], span: Optional[Tuple[int, int, int]],
+               today: Optional[int] = None) -> Dict[str, str]:
+    """
+    Returns the `ETag` and `Cache-Control` headers of a search, sent with its 200 and 304 responses.
+
+    No ETag is sent when the write generation cannot be read (the shared cache is down), so the
+    response is never validated against a generation that may be stale.
+
+    Settings:
+        - `MMS_HISTORY_MAX_AGE`: Seconds historical ranges may be cached for (default 31536000, a year).
+    """
+    if is_historical(params, span, today):
+        control = f'public, max-age={int(os.getenv("MMS_HISTORY_MAX_AGE", "31536000"))}, immutable'
+    else:
+        control = 'public, no-cache'
+    if generation is None:
+        return {'Cache-Control': control}
+    return {'ETag': etag(params, generation), 'Cache-Control': control}
@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import math
+from array import array
+from typing import Iterable, Iterator, Optional, Tuple
+
+COLUMNS = ('timestamp', 'mms_20', 'mms_50', 'mms_200')
+CHUNK_ROWS = 500
+
+Row = Tuple[int, Optional[float], Optional[float], Optional[float]]
+
+
+def _chunked(rows: Iterable[Row], encode) -> Iterator[str]:
+    # Group encoded rows so the server writes a few large chunks instead of one per row
+    buffer = []
+    for row in rows:
+        buffer.append(encode(row))
+        if len(buffer) >= CHUNK_ROWS:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson(rows: Iterable[Row]) -> Iterator[str]:
+    """
+    Encodes rows as newline-delimited JSON objects.
+    """
+    return _chunked(rows, lambda row: json.dumps(dict(zip(COLUMNS, row)), separators=(',', ':')) + '\n')
+
+
+def csv_rows(rows: Iterable[Row]) -> Iterator[str]:
+    """
+    Encodes rows as CSV with a header line; missing averages are empty fields.
+    """
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+
+    def encode(row):
+        out.seek(0)
+        out.truncate()
+        writer.writerow(['' if value is None else repr(value) for value in row])
+        return out.getvalue()
+
+    yield ','.join(COLUMNS) + '\n'
+    yield from _chunked(rows, encode)
+
+
+def columnar(rows: Iterable[Row]) -> Iterator[str]:
+    """
+    Encodes rows as one JSON object holding an array per column.
+
+    The columns are collected into typed arrays (8 bytes per value, NaN for missing averages)
+    before being written, which is far more compact than keeping a dict per row.
+    """
+    timestamps = array('q')
+    values = {column: array('d') for column in COLUMNS[1:]}
+    for row in rows:
+        timestamps.append(row[0])
+        for column, value in zip(COLUMNS[1:], row[1:]):
+            values[column].append(math.nan if value is None else value)
+
+    def encode(items, fmt):
+        for offset in range(0, len(items), CHUNK_ROWS):
+            yield ','.join(fmt(item) for item in items[offset:offset + CHUNK_ROWS])
+            if offset + CHUNK_ROWS < len(items):
+                yield ','
+
+    yield '{"timestamp":['
+    yield from encode(timestamps, str)
+    yield ']'
+    for column in COLUMNS[1:]:
+        yield f',"{column}":['
+        yield from encode(values[column], lambda value: 'null' if math.isnan(value) else repr(value))
+        yield ']'
+    yield '}'
+
+
+FORMATS = {
+    'ndjson': (ndjson, 'application/x-ndjson'),
+    'csv': (csv_rows, 'text/csv'),
+    'columnar': (columnar, 'application/json'),
+}
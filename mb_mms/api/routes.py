@@ -1,39 +1,199 @@
 from http import HTTPStatus
+import itertools
 import time
 from datetime import datetime, timedelta
-from flask import jsonify
-from mb_mms.services.mb_api import mb_api
+from flask import Response, g, jsonify
+from mb_mms.services.metrics import instruments, profiler
+from mb_mms.services.metrics.registry import CONTENT_TYPE, REGISTRY
 from . import currency_bp
+from . import export as export_formats
+from . import serialization
 from flask import request
 
+# The services (SQLAlchemy, requests, NumPy) are imported by the views on their first request,
+# so registering the blueprint, e.g. to run a CLI command, does not load them
+
+def default_end():
+    default = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    return int(time.mktime(datetime.strptime(default, "%Y-%m-%d").timetuple()))
+
+
+@currency_bp.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    g.profile = profiler.get_profiler().start()
+
+
+@currency_bp.after_request
+def record_request(response):
+    # Streamed responses (exports) are timed up to their first chunk
+    instruments.REQUEST_SECONDS.observe(
+        time.perf_counter() - g.request_start, request.endpoint or 'unknown', str(response.status_code)
+    )
+    return response
+
+
+@currency_bp.teardown_request
+def stop_profile(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        instruments.PROFILES.inc()
+        profiler.get_profiler().stop(profile, request.endpoint or 'unknown')
+
+
+def render(res, headers=None):
+    with instruments.SERIALIZATION_SECONDS.time(request.endpoint):
+        body, encoding = serialization.encode(res, request.headers.get('Accept-Encoding'))
+    return Response(body, mimetype=serialization.JSON, headers={**(headers or {}), **encoding})
+
+
 @currency_bp.route('/', methods=['GET'])
 def root():
     return '<p>Currency MMS initial page!</p>'
 
 
-@currency_bp.route('/<pair>/mms', methods=['GET'])
-def search(pair):
+@currency_bp.route('/stats/pool', methods=['GET'])
+def pool_stats():
+    from mb_mms.services.data import db
+
+    return jsonify(db.get_pool_stats())
+
+
+@currency_bp.route('/stats/cache', methods=['GET'])
+def cache_stats():
+    from mb_mms.services.cache import backends
+
+    return jsonify(backends.get_backend().stats())
+
+
+@currency_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def split_args(args, name):
+    return [value for arg in args.getlist(name) for value in arg.split(',') if value]
+
+
+def batch_params(args):
+    """
+    Parses the `/mms/batch` query string into `search_mms_batch` arguments. Raises ValueError if it is invalid.
+    """
+    pairs = split_args(args, 'pairs')
+    precisions = split_args(args, 'precision')
+    start = args.get('from', type=int)
+    end = args.get('to', type=int)
+
+    if not pairs or not precisions or start is None:
+        raise ValueError
+
+    if end is None:
+        end = default_end()
+
+    precisions = [int(precision[:-1]) for precision in precisions]
+    return {'pairs': pairs, 'start': start, 'end': end, 'precisions': precisions}
+
+
+def search_params(pair, args):
+    """
+    Parses the `/<pair>/mms` query string into `search_mms` arguments. Raises ValueError if it is invalid.
+    """
+    precision = args.get('precision', type=str)
+    start = args.get('from', type=int)
+    end = args.get('to', type=int)
+    resolution = args.get('resolution', default='1d', type=str)
+    indicator = args.get('indicator', default='sma', type=str)
+
+    if precision is None or start is None:
+        raise ValueError
+
+    if end is None:
+        end = default_end()
+
+    precision = int(precision[:-1])
+    return {'pair': pair, 'start': start, 'end': end, 'precision': precision, 'resolution': resolution,
+            'indicator': indicator}
+
+
+def export_params(args):
+    """
+    Parses the `/<pair>/mms/export` query string.
+
+    Returns:
+        Tuple: (start, end, format, None), or (None, None, None, error) where error is a (message, status) response.
+    """
+    start = args.get('from', type=int)
+    end = args.get('to', type=int)
+    fmt = args.get('format', default='ndjson', type=str)
+
+    if start is None:
+        return None, None, None, ('missed mandatory query parameters', HTTPStatus.BAD_REQUEST)
+    if fmt not in export_formats.FORMATS:
+        return None, None, None, (f'unsupported format, use one of: {", ".join(export_formats.FORMATS)}',
+                                  HTTPStatus.BAD_REQUEST)
+    if end is None:
+        end = default_end()
+    return start, end, fmt, None
+
+
+@currency_bp.route('/mms/batch', methods=['GET'])
+def search_batch():
+    from mb_mms.services.mb_api import mb_api
+
     mb = mb_api.MB_API()
 
     try:
-        precision = request.args.get('precision', type=str)
-        start = request.args.get('from', type=int)
-        end = request.args.get('to', type=int)
+        res = mb.search_mms_batch(**batch_params(request.args))
+
+        return render(res)
+
+    except ValueError:
+        return 'missed mandatory query parameters', HTTPStatus.BAD_REQUEST
+    except Exception as err:
+        return str(err), HTTPStatus.INTERNAL_SERVER_ERROR
+
 
-        if precision is None or start is None:
-            raise ValueError
+@currency_bp.route('/<pair>/mms', methods=['GET'])
+def search(pair):
+    from mb_mms.api import conditional
+    from mb_mms.services.mb_api import mb_api
+
+    mb = mb_api.MB_API()
 
-        if end is None:
-            default = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-            default_unix = int(time.mktime(datetime.strptime(default, "%Y-%m-%d").timetuple()))
-            end = default_unix
+    try:
+        params = search_params(pair, request.args)
+        headers = conditional.validators(params, mb.write_generation(pair), mb.stored_span(pair))
+        if conditional.not_modified(request.headers.get('If-None-Match'), headers.get('ETag')):
+            return Response(status=HTTPStatus.NOT_MODIFIED, headers={**headers, 'Vary': 'Accept-Encoding'})
 
-        precision = int(precision[:-1])
-        res = mb.search_mms(pair=pair, start=start, end=end, precision=precision)
+        res = mb.search_mms(**params)
 
-        return jsonify(res)
+        return render(res, headers)
 
     except ValueError:
         return 'missed mandatory query parameters', HTTPStatus.BAD_REQUEST
     except Exception as err:
         return str(err), HTTPStatus.INTERNAL_SERVER_ERROR
+
+
+@currency_bp.route('/<pair>/mms/export', methods=['GET'])
+def export(pair):
+    from mb_mms.services.mb_api import mb_api
+
+    mb = mb_api.MB_API()
+
+    start, end, fmt, error = export_params(request.args)
+    if error is not None:
+        return error
+
+    # Run the query before the response starts, so database errors still become a 500
+    try:
+        rows = mb.export_mms(pair=pair, start=start, end=end)
+        first = next(rows, None)
+    except Exception as err:
+        return str(err), HTTPStatus.INTERNAL_SERVER_ERROR
+    if first is not None:
+        rows = itertools.chain([first], rows)
+
+    encode, mimetype = export_formats.FORMATS[fmt]
+    return Response(encode(rows), mimetype=mimetype)
@@ -0,0 +1,213 @@
+"""
+Async serving mode for the `currency_bp` routes.
+
+A plain ASGI application: the query strings are parsed by the same helpers as the Flask routes
+and the searches run on the async engine (`AsyncMB_API`), so a worker keeps serving other
+requests while it waits on the database. Responses are byte-for-byte those of the WSGI app.
+
+    uvicorn mb_mms.asgi:app --workers 4
+
+Records the same request and query metrics, exposed on `/v1/metrics`; the sampling profiler
+(`MMS_PROFILE_RATE`) only runs under the WSGI app, since coroutines of several requests
+interleave on one thread.
+
+Needs the `async` extra (SQLAlchemy asyncio support and the async driver). The scheduled jobs
+run in a separate process, `flask --app mb_mms.wsgi run-jobs`.
+"""
+import asyncio
+import itertools
+import json
+import re
+import time
+from http import HTTPStatus
+from typing import Dict
+from urllib.parse import parse_qsl
+
+from dotenv import load_dotenv
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.datastructures import MultiDict
+from werkzeug.utils import get_content_type
+
+from mb_mms.api import export as export_formats
+from mb_mms.api import conditional, routes, serialization
+from mb_mms.services.cache import backends
+from mb_mms.services.data import async_db, db
+from mb_mms.services.mb_api import async_mb_api, mb_api
+from mb_mms.services.metrics import instruments
+from mb_mms.services.metrics.registry import CONTENT_TYPE, REGISTRY
+
+HTML = 'text/html; charset=utf-8'
+JSON = 'application/json'
+
+load_dotenv()
+
+
+def render_json(obj) -> bytes:
+    """
+    Serializes like Flask's `jsonify` in production mode: sorted keys, compact separators, trailing newline.
+    """
+    body = json.dumps(obj, default=DefaultJSONProvider.default, ensure_ascii=True, sort_keys=True,
+                      separators=(',', ':'))
+    return f'{body}\n'.encode()
+
+
+def text(body: str, status: int = HTTPStatus.OK):
+    return int(status), HTML, body.encode()
+
+
+def error(err: Exception):
+    if isinstance(err, ValueError):
+        return text('missed mandatory query parameters', HTTPStatus.BAD_REQUEST)
+    return text(str(err), HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+async def root(args, headers):
+    return text('<p>Currency MMS initial page!</p>')
+
+
+async def pool_stats(args, headers):
+    return HTTPStatus.OK, JSON, render_json(db.get_pool_stats())
+
+
+async def cache_stats(args, headers):
+    return HTTPStatus.OK, JSON, render_json(backends.get_backend().stats())
+
+
+async def metrics(args, headers):
+    return HTTPStatus.OK, CONTENT_TYPE, REGISTRY.render().encode()
+
+
+async def search_batch(args, headers):
+    mb = async_mb_api.AsyncMB_API()
+    try:
+        res = await mb.search_mms_batch(**routes.batch_params(args))
+        with instruments.SERIALIZATION_SECONDS.time('mms.search_batch'):
+            body, extra = serialization.encode(res, headers.get('accept-encoding'))
+        return HTTPStatus.OK, JSON, body, extra
+    except Exception as err:
+        return error(err)
+
+
+async def search(args, headers, pair):
+    mb = async_mb_api.AsyncMB_API()
+    try:
+        params = routes.search_params(pair, args)
+        generation = await mb.write_generation(pair)
+        validators = conditional.validators(params, generation, await mb.stored_span(pair))
+        if conditional.not_modified(headers.get('if-none-match'), validators.get('ETag')):
+            return HTTPStatus.NOT_MODIFIED, HTML, b'', {**validators, 'Vary': 'Accept-Encoding'}
+
+        res = await mb.search_mms(**params)
+        with instruments.SERIALIZATION_SECONDS.time('mms.search'):
+            body, extra = serialization.encode(res, headers.get('accept-encoding'))
+        return HTTPStatus.OK, JSON, body, {**validators, **extra}
+    except Exception as err:
+        return error(err)
+
+
+async def _iterate_in_thread(iterator):
+    done = object()
+    while True:
+        chunk = await asyncio.to_thread(next, iterator, done)
+        if chunk is done:
+            return
+        yield chunk.encode() if isinstance(chunk, str) else chunk
+
+
+async def export(args, headers, pair):
+    start, end, fmt, err = routes.export_params(args)
+    if err is not None:
+        return text(*err)
+
+    # The export streams through a server-side cursor of the sync engine, one chunk per thread hop
+    mb = mb_api.MB_API()
+    try:
+        rows = mb.export_mms(pair=pair, start=start, end=end)
+        first = await asyncio.to_thread(next, rows, None)
+    except Exception as err:
+        return text(str(err), HTTPStatus.INTERNAL_SERVER_ERROR)
+    if first is not None:
+        rows = itertools.chain([first], rows)
+
+    encode, mimetype = export_formats.FORMATS[fmt]
+    return HTTPStatus.OK, get_content_type(mimetype, 'utf-8'), _iterate_in_thread(iter(encode(rows)))
+
+
+ROUTES = [
+    (re.compile(r'^/v1/$'), root),
+    (re.compile(r'^/v1/stats/pool$'), pool_stats),
+    (re.compile(r'^/v1/stats/cache$'), cache_stats),
+    (re.compile(r'^/v1/metrics$'), metrics),
+    (re.compile(r'^/v1/mms/batch$'), search_batch),
+    (re.compile(r'^/v1/(?P<pair>[^/]+)/mms$'), search),
+    (re.compile(r'^/v1/(?P<pair>[^/]+)/mms/export$'), export),
+]
+
+
+def query_args(scope) -> MultiDict:
+    query = scope.get('query_string', b'').decode('latin-1')
+    return MultiDict(parse_qsl(query, keep_blank_values=True))
+
+
+def request_headers(scope) -> Dict[str, str]:
+    # ASGI header names are lowercase; repeated headers are joined as HTTP allows
+    headers: Dict[str, str] = {}
+    for name, value in scope.get('headers', ()):
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        headers[name] = f'{headers[name]}, {value}' if name in headers else value
+    return headers
+
+
+async def dispatch(scope):
+    path = scope['path']
+    for pattern, handler in ROUTES:
+        match = pattern.match(path)
+        if match is None:
+            continue
+        if scope['method'] not in ('GET', 'HEAD'):
+            return text('Method Not Allowed', HTTPStatus.METHOD_NOT_ALLOWED)
+        # Same endpoint names as the Flask blueprint; streamed exports are timed up to their first chunk
+        started = time.perf_counter()
+        status, content_type, body, *extra = await handler(query_args(scope), request_headers(scope),
+                                                           **match.groupdict())
+        instruments.REQUEST_SECONDS.observe(time.perf_counter() - started, f'mms.{handler.__name__}', str(int(status)))
+        return status, content_type, body, *extra
+    return text('Not Found', HTTPStatus.NOT_FOUND)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await async_db.dispose_async_engine()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """
+    The ASGI entry point.
+    """
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    status, content_type, body, *extra = await dispatch(scope)
+    head = scope['method'] == 'HEAD'
+    headers = [(b'content-type', content_type.encode())]
+    for name, value in (extra[0] if extra else {}).items():
+        headers.append((name.lower().encode(), value.encode()))
+    if isinstance(body, bytes):
+        headers.append((b'content-length', str(len(body)).encode()))
+        await send({'type': 'http.response.start', 'status': int(status), 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if head else body})
+        return
+
+    await send({'type': 'http.response.start', 'status': int(status), 'headers': headers})
+    async for chunk in body:
+        if not head:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
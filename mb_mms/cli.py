@@ -0,0 +1,42 @@
+import importlib
+from typing import Optional
+
+import click
+
+
+class LazyCommand(click.Command):
+    """
+    A CLI command whose module is imported only when the command runs or its help is shown.
+
+    `create_app` registers every command this way, so starting one command (or the web app)
+    does not import the services of the others.
+
+        app.cli.add_command(LazyCommand('init-db', 'mb_mms.services.data.commands:init_db_command'))
+    """
+
+    def __init__(self, name: str, import_name: str) -> None:
+        super().__init__(name)
+        self.import_name = import_name
+        self._command: Optional[click.Command] = None
+
+    def load(self) -> click.Command:
+        """
+        Imports the command from its `module:attribute` import name.
+        """
+        if self._command is None:
+            module, _, attribute = self.import_name.partition(':')
+            self._command = getattr(importlib.import_module(module), attribute)
+        return self._command
+
+    def make_context(self, info_name, args, parent=None, **extra) -> click.Context:
+        # The context holds the real command, which the group then invokes
+        return self.load().make_context(info_name, args, parent=parent, **extra)
+
+    def get_short_help_str(self, limit: int = 45) -> str:
+        return self.load().get_short_help_str(limit)
+
+    def get_params(self, ctx: click.Context):
+        return self.load().get_params(ctx)
+
+    def get_help(self, ctx: click.Context) -> str:
+        return self.load().get_help(ctx)
@@ -1,7 +1,4 @@
-DROP TABLE IF EXISTS moving_averages;
-
-
-CREATE TABLE moving_averages (
+CREATE TABLE IF NOT EXISTS moving_averages (
   id INT NOT NULL AUTO_INCREMENT,
   pair VARCHAR(10) NOT NULL,
   timestamp BIGINT NOT NULL,
@@ -11,3 +8,18 @@ CREATE TABLE moving_averages (
   PRIMARY KEY (id),
   CONSTRAINT unique_pair_timestamp UNIQUE (pair, timestamp)
 );
+
+
+CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+  pair VARCHAR(10) NOT NULL,
+  timestamp BIGINT NOT NULL,
+  PRIMARY KEY (pair)
+);
+
+
+CREATE TABLE IF NOT EXISTS rolling_state (
+  pair VARCHAR(10) NOT NULL,
+  timestamp BIGINT NOT NULL,
+  closes BLOB NOT NULL,
+  PRIMARY KEY (pair)
+);
@@ -0,0 +1,4 @@
+-- Covering index for search_mms: the (pair, timestamp) range scan reads the
+-- averages straight from the index instead of looking up every row.
+CREATE INDEX ix_moving_averages_pair_timestamp_mms
+  ON moving_averages (pair, timestamp, mms_20, mms_50, mms_200);
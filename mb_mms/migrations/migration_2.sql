@@ -0,0 +1,22 @@
+-- Weekly ('1w') and monthly ('1M') rollups of moving_averages, kept up to date
+-- by the writers. bucket is the UTC start of the week (Monday) or month.
+CREATE TABLE IF NOT EXISTS moving_average_rollups (
+  pair VARCHAR(10) NOT NULL,
+  resolution VARCHAR(2) NOT NULL,
+  bucket BIGINT NOT NULL,
+  last_timestamp BIGINT NOT NULL,
+  count INT NOT NULL,
+  mms_20_last FLOAT NULL,
+  mms_20_min FLOAT NULL,
+  mms_20_max FLOAT NULL,
+  mms_20_mean FLOAT NULL,
+  mms_50_last FLOAT NULL,
+  mms_50_min FLOAT NULL,
+  mms_50_max FLOAT NULL,
+  mms_50_mean FLOAT NULL,
+  mms_200_last FLOAT NULL,
+  mms_200_min FLOAT NULL,
+  mms_200_max FLOAT NULL,
+  mms_200_mean FLOAT NULL,
+  PRIMARY KEY (pair, resolution, bucket)
+);
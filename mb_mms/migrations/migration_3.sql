@@ -0,0 +1,8 @@
+-- Raw daily closes per pair. Moving averages of any window are computed from
+-- them on demand, so new precisions need no new columns.
+CREATE TABLE IF NOT EXISTS pair_closes (
+  pair VARCHAR(10) NOT NULL,
+  timestamp BIGINT NOT NULL,
+  close FLOAT NOT NULL,
+  PRIMARY KEY (pair, timestamp)
+);
@@ -0,0 +1,19 @@
+-- Streaming indicators (EMA, WMA, ...) per pair and period, and the state each
+-- one needs to fold in the next close without recomputing the series.
+CREATE TABLE IF NOT EXISTS indicator_values (
+  pair VARCHAR(10) NOT NULL,
+  indicator VARCHAR(8) NOT NULL,
+  period INT NOT NULL,
+  timestamp BIGINT NOT NULL,
+  value FLOAT NULL,
+  PRIMARY KEY (pair, indicator, period, timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS indicator_states (
+  pair VARCHAR(10) NOT NULL,
+  indicator VARCHAR(8) NOT NULL,
+  period INT NOT NULL,
+  timestamp BIGINT NOT NULL,
+  state BLOB NOT NULL,
+  PRIMARY KEY (pair, indicator, period)
+);
@@ -0,0 +1,8 @@
+-- Named leases held by one process at a time, e.g. the job runner that owns the
+-- scheduler. A lease is free once `expires` (unix seconds) is in the past.
+CREATE TABLE IF NOT EXISTS leases (
+  name VARCHAR(32) NOT NULL,
+  owner VARCHAR(128) NOT NULL,
+  expires BIGINT NOT NULL,
+  PRIMARY KEY (name)
+);
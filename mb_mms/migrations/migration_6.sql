@@ -0,0 +1,76 @@
+-- Pair names move to a `pairs` dimension table with a SMALLINT id, and
+-- moving_averages is keyed (clustered) by (pair_id, timestamp) instead of an
+-- auto id plus a unique index and a covering index repeating the pair string.
+-- The primary key holds every column, so the search range scans read the rows
+-- straight from it.
+--
+-- MySQL commits each DDL statement, so an interrupted run is left half done.
+-- Every step is guarded so running the file again finishes it: the copy and
+-- the swap only run while moving_averages still has the `pair` column, and the
+-- copy is an upsert.
+--
+-- Writers keep running during the bulk copy. The final catch-up copy and the
+-- swap run under LOCK TABLES, so no row written in between is lost; writers of
+-- the previous release block on the lock and fail once the table is swapped,
+-- so stop them (`run-jobs`, `backfill`) before deploying this migration.
+CREATE TABLE IF NOT EXISTS pairs (
+  id SMALLINT NOT NULL AUTO_INCREMENT,
+  name VARCHAR(10) NOT NULL,
+  PRIMARY KEY (id),
+  CONSTRAINT unique_pair_name UNIQUE (name)
+);
+
+SET @legacy = (
+  SELECT COUNT(*) FROM information_schema.columns
+  WHERE table_schema = DATABASE() AND table_name = 'moving_averages' AND column_name = 'pair'
+);
+
+-- After the swap the table holds the rows under the moving_averages name and
+-- its foreign key name is taken, so a rerun only creates an empty placeholder
+-- for LOCK TABLES and drops it at the end
+SET @step = IF(@legacy, 'CREATE TABLE IF NOT EXISTS moving_averages_compact (
+  pair_id SMALLINT NOT NULL,
+  timestamp BIGINT NOT NULL,
+  mms_20 FLOAT NULL,
+  mms_50 FLOAT NULL,
+  mms_200 FLOAT NULL,
+  PRIMARY KEY (pair_id, timestamp),
+  CONSTRAINT fk_moving_averages_pair FOREIGN KEY (pair_id) REFERENCES pairs (id)
+)', 'CREATE TABLE IF NOT EXISTS moving_averages_compact (pair_id SMALLINT NOT NULL)');
+PREPARE step FROM @step;
+EXECUTE step;
+DEALLOCATE PREPARE step;
+
+SET @fill_pairs = IF(@legacy, 'INSERT IGNORE INTO pairs (name)
+  SELECT DISTINCT pair FROM moving_averages ORDER BY pair', 'DO 0');
+-- Inserted in primary key order, so the clustered index is built sequentially
+SET @copy_rows = IF(@legacy, 'INSERT INTO moving_averages_compact (pair_id, timestamp, mms_20, mms_50, mms_200)
+  SELECT pairs.id, moving_averages.timestamp, moving_averages.mms_20, moving_averages.mms_50, moving_averages.mms_200
+  FROM moving_averages JOIN pairs ON pairs.name = moving_averages.pair
+  ORDER BY pairs.id, moving_averages.timestamp
+  ON DUPLICATE KEY UPDATE mms_20 = VALUES(mms_20), mms_50 = VALUES(mms_50), mms_200 = VALUES(mms_200)', 'DO 0');
+
+PREPARE step FROM @fill_pairs;
+EXECUTE step;
+PREPARE step FROM @copy_rows;
+EXECUTE step;
+DEALLOCATE PREPARE step;
+
+-- Catches up with the rows written during the bulk copy and swaps the tables
+-- while the writers wait
+LOCK TABLES moving_averages WRITE, moving_averages_compact WRITE, pairs WRITE;
+
+PREPARE step FROM @fill_pairs;
+EXECUTE step;
+PREPARE step FROM @copy_rows;
+EXECUTE step;
+SET @step = IF(@legacy, 'RENAME TABLE moving_averages TO moving_averages_legacy,
+  moving_averages_compact TO moving_averages', 'DO 0');
+PREPARE step FROM @step;
+EXECUTE step;
+DEALLOCATE PREPARE step;
+
+UNLOCK TABLES;
+
+DROP TABLE IF EXISTS moving_averages_legacy;
+DROP TABLE IF EXISTS moving_averages_compact;
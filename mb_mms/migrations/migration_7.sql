@@ -0,0 +1,8 @@
+-- Backfill checkpoints are kept per (pair, range): a pair-wide checkpoint let a
+-- backfill of one range skip the days of another. Existing checkpoints match no
+-- range, so interrupted backfills start their range again (the writes are upserts).
+ALTER TABLE backfill_checkpoints
+  ADD COLUMN range_start BIGINT NOT NULL DEFAULT 0,
+  ADD COLUMN range_end BIGINT NOT NULL DEFAULT 0,
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (pair, range_start, range_end);
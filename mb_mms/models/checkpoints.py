@@ -0,0 +1,13 @@
+from sqlalchemy import BigInteger, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from mb_mms.models.pair_averages import Base
+
+
+class BackfillCheckpoint(Base):
+    __tablename__ = "backfill_checkpoints"
+
+    pair: Mapped[str] = mapped_column(String(10), primary_key=True)
+    range_start: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    range_end: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+    timestamp: Mapped[int] = mapped_column(BigInteger)
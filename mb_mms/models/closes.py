@@ -0,0 +1,12 @@
+from sqlalchemy import BigInteger, Float, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from mb_mms.models.pair_averages import Base
+
+
+class PairClose(Base):
+    __tablename__ = "pair_closes"
+
+    pair: Mapped[str] = mapped_column(String(10), primary_key=True)
+    timestamp: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    close: Mapped[float] = mapped_column(Float)
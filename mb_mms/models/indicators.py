@@ -0,0 +1,25 @@
+from typing import Optional
+from sqlalchemy import BigInteger, Integer, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from mb_mms.models.pair_averages import Base
+
+
+class IndicatorValue(Base):
+    __tablename__ = "indicator_values"
+
+    pair: Mapped[str] = mapped_column(String(10), primary_key=True)
+    indicator: Mapped[str] = mapped_column(String(8), primary_key=True)
+    period: Mapped[int] = mapped_column(Integer, primary_key=True)
+    timestamp: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    value: Mapped[Optional[float]]
+
+
+class IndicatorState(Base):
+    __tablename__ = "indicator_states"
+
+    pair: Mapped[str] = mapped_column(String(10), primary_key=True)
+    indicator: Mapped[str] = mapped_column(String(8), primary_key=True)
+    period: Mapped[int] = mapped_column(Integer, primary_key=True)
+    timestamp: Mapped[int] = mapped_column(BigInteger)
+    state: Mapped[bytes] = mapped_column(LargeBinary)
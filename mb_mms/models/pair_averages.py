@@ -1,17 +1,31 @@
 from typing import Optional
-from sqlalchemy import BigInteger, String
+from sqlalchemy import BigInteger, ForeignKey, Integer, SmallInteger, String, UniqueConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+# SQLite only auto-increments INTEGER primary keys
+PairId = SmallInteger().with_variant(Integer, 'sqlite')
+
 class Base(DeclarativeBase):
     pass
 
 
+class Pair(Base):
+    __tablename__ = "pairs"
+    __table_args__ = (
+        UniqueConstraint('name', name='unique_pair_name'),
+    )
+
+    id: Mapped[int] = mapped_column(PairId, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(10))
+
+
 class MovingAverage(Base):
     __tablename__ = "moving_averages"
 
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    pair: Mapped[str] = mapped_column(String(10), index=True)
-    timestamp: Mapped[int] = mapped_column(BigInteger, index=True)
+    pair_id: Mapped[int] = mapped_column(
+        PairId, ForeignKey('pairs.id', name='fk_moving_averages_pair'), primary_key=True, autoincrement=False
+    )
+    timestamp: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
     mms_20: Mapped[Optional[float]]
     mms_50: Mapped[Optional[float]]
     mms_200: Mapped[Optional[float]]
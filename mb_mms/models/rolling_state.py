@@ -0,0 +1,12 @@
+from sqlalchemy import BigInteger, LargeBinary, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from mb_mms.models.pair_averages import Base
+
+
+class RollingState(Base):
+    __tablename__ = "rolling_state"
+
+    pair: Mapped[str] = mapped_column(String(10), primary_key=True)
+    timestamp: Mapped[int] = mapped_column(BigInteger)
+    closes: Mapped[bytes] = mapped_column(LargeBinary)
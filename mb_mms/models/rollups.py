@@ -0,0 +1,27 @@
+from typing import Optional
+from sqlalchemy import BigInteger, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from mb_mms.models.pair_averages import Base
+
+
+class MovingAverageRollup(Base):
+    __tablename__ = "moving_average_rollups"
+
+    pair: Mapped[str] = mapped_column(String(10), primary_key=True)
+    resolution: Mapped[str] = mapped_column(String(2), primary_key=True)
+    bucket: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    last_timestamp: Mapped[int] = mapped_column(BigInteger)
+    count: Mapped[int] = mapped_column(Integer)
+    mms_20_last: Mapped[Optional[float]]
+    mms_20_min: Mapped[Optional[float]]
+    mms_20_max: Mapped[Optional[float]]
+    mms_20_mean: Mapped[Optional[float]]
+    mms_50_last: Mapped[Optional[float]]
+    mms_50_min: Mapped[Optional[float]]
+    mms_50_max: Mapped[Optional[float]]
+    mms_50_mean: Mapped[Optional[float]]
+    mms_200_last: Mapped[Optional[float]]
+    mms_200_min: Mapped[Optional[float]]
+    mms_200_max: Mapped[Optional[float]]
+    mms_200_mean: Mapped[Optional[float]]
@@ -0,0 +1,398 @@
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional, Tuple
+
+from mb_mms.services.cache.lru import MISSING, TTLCache
+from mb_mms.services.cache import series
+from mb_mms.services.cache.resp import RespClient, RespError
+from mb_mms.services.data.rows import Rows
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+COMPRESS_THRESHOLD = 1024
+# Deletes the lock only if it still holds the caller's token
+RELEASE_SCRIPT = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_payload(value: Any) -> bytes:
+    """
+    Serializes a cached value into a compact payload.
+
+    `Rows` (the `search_mms` results) and lists of dicts sharing the same keys are stored column
+    names once plus one array per row, and payloads above `COMPRESS_THRESHOLD` bytes are zlib-compressed.
+    The first byte tells `decode_payload` which encoding was used.
+    """
+    body = {'v': value}
+    if isinstance(value, Rows):
+        # SQLAlchemy rows are sequences but not tuples, which the JSON encoders expect
+        body = {'k': value.columns, 'r': [tuple(row) for row in value.tuples]}
+    elif isinstance(value, list) and value and all(isinstance(row, dict) for row in value):
+        keys = list(value[0])
+        if all(len(row) == len(keys) for row in value):
+            try:
+                body = {'k': keys, 'r': [[row[key] for key in keys] for row in value]}
+            except KeyError:
+                pass
+
+    data = _dumps(body)
+    if len(data) >= COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(data, 1)
+    return b'j' + data
+
+
+def decode_payload(payload: bytes) -> Any:
+    """
+    Restores a value serialized by `encode_payload`.
+    """
+    kind, data = payload[:1], payload[1:]
+    if kind == b'z':
+        data = zlib.decompress(data)
+    elif kind != b'j':
+        raise ValueError('unknown cache payload')
+
+    body = _loads(data)
+    if 'k' in body:
+        return Rows(body['k'], body['r'])
+    return body['v']
+
+
+class CacheBackend(ABC):
+    """
+    Interface of the `search_mms` result caches.
+
+    Keys are tuples whose first item is the currency pair, so a pair can be invalidated at once.
+    """
+
+    name = 'base'
+    # Whether lookup/store do network I/O (async callers run them in a thread)
+    blocking = False
+
+    @abstractmethod
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value of `key`, calling `compute` once on a miss and caching its result.
+
+        Concurrent misses on the same key share one `compute` call (single-flight). Exceptions
+        raised by `compute` are propagated and nothing is cached.
+        """
+
+    @abstractmethod
+    def lookup(self, key: Tuple) -> Any:
+        """
+        Returns the cached value of `key`, or `MISSING`, without computing or waiting for it.
+        """
+
+    @abstractmethod
+    def store(self, key: Tuple, value: Any) -> None:
+        """
+        Caches `value` under `key`.
+        """
+
+    @abstractmethod
+    def invalidate_pair(self, pair: str) -> None:
+        """
+        Drops every cached value of the pair and bumps its write generation.
+        """
+
+    @abstractmethod
+    def generation(self, pair: str) -> Optional[str]:
+        """
+        Returns the write generation of the pair, which changes whenever the pair is invalidated,
+        or None if it cannot be read.
+        """
+
+    @abstractmethod
+    def stats(self):
+        """
+        Returns the backend counters.
+        """
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Per-process backend built on the LRU/TTL cache.
+    """
+
+    name = 'memory'
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._generations = {}
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        value = self.cache.get(key)
+        if value is not MISSING:
+            return value
+
+        with self._inflight_lock:
+            lock = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                value = self.cache.peek(key)
+                if value is MISSING:
+                    with self._inflight_lock:
+                        generation = self._generations.get(key[0], 0)
+                    value = compute()
+                    with self._inflight_lock:
+                        # An invalidation during `compute` may have made the value stale
+                        if self._generations.get(key[0], 0) == generation:
+                            self.cache.set(key, value)
+                return value
+        finally:
+            with self._inflight_lock:
+                if self._inflight.get(key) is lock:
+                    del self._inflight[key]
+
+    def lookup(self, key: Tuple) -> Any:
+        return self.cache.get(key)
+
+    def store(self, key: Tuple, value: Any) -> None:
+        self.cache.set(key, value)
+
+    def invalidate_pair(self, pair: str) -> None:
+        self.cache.invalidate(lambda key: key[0] == pair)
+        with self._inflight_lock:
+            self._generations[pair] = self._generations.get(pair, 0) + 1
+
+    def generation(self, pair: str) -> Optional[str]:
+        # Writers in other processes (`run-jobs`) cannot bump it, so it also rolls over every TTL;
+        # see `api.conditional` for the staleness this allows
+        with self._inflight_lock:
+            count = self._generations.get(pair, 0)
+        period = int(time.time() // self.cache.ttl) if self.cache.ttl > 0 else time.time()
+        return f'{count}.{period}'
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['backend'] = self.name
+        return stats
+
+
+class SharedBackend(CacheBackend):
+    """
+    Backend shared by every worker through a Redis-compatible server.
+
+    Each pair has a generation counter that is part of every key of the pair; invalidating the
+    pair increments it, so all workers stop seeing the old entries at once and those expire on
+    their own. Misses take a short-lived `NX` lock so only one worker recomputes a key while the
+    others poll for its result. If the server is unreachable the backend computes directly.
+    """
+
+    name = 'shared'
+    blocking = True
+
+    def __init__(self, client: RespClient, ttl: float, lock_ttl: float = 5.0, poll_interval: float = 0.02,
+                 prefix: str = 'mms') -> None:
+        self.client = client
+        self.ttl_ms = int(ttl * 1000)
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.lock_timeouts = 0
+        self.errors = 0
+        self.invalidations = 0
+
+    def _incr(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _generation_key(self, pair: str) -> str:
+        return f'{self.prefix}:gen:{pair}'
+
+    def _key(self, key: Tuple) -> str:
+        generation = self.client.get(self._generation_key(key[0])) or b'0'
+        return ':'.join([self.prefix, str(key[0]), generation.decode()] + [str(part) for part in key[1:]])
+
+    def _get(self, key: str) -> Any:
+        payload = self.client.get(key)
+        return MISSING if payload is None else decode_payload(payload)
+
+    def get_or_compute(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        lock_ms = int(self.lock_ttl * 1000)
+        deadline = time.monotonic() + self.lock_ttl
+        waited = False
+        # Only the worker that set the lock may delete it
+        token = uuid.uuid4().hex.encode()
+        try:
+            shared_key = self._key(key)
+            while True:
+                value = self._get(shared_key)
+                if value is not MISSING:
+                    self._incr('waits' if waited else 'hits')
+                    return value
+                if not waited:
+                    self._incr('misses')
+                if self.client.set(shared_key + ':lock', token, px=lock_ms, nx=True):
+                    # The previous leader may have stored the value between our GET and SET
+                    value = self._get(shared_key)
+                    if value is MISSING:
+                        break
+                    self._release(shared_key + ':lock', token)
+                    self._incr('waits')
+                    return value
+                if time.monotonic() >= deadline:
+                    self._incr('lock_timeouts')
+                    shared_key = None
+                    break
+                waited = True
+                time.sleep(self.poll_interval)
+        except (OSError, RespError, ValueError):
+            self._incr('errors')
+            shared_key = None
+
+        if shared_key is None:
+            return compute()
+
+        try:
+            value = compute()
+            self._store(shared_key, value)
+            return value
+        finally:
+            self._release(shared_key + ':lock', token)
+
+    def lookup(self, key: Tuple) -> Any:
+        try:
+            value = self._get(self._key(key))
+        except (OSError, RespError, ValueError):
+            self._incr('errors')
+            return MISSING
+        self._incr('misses' if value is MISSING else 'hits')
+        return value
+
+    def store(self, key: Tuple, value: Any) -> None:
+        try:
+            self._store(self._key(key), value)
+        except (OSError, RespError):
+            self._incr('errors')
+
+    def _store(self, key: str, value: Any) -> None:
+        try:
+            self.client.set(key, encode_payload(value), px=self.ttl_ms)
+        except (OSError, RespError):
+            self._incr('errors')
+
+    def _release(self, lock_key: str, token: bytes) -> None:
+        # A leader slower than the lock TTL must not delete the lock of the worker that took over
+        try:
+            self.client.eval(RELEASE_SCRIPT, [lock_key], [token])
+        except (OSError, RespError):
+            self._incr('errors')
+
+    def invalidate_pair(self, pair: str) -> None:
+        try:
+            self.client.incr(self._generation_key(pair))
+            self._incr('invalidations')
+        except (OSError, RespError):
+            self._incr('errors')
+
+    def generation(self, pair: str) -> Optional[str]:
+        try:
+            return (self.client.get(self._generation_key(pair)) or b'0').decode()
+        except (OSError, RespError):
+            self._incr('errors')
+            return None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.name,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'waits': self.waits,
+                'lock_timeouts': self.lock_timeouts,
+                'errors': self.errors,
+                'invalidations': self.invalidations,
+                'ttl': self.ttl_ms / 1000,
+            }
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend() -> CacheBackend:
+    """
+    Builds the cache backend selected by the environment:
+        - `MMS_CACHE_BACKEND`: `memory` (default) or `shared`.
+        - `MMS_CACHE_URL`: The `redis://host:port/db` url of the shared backend.
+        - `MMS_CACHE_SIZE`: Entries kept by the memory backend (default 1024, 0 disables it).
+        - `MMS_CACHE_TTL`: Seconds an entry lives (default 300).
+    """
+    ttl = float(os.getenv('MMS_CACHE_TTL', '300'))
+    kind = os.getenv('MMS_CACHE_BACKEND', 'memory')
+    if kind == 'shared':
+        client = RespClient.from_url(os.getenv('MMS_CACHE_URL', 'redis://localhost:6379/0'))
+        return SharedBackend(client=client, ttl=ttl)
+    if kind == 'memory':
+        return MemoryBackend(maxsize=int(os.getenv('MMS_CACHE_SIZE', '1024')), ttl=ttl)
+    raise ValueError(f'unknown cache backend {kind}')
+
+
+def get_backend() -> CacheBackend:
+    """
+    Returns the process-wide cache backend, creating it on first use.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def reset_backend() -> None:
+    """
+    Drops the process-wide backend so the next `get_backend` call reads the settings again.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = None
+
+
+def _after_fork_in_child() -> None:
+    # Pooled sockets belong to the parent; the child opens its own.
+    global _backend, _backend_lock
+    _backend = None
+    _backend_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def invalidate_pair(pair: str) -> None:
+    """
+    Drops every cached `search_mms` result of the pair, including the close series this process
+    keeps for arbitrary windows, and bumps its write generation. Every writer of moving
+    averages, indicators or rollups calls it after committing.
+    """
+    series.invalidate_pair(pair)
+    get_backend().invalidate_pair(pair)
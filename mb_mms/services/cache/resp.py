@@ -0,0 +1,142 @@
+import socket
+import threading
+from typing import List, Optional, Union
+from urllib.parse import urlsplit
+
+
+class RespError(Exception):
+    """
+    An error reply sent by the server.
+    """
+
+
+class RespClient:
+    """
+    A minimal RESP2 client, enough to use a Redis-compatible server as a shared cache.
+
+    Sockets are kept in a small pool so concurrent threads do not serialize on one connection.
+    """
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0, timeout: float = 1.0) -> None:
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, timeout: float = 1.0) -> 'RespClient':
+        """
+        Builds a client from a `redis://host:port/db` url.
+        """
+        parts = urlsplit(url)
+        db = int(parts.path.strip('/') or 0)
+        return cls(host=parts.hostname or 'localhost', port=parts.port or 6379, db=db, timeout=timeout)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile('rb'))
+        if self.db:
+            self._send(sock, ('SELECT', self.db))
+            self._read(conn[1])
+        return conn
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, bytes):
+                data = arg
+            else:
+                data = str(arg).encode()
+            out.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(out)
+
+    def _send(self, sock: socket.socket, args) -> None:
+        sock.sendall(self._encode(args))
+
+    def _read(self, stream) -> Union[bytes, int, list, None]:
+        line = stream.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('connection closed by server')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload
+        if kind == b'-':
+            raise RespError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            size = int(payload)
+            if size < 0:
+                return None
+            data = stream.read(size + 2)
+            return data[:-2]
+        if kind == b'*':
+            size = int(payload)
+            if size < 0:
+                return None
+            return [self._read(stream) for _ in range(size)]
+        raise ConnectionError(f'unexpected reply {line!r}')
+
+    def execute(self, *args):
+        """
+        Sends one command and returns its reply.
+
+        Raises:
+            RespError: If the server answers with an error.
+            OSError: If the connection fails.
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        sock, stream = conn
+        try:
+            self._send(sock, args)
+            reply = self._read(stream)
+        except RespError:
+            self._release(conn)
+            raise
+        except Exception:
+            stream.close()
+            sock.close()
+            raise
+        self._release(conn)
+        return reply
+
+    def _release(self, conn) -> None:
+        with self._lock:
+            self._idle.append(conn)
+
+    def close(self) -> None:
+        """
+        Closes every pooled connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock, stream in idle:
+            stream.close()
+            sock.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.execute('GET', key)
+
+    def set(self, key: str, value: bytes, px: int = None, nx: bool = False) -> bool:
+        args = ['SET', key, value]
+        if px is not None:
+            args += ['PX', px]
+        if nx:
+            args.append('NX')
+        return self.execute(*args) is not None
+
+    def delete(self, key: str) -> int:
+        return self.execute('DEL', key)
+
+    def incr(self, key: str) -> int:
+        return self.execute('INCR', key)
+
+    def eval(self, script: str, keys: List[str], args: List[bytes]) -> Union[bytes, int, list, None]:
+        return self.execute('EVAL', script, len(keys), *keys, *args)
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+from mb_mms.services.cache.lru import MISSING, TTLCache
+from mb_mms.services.data.rows import Rows
+from mb_mms.services.mb_api import indicators
+
+Loader = Callable[[], Tuple[array, array]]
+
+NAN = float('nan')
+
+
+class PairSeries:
+    """
+    The stored closes of one pair and the moving averages already computed from them.
+
+    At most `max_windows` (indicator, window) results are memoized, in LRU order, each as an
+    `array('d')` holding NaN where the value is None.
+    """
+
+    __slots__ = ('timestamps', 'closes', 'means', 'max_windows', 'lock')
+
+    def __init__(self, timestamps: array, closes: array, max_windows: int = 16) -> None:
+        self.timestamps = timestamps
+        self.closes = closes
+        self.means = OrderedDict()
+        self.max_windows = max_windows
+        self.lock = threading.Lock()
+
+    def window_means(self, window: int, indicator: str = indicators.SMA.name) -> array:
+        """
+        Returns the indicator value at every close for the window, computing it on first use.
+
+        The value is NaN until `window` closes are available.
+        """
+        key = (indicator, window)
+        with self.lock:
+            means = self.means.get(key)
+            if means is None:
+                values = indicators.create(indicator, window).compute(self.closes)
+                means = self.means[key] = array('d', (NAN if value is None else value for value in values))
+                while len(self.means) > self.max_windows:
+                    self.means.popitem(last=False)
+            else:
+                self.means.move_to_end(key)
+        return means
+
+
+class SeriesCache:
+    """
+    Per-process cache of the close arrays of each pair, with the moving averages memoized per (pair, window).
+
+    A pair is loaded once (concurrent misses share the load) and kept as two compact arrays, so
+    any window is computed from memory in one vectorized pass and later requests of the same
+    window only slice the memoized result. Pairs are evicted in LRU order and expire after `ttl`.
+    Besides the simple mean, any indicator of `mb_api.indicators` is memoized the same way.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic,
+                 max_windows: int = 16) -> None:
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, clock=clock)
+        self.max_windows = max_windows
+        self._loading = {}
+        self._loading_lock = threading.Lock()
+        self.loads = 0
+
+    def series(self, pair: str, load: Loader) -> PairSeries:
+        """
+        Returns the cached series of the pair, calling `load` on a miss.
+        """
+        series = self.cache.get(pair)
+        if series is not MISSING:
+            return series
+
+        with self._loading_lock:
+            lock = self._loading.setdefault(pair, threading.Lock())
+        try:
+            with lock:
+                series = self.cache.peek(pair)
+                if series is MISSING:
+                    series = PairSeries(*load(), max_windows=self.max_windows)
+                    self.loads += 1
+                    self.cache.set(pair, series)
+                return series
+        finally:
+            with self._loading_lock:
+                if self._loading.get(pair) is lock:
+                    del self._loading[pair]
+
+    def window(self, pair: str, window: int, start: int, end: int, load: Loader,
+               indicator: str = indicators.SMA.name) -> Rows:
+        """
+        Returns the moving average of the window for every stored day in [start, end].
+
+        Args:
+            pair (str): The currency pair.
+            window (int): The window size, at least 1.
+            start (int): The start timestamp of the range.
+            end (int): The end timestamp of the range.
+            load (Loader): Reads the (timestamps, closes) arrays of the pair on a miss.
+            indicator (str, optional): The indicator name (`sma`, `ema` or `wma`). Defaults to `sma`.
+
+        Returns:
+            Rows: The `timestamp` and `mms` of each day, in the `search_mms` format.
+
+        Raises:
+            ValueError: If the window is smaller than 1 or the indicator is unknown.
+        """
+        indicators.create(indicator, window)
+        series = self.series(pair, load)
+        means = series.window_means(window, indicator)
+        lower = bisect_left(series.timestamps, start)
+        upper = bisect_right(series.timestamps, end)
+        values = [None if value != value else value for value in means[lower:upper]]
+        return Rows(('timestamp', 'mms'), list(zip(series.timestamps[lower:upper], values)))
+
+    def invalidate(self, pair: str) -> None:
+        """
+        Drops the series of the pair and its memoized windows.
+        """
+        self.cache.invalidate(lambda key: key == pair)
+
+    def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['loads'] = self.loads
+        return stats
+
+
+_series_cache = None
+_series_cache_lock = threading.Lock()
+
+
+def get_series_cache() -> SeriesCache:
+    """
+    Returns the process-wide series cache, creating it on first use.
+
+    Settings:
+        - `MMS_SERIES_SIZE`: Pairs kept in memory (default 64, 0 disables the cache).
+        - `MMS_SERIES_TTL`: Seconds a pair stays cached (default 300).
+        - `MMS_SERIES_WINDOWS`: (indicator, window) results memoized per pair (default 16).
+    """
+    global _series_cache
+    if _series_cache is None:
+        with _series_cache_lock:
+            if _series_cache is None:
+                _series_cache = SeriesCache(
+                    maxsize=int(os.getenv('MMS_SERIES_SIZE', '64')),
+                    ttl=float(os.getenv('MMS_SERIES_TTL', '300')),
+                    max_windows=int(os.getenv('MMS_SERIES_WINDOWS', '16')),
+                )
+    return _series_cache
+
+
+def reset_series_cache() -> None:
+    """
+    Drops the process-wide series cache so the next `get_series_cache` call reads the settings again.
+    """
+    global _series_cache
+    with _series_cache_lock:
+        _series_cache = None
+
+
+def _after_fork_in_child() -> None:
+    global _series_cache, _series_cache_lock
+    _series_cache = None
+    _series_cache_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def invalidate_pair(pair: str) -> None:
+    """
+    Drops the cached series of the pair in this process, if the cache was created.
+    """
+    if _series_cache is not None:
+        _series_cache.invalidate(pair)
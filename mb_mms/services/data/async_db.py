@@ -0,0 +1,80 @@
+import os
+import threading
+
+from sqlalchemy.engine import make_url
+
+from mb_mms.services.data import db
+
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def async_url(url: str) -> str:
+    """
+    Returns the async-driver variant of a database URL, e.g. `mysql+pymysql://` -> `mysql+aiomysql://`.
+
+    Raises:
+        ValueError: If there is no async driver for the database.
+    """
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f'no async driver for {parsed.get_backend_name()}')
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def async_engine_options(url: str):
+    """
+    Builds the `create_async_engine` keyword arguments, sized like the sync pool.
+
+    The async engine uses SQLAlchemy's async-adapted queue pool, so the instrumented sync pool
+    class is left out.
+    """
+    options = db.engine_options(url)
+    options.pop('poolclass', None)
+    return options
+
+
+def get_async_engine():
+    """
+    Returns the process-wide async engine, creating it on first use.
+
+    The URL is `ASYNC_DB_URL` when set, and `DB_URL` with its async driver otherwise. Requires
+    SQLAlchemy's asyncio extension (greenlet) and the async driver to be installed.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from sqlalchemy.ext.asyncio import create_async_engine
+
+                url = os.getenv('ASYNC_DB_URL') or async_url(os.getenv('DB_URL', ''))
+                _engine = create_async_engine(url, **async_engine_options(url))
+    return _engine
+
+
+async def dispose_async_engine() -> None:
+    """
+    Closes the pooled connections of the async engine and forgets it.
+    """
+    global _engine
+    engine, _engine = _engine, None
+    if engine is not None:
+        await engine.dispose()
+
+
+def _after_fork_in_child() -> None:
+    # The pool and its connections belong to the parent's event loop
+    global _engine, _engine_lock
+    _engine = None
+    _engine_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
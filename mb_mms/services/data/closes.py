@@ -0,0 +1,51 @@
+from array import array
+from typing import Iterable, Tuple
+
+from sqlalchemy import select
+
+from mb_mms.models.closes import PairClose
+from mb_mms.services.data import db
+
+
+def upsert_closes(conn, pair: str, rates: Iterable[Tuple[float, int]], batch_size: int = None) -> int:
+    """
+    Stores the raw (close, timestamp) candles of a pair, updating the days that already exist.
+
+    Args:
+        conn: An open SQLAlchemy connection. The caller owns the transaction.
+        pair (str): The currency pair of the candles.
+        rates (Iterable[Tuple[float, int]]): The (close, timestamp) candles.
+        batch_size (int, optional): Rows per statement. Defaults to `db.get_batch_size()`.
+
+    Returns:
+        int: The number of rows sent to the database.
+    """
+    if batch_size is None:
+        batch_size = db.get_batch_size()
+    if batch_size < 1:
+        raise ValueError('batch size must be at least 1')
+
+    rows = [{'pair': pair, 'timestamp': timestamp, 'close': close} for close, timestamp in rates]
+    stmt = db.upsert_statement(conn.dialect.name, PairClose.__table__, ('pair', 'timestamp'), ('close',))
+    for offset in range(0, len(rows), batch_size):
+        conn.execute(stmt, rows[offset:offset + batch_size])
+    return len(rows)
+
+
+def load_closes(conn, pair: str) -> Tuple[array, array]:
+    """
+    Reads every stored close of the pair, oldest first.
+
+    Returns:
+        Tuple[array, array]: The timestamps (`array('q')`) and the closes (`array('d')`).
+    """
+    stmt = (
+        select(PairClose.timestamp, PairClose.close)
+        .where(PairClose.pair == pair)
+        .order_by(PairClose.timestamp)
+    )
+    timestamps, closes = array('q'), array('d')
+    for timestamp, close in conn.execute(stmt):
+        timestamps.append(timestamp)
+        closes.append(close)
+    return timestamps, closes
@@ -1,8 +1,35 @@
 import click
-from mb_mms.services.data import db
+from sqlalchemy import select
+
+from mb_mms.models.pair_averages import MovingAverage, Pair
+from mb_mms.services.cache import backends
+from mb_mms.services.data import db, rollups
 
 
 @click.command('init-db')
 def init_db_command():
-    db.exec_migrations()
+    try:
+        applied = db.exec_migrations()
+    except Exception as err:
+        # A non-zero exit, so deploys stop on a half-migrated schema
+        raise click.ClickException(f'migration failed: {err}') from err
+    if applied:
+        click.echo(f'Applied migrations: {", ".join(str(version) for version in applied)}.')
     click.echo('Initialized the database.')
+
+
+@click.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """
+    Recomputes the weekly and monthly rollups of every pair from the stored daily rows.
+    """
+    with db.get_db_engine().connect() as conn:
+        has_rows = select(MovingAverage.pair_id).where(MovingAverage.pair_id == Pair.id).exists()
+        pairs = conn.execute(select(Pair.name).where(has_rows)).scalars().all()
+
+    for pair in pairs:
+        with db.get_db_engine().begin() as conn:
+            written = rollups.rebuild_rollups(conn, pair)
+        backends.invalidate_pair(pair)
+        click.echo(f'{pair}: {written} rollups written.')
+    click.echo('Rollups rebuilt.')
@@ -1,29 +1,336 @@
 import os
+import re
+import threading
+import time
 
-from flask import current_app, g
-from sqlalchemy import create_engine, text
+from flask import current_app
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+from mb_mms.models.pair_averages import MovingAverage
+
+
+class PoolStats:
+    """
+    Thread-safe counters describing how the process-wide connection pool is used.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Sets every counter back to zero.
+        """
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_checkout(self, wait: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def incr(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'wait_total_seconds': self.wait_total,
+                'wait_avg_seconds': self.wait_total / attempts if attempts else 0.0,
+                'wait_max_seconds': self.wait_max,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that measures how long each checkout waits for a connection.
+    """
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            conn = super().connect()
+        except PoolTimeoutError:
+            pool_stats.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record_checkout(time.perf_counter() - start)
+        return conn
+
+
+pool_stats = PoolStats()
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(url: str):
+    """
+    Builds the `create_engine` keyword arguments for the given database URL.
+
+    The pool is configured from the environment:
+        - `DB_POOL_SIZE`: Connections kept open in the pool (default 5).
+        - `DB_MAX_OVERFLOW`: Extra connections allowed above the pool size (default 10).
+        - `DB_POOL_TIMEOUT`: Seconds to wait for a free connection (default 30).
+        - `DB_POOL_RECYCLE`: Seconds after which a connection is replaced (default 3600).
+        - `DB_POOL_PRE_PING`: Test connections on checkout (default true).
+
+    SQLite keeps the pool SQLAlchemy picks for it, since the sizing options do not apply.
+    """
+    options = {'echo': False, 'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True)}
+    if url.startswith('sqlite'):
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=int(os.getenv('DB_POOL_SIZE', '5')),
+        max_overflow=int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        pool_timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        pool_recycle=int(os.getenv('DB_POOL_RECYCLE', '3600')),
+    )
+    return options
+
+
+def _listen_pool_events(engine) -> None:
+    event.listen(engine, 'connect', lambda *args: pool_stats.incr('connects'))
+    event.listen(engine, 'checkin', lambda *args: pool_stats.incr('checkins'))
+    event.listen(engine, 'invalidate', lambda *args: pool_stats.incr('invalidations'))
 
 
 def get_db_engine():
-    if 'db' not in g:
-        g.db = create_engine(os.getenv('DB_URL', ''), echo=False)
-    return g.db
+    """
+    Returns the process-wide SQLAlchemy engine, creating it on first use.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = os.getenv('DB_URL', '')
+                engine = create_engine(url, **engine_options(url))
+                _listen_pool_events(engine)
+                _engine = engine
+    return _engine
 
 
 def get_db_session():
-    engine = create_engine(os.getenv('DB_URL', ''), echo=False)
-    return Session(engine)
-
-
-def exec_migrations():
-    # TODO: improve to handler more than 1 file
-    with current_app.open_resource('migrations/migration_0.sql', mode='r') as f:
-        stmts = f.read().strip().split(';')
-        with Session(get_db_engine()) as session, session.begin():
-            try:
-                [session.execute(text(stmt)) for stmt in stmts if stmt != '']
-                session.commit()
-            except Exception as err:
-                session.rollback()
-                print('migration error: ', err)
+    return Session(get_db_engine())
+
+
+def dispose_db_engine(close: bool = True) -> None:
+    """
+    Drops the process-wide engine so the next `get_db_engine` call builds a new one.
+
+    Args:
+        close (bool): Whether to close the pooled connections. Pass False in a forked child,
+                      where the sockets still belong to the parent process.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose(close=close)
+        _engine = None
+    pool_stats.reset()
+
+
+def _after_fork_in_child() -> None:
+    # Connections inherited from the parent (e.g. gunicorn --preload) must never be
+    # shared, so the child starts with a fresh pool and leaves the parent's sockets alone.
+    global _engine_lock
+    _engine_lock = threading.Lock()
+    dispose_db_engine(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_pool_stats():
+    """
+    Returns the connection pool status and checkout counters for this process.
+    """
+    stats = pool_stats.as_dict()
+    stats['pid'] = os.getpid()
+    pool = _engine.pool if _engine is not None else None
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
+def get_batch_size() -> int:
+    """
+    Returns the number of rows written per statement, read from `DB_BATCH_SIZE` (default 1000).
+    """
+    return int(os.getenv('DB_BATCH_SIZE', '1000'))
+
+
+def upsert_statement(dialect: str, table, keys, update_columns):
+    """
+    Builds an insert on `table` that updates `update_columns` when a row with the same `keys` exists.
+    """
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(table)
+        return stmt.on_duplicate_key_update({col: stmt.inserted[col] for col in update_columns})
+
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={col: stmt.excluded[col] for col in update_columns},
+        )
+
+    raise ValueError(f'upsert not supported for dialect {dialect}')
+
+
+def upsert_moving_averages(conn, rows, batch_size=None):
+    """
+    Writes moving average rows in batches, updating the ones that already exist.
+
+    Each batch is sent as a single executemany `INSERT ... ON DUPLICATE KEY UPDATE` on MySQL
+    (`ON CONFLICT DO UPDATE` on SQLite/PostgreSQL), so re-running a backfill never trips the
+    (pair_id, timestamp) primary key. Pair names are mapped to their ids with `pairs.ensure_ids`,
+    creating the pairs seen for the first time.
+
+    Args:
+        conn: An open SQLAlchemy connection. The caller owns the transaction.
+        rows (List[Dict]): Rows with the `pair`, `timestamp`, `mms_20`, `mms_50` and `mms_200` keys.
+        batch_size (int, optional): Rows per statement. Defaults to `get_batch_size()`.
+
+    Returns:
+        int: The number of rows sent to the database.
+    """
+    from mb_mms.services.data import pairs
+
+    if batch_size is None:
+        batch_size = get_batch_size()
+    if batch_size < 1:
+        raise ValueError('batch size must be at least 1')
+    if not rows:
+        return 0
+
+    ids = pairs.ensure_ids(conn, (row['pair'] for row in rows))
+    stmt = upsert_statement(
+        conn.dialect.name, MovingAverage.__table__, ('pair_id', 'timestamp'), ('mms_20', 'mms_50', 'mms_200')
+    )
+    for offset in range(0, len(rows), batch_size):
+        conn.execute(stmt, [
+            {'pair_id': ids[row['pair']], 'timestamp': row['timestamp'], 'mms_20': row['mms_20'],
+             'mms_50': row['mms_50'], 'mms_200': row['mms_200']}
+            for row in rows[offset:offset + batch_size]
+        ])
+    return len(rows)
+
+
+MIGRATION_FILE = re.compile(r'^migration_(\d+)\.sql$')
+
+
+def list_migrations(directory: str):
+    """
+    Returns the (version, path) of every `migration_<version>.sql` file in the directory, in version order.
+    """
+    migrations = []
+    for name in os.listdir(directory):
+        match = MIGRATION_FILE.match(name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(migrations)
+
+
+def split_statements(sql: str):
+    """
+    Splits a migration file into statements, dropping `--` comment lines.
+    """
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def applied_migrations(conn):
+    """
+    Returns the versions recorded in `schema_migrations`, creating the table when it is missing.
+    """
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        ' version INT NOT NULL,'
+        ' name VARCHAR(255) NOT NULL,'
+        ' applied_at BIGINT NOT NULL,'
+        ' PRIMARY KEY (version))'
+    ))
+    return set(conn.execute(text('SELECT version FROM schema_migrations')).scalars())
+
+
+def exec_migrations(directory: str = None):
+    """
+    Applies the pending migrations in version order.
+
+    Applied versions are recorded in `schema_migrations`, so running it again only applies new
+    files and never touches existing data. Each migration runs in its own transaction (MySQL
+    commits DDL implicitly, so a failing file may be partially applied); the first failure stops
+    the run and later versions stay pending.
+
+    Args:
+        directory (str, optional): Folder holding the `migration_<version>.sql` files. Defaults to
+                                   the application's `migrations` folder.
+
+    Returns:
+        List[int]: The versions applied by this run.
+
+    Raises:
+        Exception: The error of the first failing migration. The versions before it stay applied.
+    """
+    if directory is None:
+        directory = os.path.join(current_app.root_path, 'migrations')
+
+    engine = get_db_engine()
+    with engine.begin() as conn:
+        done = applied_migrations(conn)
+
+    applied = []
+    for version, path in list_migrations(directory):
+        if version in done:
+            continue
+        with open(path, mode='r') as f:
+            stmts = split_statements(f.read())
+        with engine.begin() as conn:
+            for stmt in stmts:
+                conn.execute(text(stmt))
+            conn.execute(
+                text('INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)'),
+                {'version': version, 'name': os.path.basename(path), 'applied_at': int(time.time())},
+            )
+        applied.append(version)
+    return applied
@@ -0,0 +1,170 @@
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from mb_mms.models.indicators import IndicatorState, IndicatorValue
+from mb_mms.services.data import closes as closes_store
+from mb_mms.services.data import db
+from mb_mms.services.data.rows import Rows
+from mb_mms.services.mb_api import indicators
+from mb_mms.services.mb_api.indicators import Indicator
+
+Spec = Tuple[str, int]
+
+
+def pack_state(indicator: Indicator) -> bytes:
+    """
+    Serializes the state of an indicator as little-endian float64 values.
+    """
+    values = array('d', indicator.state())
+    if sys.byteorder == 'big':  # pragma: no cover
+        values.byteswap()
+    return values.tobytes()
+
+
+def unpack_state(name: str, period: int, data: bytes) -> Indicator:
+    """
+    Restores an indicator serialized by `pack_state`.
+    """
+    values = array('d')
+    values.frombytes(data)
+    if sys.byteorder == 'big':  # pragma: no cover
+        values.byteswap()
+    return indicators.create(name, period).restore(values)
+
+
+def upsert_values(conn, pair: str, name: str, period: int, timestamps: Sequence[int],
+                  values: Sequence[Optional[float]], batch_size: int = None) -> int:
+    """
+    Stores the values of one indicator, updating the days that already exist.
+
+    Returns:
+        int: The number of rows sent to the database.
+    """
+    if batch_size is None:
+        batch_size = db.get_batch_size()
+    if batch_size < 1:
+        raise ValueError('batch size must be at least 1')
+
+    rows = [
+        {'pair': pair, 'indicator': name, 'period': period, 'timestamp': timestamp, 'value': value}
+        for timestamp, value in zip(timestamps, values)
+    ]
+    stmt = db.upsert_statement(conn.dialect.name, IndicatorValue.__table__,
+                               ('pair', 'indicator', 'period', 'timestamp'), ('value',))
+    for offset in range(0, len(rows), batch_size):
+        conn.execute(stmt, rows[offset:offset + batch_size])
+    return len(rows)
+
+
+def load_state(conn, pair: str, name: str, period: int) -> Optional[Tuple[Indicator, int]]:
+    """
+    Returns the stored indicator of the pair and the timestamp of the last close it saw, or None.
+    """
+    row = conn.execute(
+        select(IndicatorState.timestamp, IndicatorState.state)
+        .where(IndicatorState.pair == pair)
+        .where(IndicatorState.indicator == name)
+        .where(IndicatorState.period == period)
+    ).first()
+    if row is None:
+        return None
+    return unpack_state(name, period, row.state), row.timestamp
+
+
+def save_state(conn, pair: str, indicator: Indicator, timestamp: int) -> None:
+    """
+    Stores the state of an indicator after the close at `timestamp`.
+    """
+    stmt = db.upsert_statement(conn.dialect.name, IndicatorState.__table__,
+                               ('pair', 'indicator', 'period'), ('timestamp', 'state'))
+    conn.execute(stmt, [{'pair': pair, 'indicator': indicator.name, 'period': indicator.window,
+                         'timestamp': timestamp, 'state': pack_state(indicator)}])
+
+
+def write_series(conn, pair: str, closes: Sequence[float], timestamps: Sequence[int],
+                 specs: Iterable[Spec] = None, batch_size: int = None, since: int = None) -> int:
+    """
+    Batch path: computes every indicator over the whole series, stores the values and the final state.
+
+    With `since`, only the values from that timestamp on are written: the earlier ones do not
+    depend on the closes stored at or after it.
+
+    Args:
+        conn: An open SQLAlchemy connection. The caller owns the transaction.
+        pair (str): The currency pair of the closes.
+        closes (Sequence[float]): The closes, oldest first.
+        timestamps (Sequence[int]): The timestamps matching `closes`.
+        specs (Iterable[Spec], optional): The (name, period) indicators. Defaults to `MMS_INDICATORS`.
+        batch_size (int, optional): Rows per statement. Defaults to `db.get_batch_size()`.
+        since (int, optional): The timestamp of the first value to write. Defaults to the first close.
+
+    Returns:
+        int: The number of values written.
+    """
+    if not closes:
+        return 0
+    first = 0 if since is None else bisect_left(timestamps, since)
+    written = 0
+    for name, period in (indicators.configured_specs() if specs is None else specs):
+        indicator = indicators.create(name, period)
+        values = indicator.compute(closes)
+        written += upsert_values(conn, pair, name, period, timestamps[first:], values[first:], batch_size=batch_size)
+        save_state(conn, pair, indicator.resume(closes, values), timestamps[-1])
+    return written
+
+
+def advance(conn, pair: str, rates: Iterable[Tuple[float, int]], specs: Iterable[Spec] = None) -> int:
+    """
+    Incremental path: folds the closes newer than each stored state in O(1) per close.
+
+    An indicator without a state is bootstrapped once from every stored close of the pair, so the
+    caller must store `rates` in `pair_closes` first.
+
+    Args:
+        conn: An open SQLAlchemy connection. The caller owns the transaction.
+        pair (str): The currency pair of the candles.
+        rates (Iterable[Tuple[float, int]]): The (close, timestamp) candles just fetched.
+        specs (Iterable[Spec], optional): The (name, period) indicators. Defaults to `MMS_INDICATORS`.
+
+    Returns:
+        int: The number of values written.
+    """
+    rates = sorted(rates, key=lambda rate: rate[1])
+    written = 0
+    stored = None
+    for name, period in (indicators.configured_specs() if specs is None else specs):
+        loaded = load_state(conn, pair, name, period)
+        if loaded is None:
+            if stored is None:
+                timestamps, closes = closes_store.load_closes(conn, pair)
+                stored = (list(closes), list(timestamps))
+            written += write_series(conn, pair, *stored, specs=[(name, period)])
+            continue
+
+        indicator, last = loaded
+        new = [(close, timestamp) for close, timestamp in rates if timestamp > last]
+        if not new:
+            continue
+        values = [indicator.update(close) for close, _ in new]
+        written += upsert_values(conn, pair, name, period, [timestamp for _, timestamp in new], values)
+        save_state(conn, pair, indicator, new[-1][1])
+    return written
+
+
+def query_values(conn, pair: str, name: str, period: int, start: int, end: int) -> Rows:
+    """
+    Reads the stored values of an indicator in [start, end], in the `search_mms` format.
+    """
+    stmt = (
+        select(IndicatorValue.timestamp, IndicatorValue.value.label('mms'))
+        .where(IndicatorValue.pair == pair)
+        .where(IndicatorValue.indicator == name)
+        .where(IndicatorValue.period == period)
+        .where(IndicatorValue.timestamp.between(start, end))
+        .order_by(IndicatorValue.timestamp)
+    )
+    return Rows.from_result(conn.execute(stmt))
@@ -0,0 +1,135 @@
+"""
+The `pairs` dimension table and the in-process cache of its ids.
+
+`moving_averages` is keyed by the SMALLINT id of each pair instead of its name. Ids never
+change once created, so each process caches the mapping per engine and the searches and the
+writers resolve a name without another query after its first use.
+
+Ids created inside a transaction are only cached once it commits, so a rolled back write never
+leaves the cache pointing at a pair that does not exist.
+"""
+import os
+import threading
+import weakref
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+
+from mb_mms.models.pair_averages import Pair
+from mb_mms.services.data import db
+
+# Engine -> {name: id}
+_ids: 'weakref.WeakKeyDictionary[Engine, Dict[str, int]]' = weakref.WeakKeyDictionary()
+# Transaction -> {name: id} created by it and not committed yet
+_pending: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def ids_statement(names: Iterable[str]):
+    """
+    Builds the query of the (name, id) of the given pairs. Shared by the sync and async serving modes.
+    """
+    return select(Pair.name, Pair.id).where(Pair.name.in_(list(names)))
+
+
+def cached_ids(engine, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the cached id of the given pairs in the database of the engine, leaving out the ones not cached.
+    """
+    with _lock:
+        cached = _ids.get(engine, {})
+        return {name: cached[name] for name in names if name in cached}
+
+
+def remember(engine, ids: Dict[str, int]) -> None:
+    """
+    Caches committed (name, id) pairs of the database of the engine.
+    """
+    with _lock:
+        _ids.setdefault(engine, {}).update(ids)
+
+
+def get_ids(conn, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the id of each existing pair, querying only the names that are not cached.
+
+    Args:
+        conn: An open SQLAlchemy connection.
+        names (Iterable[str]): The pair names.
+
+    Returns:
+        Dict[str, int]: The id of every pair found. Unknown pairs are left out and not cached.
+    """
+    names = list(dict.fromkeys(names))
+    pending = _pending.get(conn.get_transaction(), {}) if conn.in_transaction() else {}
+    res = cached_ids(conn.engine, names)
+    res.update({name: pending[name] for name in names if name in pending and name not in res})
+
+    missing = [name for name in names if name not in res]
+    if missing:
+        found = dict(conn.execute(ids_statement(missing)).all())
+        remember(conn.engine, found)
+        res.update(found)
+    return res
+
+
+def get_id(conn, name: str) -> Optional[int]:
+    """
+    Returns the id of a pair, or None if it does not exist.
+    """
+    return get_ids(conn, [name]).get(name)
+
+
+def ensure_ids(conn, names: Iterable[str]) -> Dict[str, int]:
+    """
+    Returns the id of each pair, creating the pairs that do not exist yet.
+
+    The new pairs are part of the caller's transaction and are cached when it commits.
+
+    Args:
+        conn: An open SQLAlchemy connection. The caller owns the transaction.
+        names (Iterable[str]): The pair names.
+
+    Returns:
+        Dict[str, int]: The id of every pair.
+    """
+    names = list(dict.fromkeys(names))
+    res = get_ids(conn, names)
+    missing = [name for name in names if name not in res]
+    if not missing:
+        return res
+
+    # Concurrent writers may create the same pair; the upsert keeps the first id
+    stmt = db.upsert_statement(conn.dialect.name, Pair.__table__, ('name',), ('name',))
+    conn.execute(stmt, [{'name': name} for name in missing])
+    created = dict(conn.execute(ids_statement(missing)).all())
+    _pending.setdefault(conn.get_transaction(), {}).update(created)
+    res.update(created)
+    return res
+
+
+@event.listens_for(Engine, 'commit')
+def _on_commit(conn) -> None:
+    created = _pending.pop(conn.get_transaction(), None)
+    if created:
+        remember(conn.engine, created)
+
+
+def reset_pair_ids() -> None:
+    """
+    Forgets every cached id, e.g. after the tables were recreated.
+    """
+    with _lock:
+        _ids.clear()
+        _pending.clear()
+
+
+def _after_fork_in_child() -> None:
+    # The parent may have held the lock while forking
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import func, select
+
+from mb_mms.models.pair_averages import MovingAverage
+from mb_mms.models.rollups import MovingAverageRollup
+from mb_mms.services.data import db
+from mb_mms.services.data import pairs as pair_store
+
+DAILY = '1d'
+WEEKLY = '1w'
+MONTHLY = '1M'
+RESOLUTIONS = (WEEKLY, MONTHLY)
+WINDOWS = (20, 50, 200)
+STATS = ('last', 'min', 'max', 'mean')
+
+
+def bucket_start(timestamp: int, resolution: str) -> int:
+    """
+    Returns the UTC start of the week (Monday) or month holding the timestamp.
+    """
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == WEEKLY:
+        return int((day - timedelta(days=day.weekday())).timestamp())
+    if resolution == MONTHLY:
+        return int(day.replace(day=1).timestamp())
+    raise ValueError(f'unsupported resolution {resolution}')
+
+
+def bucket_end(timestamp: int, resolution: str) -> int:
+    """
+    Returns the UTC start of the bucket following the one holding the timestamp.
+    """
+    start = datetime.fromtimestamp(bucket_start(timestamp, resolution), tz=timezone.utc)
+    if resolution == WEEKLY:
+        return int((start + timedelta(days=7)).timestamp())
+    year, month = (start.year + 1, 1) if start.month == 12 else (start.year, start.month + 1)
+    return int(start.replace(year=year, month=month).timestamp())
+
+
+def aggregate(pair: str, resolution: str, bucket: int, rows: List[Any]) -> Dict[str, Any]:
+    """
+    Builds the rollup row of one bucket from its daily rows, oldest first.
+
+    `last` is the value of the newest day; min, max and mean skip the days without a value.
+    """
+    out = {'pair': pair, 'resolution': resolution, 'bucket': bucket,
+           'last_timestamp': rows[-1].timestamp, 'count': len(rows)}
+    for window in WINDOWS:
+        column = f'mms_{window}'
+        values = [getattr(row, column) for row in rows if getattr(row, column) is not None]
+        out[f'{column}_last'] = getattr(rows[-1], column)
+        out[f'{column}_min'] = min(values) if values else None
+        out[f'{column}_max'] = max(values) if values else None
+        out[f'{column}_mean'] = sum(values) / len(values) if values else None
+    return out
+
+
+def refresh_rollups(conn, pair: str, first: int, last: int) -> int:
+    """
+    Recomputes the weekly and monthly rollups of every bucket touched by [first, last].
+
+    Called by the writers in the same transaction as the daily rows, so the rollups never lag
+    behind `moving_averages`. The daily rows of the affected buckets are read with one query.
+
+    Args:
+        conn: An open SQLAlchemy connection. The caller owns the transaction.
+        pair (str): The currency pair whose daily rows changed.
+        first (int): The oldest timestamp written.
+        last (int): The newest timestamp written.
+
+    Returns:
+        int: The number of rollup rows written.
+    """
+    ranges = {resolution: (bucket_start(first, resolution), bucket_end(last, resolution))
+              for resolution in RESOLUTIONS}
+    lower = min(start for start, _ in ranges.values())
+    upper = max(end for _, end in ranges.values())
+
+    stmt = (
+        select(MovingAverage.timestamp, MovingAverage.mms_20, MovingAverage.mms_50, MovingAverage.mms_200)
+        .where(MovingAverage.pair_id == pair_store.get_id(conn, pair))
+        .where(MovingAverage.timestamp >= lower)
+        .where(MovingAverage.timestamp < upper)
+        .order_by(MovingAverage.timestamp)
+    )
+    daily = conn.execute(stmt).all()
+
+    rollups = []
+    for resolution, (start, end) in ranges.items():
+        buckets = {}
+        for row in daily:
+            if start <= row.timestamp < end:
+                buckets.setdefault(bucket_start(row.timestamp, resolution), []).append(row)
+        rollups.extend(aggregate(pair, resolution, bucket, rows) for bucket, rows in buckets.items())
+
+    if rollups:
+        update = [column.name for column in MovingAverageRollup.__table__.columns if not column.primary_key]
+        stmt = db.upsert_statement(conn.dialect.name, MovingAverageRollup.__table__,
+                                   ('pair', 'resolution', 'bucket'), update)
+        conn.execute(stmt, rollups)
+    return len(rollups)
+
+
+def refresh_for_rows(conn, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Recomputes the rollups touched by freshly written `moving_averages` rows, pair by pair.
+    """
+    spans = {}
+    for row in rows:
+        first, last = spans.get(row['pair'], (row['timestamp'], row['timestamp']))
+        spans[row['pair']] = (min(first, row['timestamp']), max(last, row['timestamp']))
+    return sum(refresh_rollups(conn, pair, first, last) for pair, (first, last) in spans.items())
+
+
+def rebuild_rollups(conn, pair: str) -> int:
+    """
+    Recomputes every rollup of the pair from its stored daily rows.
+    """
+    first, last = conn.execute(
+        select(func.min(MovingAverage.timestamp), func.max(MovingAverage.timestamp))
+        .where(MovingAverage.pair_id == pair_store.get_id(conn, pair))
+    ).one()
+    if first is None:
+        return 0
+    return refresh_rollups(conn, pair, first, last)
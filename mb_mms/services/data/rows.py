@@ -0,0 +1,49 @@
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Iterator
+
+
+class Rows(Sequence):
+    """
+    Query results kept as the column names plus one tuple per row.
+
+    Read queries return this instead of a list of dicts: no dict is allocated per row, the
+    cache stores the tuples as they are and the JSON layer encodes them column by column
+    (`api.serialization`). It still behaves as the list of dicts callers expect: indexing and
+    iteration build the row dicts on access, and it compares equal to the equivalent list.
+    """
+
+    __slots__ = ('columns', 'tuples')
+
+    def __init__(self, columns: Iterable[str], tuples: Sequence) -> None:
+        self.columns = tuple(columns)
+        self.tuples = tuples
+
+    @classmethod
+    def from_result(cls, result) -> 'Rows':
+        """
+        Reads every row of a SQLAlchemy result; its rows already are tuples.
+        """
+        return cls(result.keys(), result.all())
+
+    def __len__(self) -> int:
+        return len(self.tuples)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Rows(self.columns, self.tuples[index])
+        return dict(zip(self.columns, self.tuples[index]))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        columns = self.columns
+        for values in self.tuples:
+            yield dict(zip(columns, values))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Rows):
+            return self.columns == other.columns and list(map(tuple, self.tuples)) == list(map(tuple, other.tuples))
+        if isinstance(other, list):
+            return list(self) == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'Rows({list(self)!r})'
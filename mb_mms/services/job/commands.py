@@ -0,0 +1,47 @@
+import os
+import signal
+import threading
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from mb_mms.services.job.leader import JobRunner, LeaderLock
+
+
+@click.command('run-jobs')
+@click.option('--lease-ttl', type=click.IntRange(min=1), default=None,
+              help='Seconds the leader lock is held without renewal (defaults to SCHEDULER_LEASE_TTL or 60).')
+@click.option('--interval', type=click.FloatRange(min=0, min_open=True), default=None,
+              help='Seconds between lease renewals (defaults to a third of the lease TTL).')
+@with_appcontext
+def run_jobs(lease_ttl, interval):
+    """
+    Runs the scheduled jobs (the daily MMS computation) in this process.
+
+    The web workers do not start the scheduler; run this command in one or more dedicated
+    processes instead. They compete for a lease in the `leases` table and only the holder runs
+    jobs, the others stand by and take over once the leader stops renewing it. Stops on SIGINT
+    or SIGTERM, releasing the lease.
+
+    Environment Variables:
+        - `SCHEDULER_LEASE_TTL`: Default of `--lease-ttl`.
+        - `SCHEDULER_INCREMENTAL`: Whether the daily job updates the pairs incrementally.
+    """
+    from mb_mms.services.job.scheduler import Scheduler
+
+    if lease_ttl is None:
+        lease_ttl = int(os.getenv('SCHEDULER_LEASE_TTL', '60'))
+    if interval is None:
+        interval = lease_ttl / 3
+
+    # The job checks the lease between pairs, so a run stops once another runner leads
+    scheduler = Scheduler(current_app._get_current_object(), leading=lambda: runner.leader).scheduler
+    runner = JobRunner(scheduler, LeaderLock(ttl=lease_ttl), interval)
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    click.echo(f'Job runner {runner.lock.owner} started.')
+    runner.run(stop)
+    click.echo('Job runner stopped.')
@@ -0,0 +1,162 @@
+import sys
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from mb_mms.models.pair_averages import MovingAverage
+from mb_mms.models.rolling_state import RollingState
+from mb_mms.services.cache import backends
+from mb_mms.services.data import closes as closes_store
+from mb_mms.services.data import db, rollups
+from mb_mms.services.data import indicators as indicator_store
+from mb_mms.services.data import pairs as pair_store
+from mb_mms.services.mb_api.moving_average import RunningMean
+
+DAY = 86400
+WINDOWS = (20, 50, 200)
+
+Rates = List[Tuple[float, int]]
+
+
+class RollingWindows:
+    """
+    The per-pair state of the daily job: the running 20/50/200 windows and the last candle seen.
+
+    Only the trailing closes are persisted; the compensated running sums are rebuilt from them
+    when the state is loaded, which takes a single pass over at most 200 values.
+    """
+
+    __slots__ = ('means', 'timestamp')
+
+    def __init__(self, closes: Iterable[float] = (), timestamp: Optional[int] = None) -> None:
+        self.means = {window: RunningMean(window) for window in WINDOWS}
+        self.timestamp = timestamp
+        for close in closes:
+            for running in self.means.values():
+                running.push(close)
+
+    def push(self, close: float, timestamp: int) -> Dict[str, Any]:
+        """
+        Adds a candle in O(1) and returns its `moving_averages` row values.
+        """
+        self.timestamp = timestamp
+        row = {'timestamp': timestamp}
+        for window, running in self.means.items():
+            row[f'mms_{window}'] = running.push(close)
+        return row
+
+    def closes(self) -> List[float]:
+        """
+        Returns the trailing closes, oldest first.
+        """
+        return list(self.means[max(WINDOWS)].values)
+
+    def pack(self) -> bytes:
+        """
+        Serializes the trailing closes as little-endian float64 values.
+        """
+        values = array('d', self.closes())
+        if sys.byteorder == 'big':  # pragma: no cover
+            values.byteswap()
+        return values.tobytes()
+
+    @classmethod
+    def unpack(cls, data: bytes, timestamp: int) -> 'RollingWindows':
+        """
+        Restores a state serialized by `pack`.
+        """
+        values = array('d')
+        values.frombytes(data)
+        if sys.byteorder == 'big':  # pragma: no cover
+            values.byteswap()
+        return cls(closes=values, timestamp=timestamp)
+
+
+def load_state(conn, pair: str) -> Optional[RollingWindows]:
+    """
+    Returns the stored rolling state of the pair, or None if the pair has none yet.
+    """
+    row = conn.execute(
+        select(RollingState.timestamp, RollingState.closes).where(RollingState.pair == pair)
+    ).first()
+    if row is None:
+        return None
+    return RollingWindows.unpack(row.closes, row.timestamp)
+
+
+def save_state(conn, pair: str, state: RollingWindows) -> None:
+    """
+    Stores the rolling state of the pair.
+    """
+    stmt = db.upsert_statement(conn.dialect.name, RollingState.__table__, ('pair',), ('timestamp', 'closes'))
+    conn.execute(stmt, [{'pair': pair, 'timestamp': state.timestamp, 'closes': state.pack()}])
+
+
+def last_stored_timestamp(conn, pair: str) -> Optional[int]:
+    """
+    Returns the timestamp of the newest `moving_averages` row of the pair, or None.
+    """
+    stmt = select(func.max(MovingAverage.timestamp)).where(MovingAverage.pair_id == pair_store.get_id(conn, pair))
+    return conn.execute(stmt).scalar()
+
+
+def update_pair(fetch: Callable[[int, int], Rates], pair: str, end: int) -> int:
+    """
+    Brings the moving averages of a pair up to `end` from its stored rolling state.
+
+    With a state, only the candles after the last one seen are fetched, and each new candle is
+    folded into the windows in O(1). Every missing day is written, so gaps left by failed runs
+    are backfilled automatically. Without a state, it is rebuilt from the candles preceding the
+    first day to write: the day after the newest stored row, or `end` for a new pair. The new
+    closes are stored and the `MMS_INDICATORS` indicators advanced in the same transaction.
+
+    Args:
+        fetch (Callable[[int, int], Rates]): Fetches the (close, timestamp) candles of a range.
+        pair (str): The currency pair to update.
+        end (int): The timestamp of the last day to compute.
+
+    Returns:
+        int: The number of rows written; 0 if the pair was already up to date.
+
+    Raises:
+        Exception: If upstream has no candle for the missing days yet ('missed registers').
+    """
+    engine = db.get_db_engine()
+    with engine.connect() as conn:
+        state = load_state(conn, pair)
+        since = state.timestamp if state is not None else last_stored_timestamp(conn, pair)
+
+    known = since is not None
+    if not known:
+        since = end - DAY
+
+    if state is None:
+        warmup_start = since + 1 - (max(WINDOWS) - 1) * DAY
+        rates = sorted(fetch(warmup_start, end), key=lambda rate: rate[1])
+        state = RollingWindows(closes=[rate for rate, ts in rates if ts <= since][-max(WINDOWS):])
+    else:
+        rates = sorted(fetch(since + 1, end), key=lambda rate: rate[1])
+
+    rows = []
+    for rate, timestamp in rates:
+        if timestamp <= since:
+            continue
+        row = state.push(rate, timestamp)
+        row['pair'] = pair
+        rows.append(row)
+
+    if not rows:
+        # Yesterday's candle may not be published yet; raising lets the retries pick it up
+        if known and since >= end:
+            return 0
+        raise Exception('missed registers')
+
+    with engine.begin() as conn:
+        db.upsert_moving_averages(conn, rows)
+        closes_store.upsert_closes(conn, pair, rates)
+        indicator_store.advance(conn, pair, rates)
+        rollups.refresh_for_rows(conn, rows)
+        save_state(conn, pair, state)
+    backends.invalidate_pair(pair)
+    return len(rows)
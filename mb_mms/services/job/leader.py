@@ -0,0 +1,132 @@
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from mb_mms.models.leases import Lease
+from mb_mms.services.data import db
+
+SCHEDULER_LEASE = 'scheduler'
+
+
+def default_owner() -> str:
+    """
+    Identifies this process as `<host>:<pid>`.
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class LeaderLock:
+    """
+    A lease on a row of the `leases` table, held by at most one process at a time.
+
+    `acquire` takes the lease when it is free or expired and extends it when this owner already
+    holds it; it must be called again well within `ttl` seconds to keep the lease. A holder
+    that stops renewing (crash, network partition) loses it after `ttl`, and another process
+    takes over. Expiry is compared against each process's clock, so `ttl` must exceed the clock
+    skew between the hosts.
+    """
+
+    def __init__(self, name: str = SCHEDULER_LEASE, owner: Optional[str] = None, ttl: int = 60,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.name = name
+        self.owner = owner or default_owner()
+        self.ttl = ttl
+        self._clock = clock
+
+    def acquire(self) -> bool:
+        """
+        Takes or renews the lease.
+
+        Returns:
+            bool: Whether this owner holds the lease until `ttl` seconds from now.
+        """
+        now = int(self._clock())
+        values = {'owner': self.owner, 'expires': now + self.ttl}
+        engine = db.get_db_engine()
+        with engine.begin() as conn:
+            # A single conditional UPDATE, so two processes cannot both take an expired lease
+            taken = conn.execute(
+                update(Lease)
+                .where(Lease.name == self.name, or_(Lease.owner == self.owner, Lease.expires < now))
+                .values(**values)
+            ).rowcount
+        if taken:
+            return True
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(insert(Lease).values(name=self.name, **values))
+        except IntegrityError:
+            # Another process holds the lease, or created it first
+            return False
+        return True
+
+    def release(self) -> None:
+        """
+        Gives the lease up if this owner holds it, so a standby takes over without waiting for `ttl`.
+        """
+        with db.get_db_engine().begin() as conn:
+            conn.execute(delete(Lease).where(Lease.name == self.name, Lease.owner == self.owner))
+
+
+class JobRunner:
+    """
+    Runs the scheduler's jobs only while holding the leader lock.
+
+    The scheduler is started paused. Every `interval` seconds the runner renews the lease and
+    resumes the scheduler when it holds it, or pauses it when it does not (the lease was lost or
+    another runner leads), so any number of runners can be deployed and exactly one runs jobs.
+    A failing renewal is treated as a lost lease. Pausing does not stop a run already started,
+    so the jobs check `leader` between units of work (`Scheduler.compute_mms`).
+    """
+
+    def __init__(self, scheduler, lock: LeaderLock, interval: float) -> None:
+        self.scheduler = scheduler
+        self.lock = lock
+        self.interval = interval
+        self.leader = False
+
+    def step(self) -> bool:
+        """
+        Renews the lease once and pauses or resumes the scheduler to match.
+
+        Returns:
+            bool: Whether this runner is the leader.
+        """
+        try:
+            leader = self.lock.acquire()
+        except Exception as err:
+            print('leader lock error: ', err)
+            leader = False
+
+        if leader and not self.leader:
+            self.scheduler.resume()
+            print(f'{self.lock.owner} is the leader, scheduler resumed')
+        elif self.leader and not leader:
+            self.scheduler.pause()
+            print(f'{self.lock.owner} lost the leader lock, scheduler paused')
+        self.leader = leader
+        return leader
+
+    def run(self, stop: threading.Event) -> None:
+        """
+        Starts the scheduler paused and renews the lease until `stop` is set, then shuts down.
+        """
+        self.scheduler.start(paused=True)
+        try:
+            while not stop.is_set():
+                self.step()
+                stop.wait(self.interval)
+        finally:
+            self.scheduler.shutdown()
+            if self.leader:
+                self.leader = False
+                try:
+                    self.lock.release()
+                except Exception as err:
+                    print('leader lock error: ', err)
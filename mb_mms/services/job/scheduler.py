@@ -3,19 +3,30 @@ import time
 import pytz
 from datetime import datetime, timedelta
 from flask_apscheduler import APScheduler
-from tenacity import retry, wait_fixed
+from tenacity import Retrying, retry_if_not_exception_type, stop_after_attempt, wait_exponential
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 
 
-from mb_mms.models.pair_averages import MovingAverage
-from mb_mms.services.data import db
+from mb_mms.services.cache import backends
+from mb_mms.services.data import closes as closes_store
+from mb_mms.services.data import db, rollups
+from mb_mms.services.data import indicators as indicator_store
+from mb_mms.services.job import incremental
+from mb_mms.services.mb_api import fetcher
 from mb_mms.services.mb_api.mb_api import MB_API
+from mb_mms.services.metrics import instruments
+
+
+class LeaseLost(Exception):
+    """
+    Raised before a pair is computed when this process no longer holds the scheduler lease.
+    """
 
 
 class Scheduler:
     scheduler = APScheduler()
 
-    def __init__(self, app, max_retries=10):
+    def __init__(self, app, max_retries=10, incremental=None, leading=None):
 
         self.scheduler.init_app(app=app)
 
@@ -34,18 +45,46 @@ class Scheduler:
         )
 
         self.max_retries = max_retries
-        self.attempts = 0
-
-
-    def register_retry(self):
-        self.attempts += 1
-        if self.attempts > self.max_retries:
-            # TODO: throw alert
-            print('maximum retries reached')
-
-
-    @retry(wait=wait_fixed(600))
-    def compute_mms(self):
+        self.failures = 0
+        if incremental is None:
+            incremental = os.getenv('SCHEDULER_INCREMENTAL', 'true').lower() in ('1', 'true', 'yes', 'on')
+        self.incremental = incremental
+        # Tells whether this process still holds the scheduler lease (`JobRunner.leader`)
+        self.leading = leading
+
+
+    def register_retry(self, state):
+        instruments.JOB_RETRIES.inc()
+        print(f'retrying {state.args[1]} (attempt {state.attempt_number}): {state.outcome.exception()}')
+
+
+    def register_failure(self, pair, err):
+        self.failures += 1
+        instruments.JOB_FAILURES.inc()
+        print(f'maximum retries reached for {pair}: {err}')
+        # TODO: throw alert
+
+
+    def compute_mms(self, workers=None):
+        """
+        Brings the moving averages of every pair in `PAIRS` up to yesterday.
+
+        Each pair is an independent task on a bounded thread pool with its own exponential
+        backoff, so a failing pair is retried alone while the others complete, and the job takes
+        as long as its slowest pair. The writes are upserts, so a retried pair never conflicts
+        with rows it already stored.
+
+        Environment Variables:
+            - `SCHEDULER_WORKERS`: Pairs computed concurrently (defaults to `MB_API_MAX_WORKERS`).
+            - `SCHEDULER_RETRY_WAIT`: Seconds before the first retry of a pair (default 30); the
+              wait doubles on each attempt.
+            - `SCHEDULER_RETRY_MAX_WAIT`: Upper bound of the wait between retries (default 600).
+
+        Returns:
+            Dict[str, Dict]: `completed` maps each pair that succeeded to the rows it wrote,
+                             `failed` each pair that ran out of attempts to its last error and
+                             `aborted` lists the pairs skipped after the lease was lost.
+        """
         mb = MB_API()
 
         end = datetime.now(pytz.timezone('America/Sao_Paulo')) - timedelta(days=1)
@@ -54,34 +93,89 @@ class Scheduler:
         end_unix = int(time.mktime(datetime.strptime(end.strftime('%Y-%m-%d'), '%Y-%m-%d').timetuple()))
         start_unix = int(time.mktime(datetime.strptime(start, '%Y-%m-%d').timetuple()))
 
-        pairs = os.getenv('PAIRS', '').split(',')
-
-        try:
-            for pair in pairs:
-
-                rates = mb.request_rate(pair=pair, start=start_unix, end=end_unix)
-
-                if len(rates) != 200:
-                    raise Exception('missed registers')
-
-                mms_200 = mb.mms(rates=rates)
-                mms_50 = mb.mms(rates=rates[-50:])
-                mms_20 = mb.mms(rates=rates[-20:])
-
-
-                with db.get_db_session() as session, session.begin():
-                    try:
-                        obj = MovingAverage()
-                        obj.pair, obj.timestamp = pair, end_unix
-                        obj.mms_20, obj.mms_50, obj.mms_200 = mms_20[0], mms_50[0], mms_200[0]
-                        session.add(obj)
-                        session.commit()
-                        print('new register added')
-                    except Exception as e:
-                        session.rollback()
-                        raise e
+        pairs = [pair for pair in os.getenv('PAIRS', '').split(',') if pair]
+        if workers is None and os.getenv('SCHEDULER_WORKERS'):
+            workers = int(os.getenv('SCHEDULER_WORKERS'))
+
+        retrying = Retrying(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait_exponential(multiplier=float(os.getenv('SCHEDULER_RETRY_WAIT', '30')),
+                                  max=float(os.getenv('SCHEDULER_RETRY_MAX_WAIT', '600'))),
+            retry=retry_if_not_exception_type(LeaseLost),
+            before_sleep=self.register_retry,
+            reraise=True,
+        )
 
-        except Exception as e:
-            self.register_retry()
-            print(e)
-            raise e
+        def attempt(mb, pair, start_unix, end_unix):
+            if self.leading is not None and not self.leading():
+                raise LeaseLost(f'scheduler lease lost before {pair}')
+            return self.compute_pair(mb, pair, start_unix, end_unix)
+
+        def run_pair(pair):
+            started = time.perf_counter()
+            try:
+                written = retrying(attempt, mb, pair, start_unix, end_unix)
+            except LeaseLost:
+                raise
+            except Exception:
+                instruments.JOB_PAIR_SECONDS.observe(time.perf_counter() - started, 'failed')
+                raise
+            instruments.JOB_PAIR_SECONDS.observe(time.perf_counter() - started, 'completed')
+            return written
+
+        with instruments.JOB_SECONDS.time('compute_mms'):
+            completed, errors = fetcher.run_concurrently(run_pair, pairs, workers=workers)
+        aborted = sorted(pair for pair, err in errors.items() if isinstance(err, LeaseLost))
+        errors = {pair: err for pair, err in errors.items() if not isinstance(err, LeaseLost)}
+        for pair, err in errors.items():
+            self.register_failure(pair, err)
+
+        print(f'completed pairs: {", ".join(sorted(completed)) or "none"}')
+        if errors:
+            print(f'failed pairs: {", ".join(sorted(errors))}')
+        if aborted:
+            print(f'scheduler lease lost, aborted pairs: {", ".join(aborted)}')
+        return {
+            'completed': completed,
+            'failed': {pair: str(err) for pair, err in errors.items()},
+            'aborted': aborted,
+        }
+
+
+    def compute_pair(self, mb, pair, start_unix, end_unix):
+        """
+        Computes and stores the moving averages of one pair, returning the number of rows written.
+
+        Incrementally, only the candles after the pair's last stored day are fetched, so missed
+        days are backfilled on the next run. Otherwise the last 200 candles are fetched and the
+        row of `end_unix` is recomputed from them.
+
+        Raises:
+            Exception: If upstream does not have every candle yet ('missed registers').
+        """
+        if self.incremental:
+            written = incremental.update_pair(
+                fetch=lambda start, end: mb.fetch_rate(pair=pair, start=start, end=end),
+                pair=pair, end=end_unix,
+            )
+            print(f'{written} new registers added for {pair}')
+            return written
+
+        rates = mb.fetch_rate(pair=pair, start=start_unix, end=end_unix)
+        if len(rates) != 200:
+            raise Exception('missed registers')
+
+        row = {
+            'pair': pair, 'timestamp': end_unix,
+            'mms_20': mb.mms(rates=rates[-20:])[0],
+            'mms_50': mb.mms(rates=rates[-50:])[0],
+            'mms_200': mb.mms(rates=rates)[0],
+        }
+        with db.get_db_engine().begin() as conn:
+            db.upsert_moving_averages(conn, [row])
+            closes_store.upsert_closes(conn, pair, rates)
+            indicator_store.advance(conn, pair, rates)
+            rollups.refresh_for_rows(conn, [row])
+        backends.invalidate_pair(pair)
+        print(f'new register added for {pair}')
+        return 1
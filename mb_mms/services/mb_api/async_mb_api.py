@@ -0,0 +1,144 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from mb_mms.services.cache import backends
+from mb_mms.services.cache.lru import MISSING
+from mb_mms.services.data import async_db, rollups
+from mb_mms.services.data import pairs as pair_store
+from mb_mms.services.data.rows import Rows
+from mb_mms.services.mb_api import indicators
+from mb_mms.services.mb_api.mb_api import STORED_SPAN, MB_API
+from mb_mms.services.metrics import instruments
+
+# Keys being computed in this process, so concurrent misses await one query (single-flight)
+_inflight: Dict[Tuple, asyncio.Future] = {}
+
+
+async def _backend_call(backend, func, *args):
+    if backend.blocking:
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+async def get_or_compute(key: Tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Async counterpart of `CacheBackend.get_or_compute`, sharing the entries of the sync path.
+
+    Concurrent misses on the same key in this process await a single `compute`. Exceptions
+    raised by `compute` are propagated to every waiter and nothing is cached.
+    """
+    backend = backends.get_backend()
+    value = await _backend_call(backend, backend.lookup, key)
+    if value is not MISSING:
+        return value
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        value = await compute()
+        await _backend_call(backend, backend.store, key, value)
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as err:
+        future.set_exception(err)
+        # Mark the exception as retrieved when no other request was waiting for it
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+async def get_pair_ids(conn, names: List[str]) -> Dict[str, int]:
+    """
+    Async `pairs.get_ids`, caching the ids under the sync engine the async one wraps.
+    """
+    res = pair_store.cached_ids(conn.sync_engine, names)
+    missing = [name for name in names if name not in res]
+    if missing:
+        found = dict((await conn.execute(pair_store.ids_statement(missing))).all())
+        pair_store.remember(conn.sync_engine, found)
+        res.update(found)
+    return res
+
+
+class AsyncMB_API:
+    """
+    The `MB_API` queries used by the routes, run on the async engine.
+
+    Statements and result shapes come from `MB_API`, so both serving modes answer identically.
+    The hot paths (daily 20/50/200 searches and batch searches) await the database without
+    holding a thread; the less common ones (rollups, indicators, arbitrary windows, exports)
+    run the sync implementation in a worker thread.
+    """
+
+    def __init__(self) -> None:
+        self.sync = MB_API()
+
+    async def _fetch_mms(self, pair: str, start: int, end: int, precision: int) -> Rows:
+        with instruments.QueryTimer('mms') as query:
+            async with async_db.get_async_engine().connect() as conn:
+                pair_id = (await get_pair_ids(conn, [pair])).get(pair)
+                result = await conn.execute(MB_API.mms_statement(pair_id=pair_id, start=start, end=end, precision=precision))
+                res = Rows.from_result(result)
+            query.rows = len(res)
+            return res
+
+    async def write_generation(self, pair: str) -> Optional[str]:
+        """
+        Async `MB_API.write_generation`.
+        """
+        backend = backends.get_backend()
+        return await _backend_call(backend, backend.generation, pair)
+
+    async def stored_span(self, pair: str) -> Optional[Tuple[int, int, int]]:
+        """
+        Async `MB_API.stored_span`.
+        """
+        async def query():
+            with instruments.QueryTimer('stored_span'):
+                async with async_db.get_async_engine().connect() as conn:
+                    pair_id = (await get_pair_ids(conn, [pair])).get(pair)
+                    return MB_API.span_of((await conn.execute(MB_API.stored_span_statement(pair_id))).one())
+
+        return await get_or_compute((pair, STORED_SPAN), query)
+
+    async def search_mms(self, pair: str, start: int, end: int, precision: int, resolution: str = rollups.DAILY,
+                         indicator: str = indicators.SMA.name):
+        """
+        Async `MB_API.search_mms`.
+
+        Raises:
+            ValueError: If the precision, resolution or indicator value is not supported.
+        """
+        if resolution == rollups.DAILY and indicator == indicators.SMA.name and precision in rollups.WINDOWS:
+            return await get_or_compute(
+                (pair, precision, start, end),
+                lambda: self._fetch_mms(pair=pair, start=start, end=end, precision=precision),
+            )
+        return await asyncio.to_thread(
+            self.sync.search_mms, pair=pair, start=start, end=end, precision=precision,
+            resolution=resolution, indicator=indicator,
+        )
+
+    async def search_mms_batch(self, pairs: List[str], start: int, end: int, precisions: List[int]):
+        """
+        Async `MB_API.search_mms_batch`.
+
+        Raises:
+            ValueError: If no pair or precision is given, or a precision value is not supported.
+        """
+        pairs, columns = MB_API.batch_columns(pairs=pairs, precisions=precisions)
+        with instruments.QueryTimer('batch') as query:
+            async with async_db.get_async_engine().connect() as conn:
+                ids = await get_pair_ids(conn, pairs)
+                result = await conn.execute(MB_API.batch_statement(ids.values(), start=start, end=end, columns=columns))
+                res = result.all()
+            query.rows = len(res)
+            return MB_API.group_batch(pairs, ids, list(result.keys())[1:], res)
@@ -0,0 +1,196 @@
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from mb_mms.models.checkpoints import BackfillCheckpoint
+from mb_mms.services.cache import backends
+from mb_mms.services.data import closes as closes_store
+from mb_mms.services.data import db, rollups
+from mb_mms.services.data import indicators as indicator_store
+from mb_mms.services.mb_api import indicators
+from mb_mms.services.mb_api.moving_average import RunningMean
+
+DAY = 86400
+WINDOWS = (20, 50, 200)
+
+Rates = List[Tuple[float, int]]
+
+
+def iter_ranges(start: int, end: int, chunk_seconds: int) -> Iterator[Tuple[int, int]]:
+    """
+    Splits the inclusive range [start, end] into consecutive inclusive ranges of at most `chunk_seconds`.
+    """
+    if chunk_seconds < 1:
+        raise ValueError('chunk size must be positive')
+    while start <= end:
+        chunk_end = min(start + chunk_seconds - 1, end)
+        yield start, chunk_end
+        start = chunk_end + 1
+
+
+def fetch_chunks(fetch: Callable[[int, int], Rates], ranges: Iterable[Tuple[int, int]], last_timestamp: Optional[int] = None) -> Iterator[Rates]:
+    """
+    Fetches each range in turn, dropping candles already seen in a previous chunk.
+
+    Args:
+        fetch (Callable[[int, int], Rates]): Fetches the (close, timestamp) candles of a range.
+        ranges (Iterable[Tuple[int, int]]): The ranges to fetch, oldest first.
+        last_timestamp (int, optional): Candles at or before this timestamp are dropped too.
+
+    Yields:
+        Rates: The new candles of each range, oldest first.
+    """
+    for start, end in ranges:
+        rates = sorted(fetch(start, end), key=lambda rate: rate[1])
+        if last_timestamp is not None:
+            rates = [rate for rate in rates if rate[1] > last_timestamp]
+        if rates:
+            last_timestamp = rates[-1][1]
+        yield rates
+
+
+def compute_chunks(pair: str, chunks: Iterable[Rates], warmup: Rates = (), windows: Iterable[int] = WINDOWS) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Computes the moving average rows of each chunk.
+
+    The running windows live across chunks, so the trailing closes of one chunk feed the
+    averages at the start of the next one. `warmup` candles only prime the windows and are
+    not turned into rows.
+
+    Args:
+        pair (str): The currency pair of the candles.
+        chunks (Iterable[Rates]): The candles, chunk by chunk, oldest first.
+        warmup (Rates, optional): Candles preceding the first chunk.
+        windows (Iterable[int], optional): The window sizes. Defaults to 20, 50 and 200.
+
+    Yields:
+        List[Dict[str, Any]]: The `moving_averages` rows of each chunk.
+    """
+    means = {window: RunningMean(window) for window in windows}
+    for rate, _ in warmup:
+        for running in means.values():
+            running.push(rate)
+
+    for rates in chunks:
+        rows = []
+        for rate, timestamp in rates:
+            row = {'pair': pair, 'timestamp': timestamp}
+            for window, running in means.items():
+                row[f'mms_{window}'] = running.push(rate)
+            rows.append(row)
+        yield rows
+
+
+def _checkpoint_of(pair: str, start: int, end: int):
+    return (
+        (BackfillCheckpoint.pair == pair)
+        & (BackfillCheckpoint.range_start == start)
+        & (BackfillCheckpoint.range_end == end)
+    )
+
+
+def get_checkpoint(conn, pair: str, start: int, end: int) -> Optional[int]:
+    """
+    Returns the timestamp of the last row a backfill of [start, end] wrote for the pair, or None.
+    """
+    stmt = select(BackfillCheckpoint.timestamp).where(_checkpoint_of(pair, start, end))
+    return conn.execute(stmt).scalar()
+
+
+def save_checkpoint(conn, pair: str, start: int, end: int, timestamp: int) -> None:
+    """
+    Records the timestamp of the last row written by a backfill of [start, end] for the pair.
+    """
+    stmt = db.upsert_statement(conn.dialect.name, BackfillCheckpoint.__table__,
+                               ('pair', 'range_start', 'range_end'), ('timestamp',))
+    conn.execute(stmt, [{'pair': pair, 'range_start': start, 'range_end': end, 'timestamp': timestamp}])
+
+
+def clear_checkpoint(conn, pair: str, start: int, end: int) -> None:
+    """
+    Forgets the checkpoint of a backfill of [start, end], so the next one starts from the beginning of the range.
+    """
+    conn.execute(BackfillCheckpoint.__table__.delete().where(_checkpoint_of(pair, start, end)))
+
+
+def write_chunks(engine, pair: str, span: Tuple[int, int], row_chunks: Iterable[List[Dict[str, Any]]],
+                 batch_size: int = None, rate_chunks: Iterable[Rates] = None) -> Iterator[int]:
+    """
+    Upserts each chunk of rows, refreshes its rollups and moves the checkpoint of the backfilled
+    (start, end) `span` in the same transaction.
+
+    When `rate_chunks` is given, the raw closes of each chunk are stored in that transaction too,
+    and the `MMS_INDICATORS` values are recomputed from the first day of the chunk on: older
+    closes change every later EMA/WMA value, so they cannot be folded in like the nightly path.
+
+    Yields:
+        int: The number of rows written by each chunk.
+    """
+    for rows, rates in zip(row_chunks, rate_chunks if rate_chunks is not None else itertools.repeat(())):
+        if not rows:
+            yield 0
+            continue
+        with engine.begin() as conn:
+            db.upsert_moving_averages(conn, rows, batch_size=batch_size)
+            closes_store.upsert_closes(conn, pair, rates, batch_size=batch_size)
+            if rates and indicators.configured_specs():
+                timestamps, closes = closes_store.load_closes(conn, pair)
+                indicator_store.write_series(conn, pair, closes, timestamps, batch_size=batch_size,
+                                             since=rows[0]['timestamp'])
+            rollups.refresh_for_rows(conn, rows)
+            save_checkpoint(conn, pair, *span, rows[-1]['timestamp'])
+        backends.invalidate_pair(pair)
+        yield len(rows)
+
+
+def backfill_pair(fetch: Callable[[int, int], Rates], pair: str, start: int, end: int, chunk_days: int = 90,
+                  batch_size: int = None, resume: bool = True) -> int:
+    """
+    Backfills the moving averages of a pair over [start, end] in fixed-size chunks.
+
+    The pipeline fetches one chunk, computes its rows and writes them before moving on, so memory
+    is bounded by the chunk size. Every chunk commits a checkpoint of the (pair, start, end) range,
+    and with `resume` a backfill of the same range restarts right after the last committed row.
+    The windows are primed with the candles preceding the first fetched chunk, so rows after a
+    resume match an uninterrupted run.
+
+    Args:
+        fetch (Callable[[int, int], Rates]): Fetches the (close, timestamp) candles of a range.
+        pair (str): The currency pair to backfill.
+        start (int): The start timestamp of the range.
+        end (int): The end timestamp of the range.
+        chunk_days (int, optional): Days fetched per chunk. Defaults to 90.
+        batch_size (int, optional): Rows per insert statement. Defaults to `DB_BATCH_SIZE`.
+        resume (bool, optional): Whether to continue from the range checkpoint. Defaults to True.
+
+    Returns:
+        int: The number of rows written.
+    """
+    engine = db.get_db_engine()
+    span = (start, end)
+
+    with engine.begin() as conn:
+        if resume:
+            checkpoint = get_checkpoint(conn, pair, *span)
+            if checkpoint is not None:
+                start = checkpoint + 1
+        else:
+            clear_checkpoint(conn, pair, *span)
+
+    if start > end:
+        return 0
+
+    warmup_days = max(WINDOWS) - 1
+    warmup = sorted(fetch(start - warmup_days * DAY, start - 1), key=lambda rate: rate[1])[-warmup_days:]
+
+    if warmup:
+        with engine.begin() as conn:
+            closes_store.upsert_closes(conn, pair, warmup, batch_size=batch_size)
+
+    last_timestamp = warmup[-1][1] if warmup else None
+    chunks = fetch_chunks(fetch, iter_ranges(start, end, chunk_days * DAY), last_timestamp=last_timestamp)
+    # Both branches advance in lock step, so the tee buffers at most one chunk
+    rate_chunks, compute_input = itertools.tee(chunks)
+    rows = compute_chunks(pair, compute_input, warmup=warmup)
+    return sum(write_chunks(engine, pair, span, rows, batch_size=batch_size, rate_chunks=rate_chunks))
@@ -0,0 +1,304 @@
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+DAY = 86400
+
+# One candle: timestamp (int64) and close (float64), little-endian
+RECORD = struct.Struct('<qd')
+# One fetched range: inclusive start and end timestamps
+RANGE = struct.Struct('<qq')
+
+PAIR_NAME = re.compile(r'^[A-Za-z0-9_-]+$')
+
+Rates = List[Tuple[float, int]]
+
+
+class _AppendOnlyFile:
+    """
+    A file of fixed-width records that is only ever appended to, read through `mmap`.
+
+    Each read only parses the bytes appended since the previous one, by this process or another,
+    and keeps the file mapped so records can be read back in place by their index. A partially
+    written tail record is left for the next read, and dropped by the next append.
+    """
+
+    def __init__(self, path: str, record: struct.Struct) -> None:
+        self.path = path
+        self.record = record
+        self.offset = 0
+        self.view = None
+
+    def refresh(self) -> list:
+        """
+        Returns the records appended since the last call, remapping the grown file.
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return []
+        size -= size % self.record.size
+        if size <= self.offset:
+            return []
+
+        with open(self.path, 'rb') as file:
+            view = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+        if self.view is not None:
+            self.view.close()
+        records = list(self.record.iter_unpack(view[self.offset:size]))
+        self.view, self.offset = view, size
+        return records
+
+    def unpack(self, index: int) -> tuple:
+        """
+        Reads the record at `index` from the mapping.
+        """
+        return self.record.unpack_from(self.view, index * self.record.size)
+
+    def append(self, records) -> None:
+        data = b''.join(self.record.pack(*record) for record in records)
+        if not data:
+            return
+        with open(self.path, 'ab') as file:
+            with _locked(file):
+                # Appends hold the lock until synced, so a torn tail is left by a writer that died
+                # mid-record; writing after it would misalign every later record
+                size = os.fstat(file.fileno()).st_size
+                if size % self.record.size:
+                    file.truncate(size - size % self.record.size)
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+
+
+@contextmanager
+def _locked(file):
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+    fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+class _PairStore:
+    __slots__ = ('candles', 'ranges', 'lock', 'timestamps', 'positions', 'covered')
+
+    def __init__(self, directory: str, pair: str) -> None:
+        self.candles = _AppendOnlyFile(os.path.join(directory, f'{pair}.candles'), RECORD)
+        self.ranges = _AppendOnlyFile(os.path.join(directory, f'{pair}.ranges'), RANGE)
+        self.lock = threading.Lock()
+        # Sorted timestamps and the index of their latest record; closes stay in the mapping
+        self.timestamps = array('q')
+        self.positions = array('q')
+        self.covered = []
+
+    def refresh(self) -> None:
+        first = self.candles.offset // RECORD.size
+        candles = self.candles.refresh()
+        if candles:
+            self.index(first, [timestamp for timestamp, _ in candles])
+        ranges = self.ranges.refresh()
+        if ranges:
+            self.covered = merge_ranges(self.covered + ranges)
+
+    def index(self, first: int, timestamps: List[int]) -> None:
+        # Later records win, so a candle fetched again replaces the stored one
+        latest = {timestamp: first + idx for idx, timestamp in enumerate(timestamps)}
+        ordered = sorted(latest)
+        if not self.timestamps or ordered[0] > self.timestamps[-1]:
+            self.timestamps.extend(ordered)
+            self.positions.extend(latest[timestamp] for timestamp in ordered)
+            return
+        latest = {**dict(zip(self.timestamps, self.positions)), **latest}
+        ordered = sorted(latest)
+        self.timestamps = array('q', ordered)
+        self.positions = array('q', (latest[timestamp] for timestamp in ordered))
+
+    def read(self, start: int, end: int) -> Rates:
+        lower, upper = bisect_left(self.timestamps, start), bisect_right(self.timestamps, end)
+        return [(self.candles.unpack(position)[1], timestamp)
+                for timestamp, position in zip(self.timestamps[lower:upper], self.positions[lower:upper])]
+
+    def add(self, rates: Rates, start: int, end: int, settled: int) -> None:
+        self.candles.append((timestamp, close) for close, timestamp in rates)
+        if min(end, settled) >= start:
+            self.ranges.append([(start, min(end, settled))])
+        self.refresh()
+
+
+def merge_ranges(ranges) -> List[Tuple[int, int]]:
+    """
+    Merges inclusive ranges that overlap or touch, sorted by start.
+    """
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_ranges(start: int, end: int, covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """
+    Returns the parts of the inclusive range [start, end] outside the merged `covered` ranges.
+    """
+    gaps = []
+    for covered_start, covered_end in covered:
+        if covered_end < start:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > start:
+            gaps.append((start, covered_start - 1))
+        start = max(start, covered_end + 1)
+        if start > end:
+            return gaps
+    if start <= end:
+        gaps.append((start, end))
+    return gaps
+
+
+class CandleStore:
+    """
+    A persistent, per-pair store of the daily candles downloaded from upstream.
+
+    Each pair has two append-only files of fixed-width records in `directory`: `<pair>.candles`
+    with (timestamp, close) and `<pair>.ranges` with the (start, end) ranges already fetched.
+    `get` only asks upstream for the parts of a range that were never fetched, appends what it
+    downloads and answers from the memory-mapped files: only a sorted index of the timestamps is
+    kept in memory and the closes are read from the mapping. Ranges are recorded as fetched only
+    up to `settle` seconds before now, so the latest candles are fetched again until they are final.
+    Appends take an exclusive `flock`, so several processes can share the directory.
+    """
+
+    def __init__(self, directory: str, settle: int = DAY, clock: Callable[[], float] = time.time) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.settle = settle
+        self._clock = clock
+        self._pairs: Dict[str, _PairStore] = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.hits = 0
+
+    def _pair(self, pair: str) -> _PairStore:
+        if not PAIR_NAME.match(pair):
+            raise ValueError(f'invalid pair {pair!r}')
+        with self._lock:
+            store = self._pairs.get(pair)
+            if store is None:
+                store = self._pairs[pair] = _PairStore(self.directory, pair)
+            return store
+
+    def read(self, pair: str, start: int, end: int) -> Rates:
+        """
+        Returns the stored (close, timestamp) candles of the pair in [start, end], oldest first.
+        """
+        store = self._pair(pair)
+        with store.lock:
+            store.refresh()
+            return store.read(start, end)
+
+    def missing(self, pair: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """
+        Returns the parts of [start, end] that were never fetched for the pair.
+        """
+        store = self._pair(pair)
+        with store.lock:
+            store.refresh()
+            return subtract_ranges(start, end, store.covered)
+
+    def add(self, pair: str, rates: Rates, start: int, end: int) -> None:
+        """
+        Appends downloaded candles and records [start, end] as fetched, up to the settle horizon.
+        """
+        store = self._pair(pair)
+        with store.lock:
+            store.add(rates, start, end, int(self._clock()) - self.settle)
+
+    def get(self, pair: str, start: int, end: int, fetch: Callable[[int, int], Rates]) -> Rates:
+        """
+        Returns the candles of [start, end], fetching only the missing ranges.
+
+        Concurrent calls for the same pair in this process wait for each other, so a range is
+        downloaded once. If a fetch raises, the ranges fetched before it stay stored.
+
+        Args:
+            pair (str): The currency pair.
+            start (int): The start timestamp of the range.
+            end (int): The end timestamp of the range.
+            fetch (Callable[[int, int], Rates]): Downloads the (close, timestamp) candles of a range.
+
+        Returns:
+            Rates: The (close, timestamp) candles, oldest first.
+        """
+        start, end = int(start), int(end)
+        store = self._pair(pair)
+        with store.lock:
+            store.refresh()
+            gaps = subtract_ranges(start, end, store.covered)
+            if not gaps:
+                self.hits += 1
+            for gap_start, gap_end in gaps:
+                rates = fetch(gap_start, gap_end)
+                self.fetches += 1
+                store.add(rates, gap_start, gap_end, int(self._clock()) - self.settle)
+            return store.read(start, end)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_candle_store() -> Optional[CandleStore]:
+    """
+    Returns the process-wide candle store, or None when it is disabled.
+
+    Settings:
+        - `MB_CANDLE_STORE`: Directory of the candle files. The store is disabled when unset.
+        - `MB_CANDLE_SETTLE`: Seconds before a fetched candle is considered final (default 86400).
+    """
+    global _store
+    directory = os.getenv('MB_CANDLE_STORE')
+    if not directory:
+        return None
+    if _store is None or _store.directory != directory:
+        with _store_lock:
+            if _store is None or _store.directory != directory:
+                _store = CandleStore(directory, settle=int(os.getenv('MB_CANDLE_SETTLE', str(DAY))))
+    return _store
+
+
+def reset_candle_store() -> None:
+    """
+    Drops the process-wide candle store so the next call reads the settings again.
+    """
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def _after_fork_in_child() -> None:
+    global _store, _store_lock
+    _store = None
+    _store_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -4,14 +4,18 @@ import time
 import pytz
 
 from datetime import datetime, timedelta
-from mb_mms.models.pair_averages import MovingAverage
-from mb_mms.services.data import db
+from mb_mms.services.cache import backends
+from mb_mms.services.data import closes as closes_store
+from mb_mms.services.data import db, rollups
+from mb_mms.services.data import indicators as indicator_store
+from mb_mms.services.mb_api import backfill as backfill_mod
 from mb_mms.services.mb_api.mb_api import MB_API
-from sqlalchemy.orm import Session
 
 
 @click.command('populate-db')
-def populate_db():
+@click.option('--batch-size', type=click.IntRange(min=1), default=None,
+              help='Rows written per statement (defaults to DB_BATCH_SIZE or 1000).')
+def populate_db(batch_size):
     """
     Populates the database with historical rate data and calculated moving averages (MMS) for specified currency pairs.
 
@@ -20,17 +24,28 @@ def populate_db():
     2. Sets the time range for data retrieval (1 year ago).
     3. Converts the time range to Unix timestamps.
     4. Retrieves the list of currency pairs from the environment variable `PAIRS`.
-    5. For each currency pair:
-       - Fetches the historical rate data within the specified time range.
-       - Calculates the 20-day, 50-day, and 200-day sliding moving averages (MMS).
+    5. Fetches the historical rate data of every pair concurrently. Pairs whose fetch fails are
+       reported and skipped.
+    6. For each fetched currency pair:
+       - Calculates the 20-day, 50-day, and 200-day sliding moving averages (MMS) in a single pass.
        - Ensures the lengths of the MMS lists are consistent.
-       - Inserts the calculated MMS values and timestamps into the database.
-    6. Handles errors during database insertion and rolls back the transaction if necessary.
-    7. Outputs a success message if the database is populated successfully.
+       - Upserts the calculated MMS values and timestamps into the database in batches, so reruns
+         update existing rows instead of failing on the (pair, timestamp) constraint.
+       - Stores the raw closes, used to compute other window sizes on demand.
+       - Computes the indicators listed in `MMS_INDICATORS` (EMA/WMA) in one vectorized pass and
+         stores their values and final state, from which the daily job continues incrementally.
+       - Refreshes the weekly and monthly rollups of the written days.
+    7. Handles errors during database insertion and rolls back the transaction if necessary.
+    8. Outputs a success message if the database is populated successfully.
+
+    Options:
+        - `--batch-size`: Rows written per `INSERT ... ON DUPLICATE KEY UPDATE` statement.
 
     Environment Variables:
         - `PAIRS`: A comma-separated list of currency pairs to process (e.g., 'BRLBTC,BRLETH').
         - `MB_API`: The API endpoint format for fetching rate data.
+        - `DB_BATCH_SIZE`: Default batch size when `--batch-size` is not given.
+        - `MMS_INDICATORS`: The `name:window` indicators to store (e.g. 'ema:20,wma:50').
 
     Raises:
         - Displays an error message if the lengths of the MMS lists are inconsistent.
@@ -49,27 +64,89 @@ def populate_db():
 
     pairs = os.getenv('PAIRS', '').split(',')
 
+    rates_by_pair, errors = mb.request_rates(pairs=pairs, start=start_time_unix, end=end_time_unix)
+    for pair, err in errors.items():
+        click.echo(message=f'skipping {pair}: {err}', err=True)
+
     for pair in pairs:
-        rates = mb.request_rate(pair=pair, start=start_time_unix, end=end_time_unix)
-        mms_20 = mb.sliding_mms(delta=20, rates=rates)
-        mms_50 = mb.sliding_mms(delta=50, rates=rates)
-        mms_200 = mb.sliding_mms(delta=200, rates=rates)
+        if pair not in rates_by_pair:
+            continue
+        rates = rates_by_pair[pair]
+        closes, timestamps = [rate[0] for rate in rates], [rate[1] for rate in rates]
+        mms = mb.sliding_mms_columns(deltas=[20, 50, 200], closes=closes, timestamps=timestamps)
+        mms_20, mms_50, mms_200 = mms.get(20, []), mms.get(50, []), mms.get(200, [])
 
         if len(mms_20) != len(mms_50) != len(mms_200):
             click.echo(message='inconsistent rates', err=True)
             return
 
-        with Session(db.get_db_engine()) as session, session.begin():
-            try:
-                for idx in range(len(mms_20)):
-                    obj = MovingAverage()
-                    obj.mms_20, obj.mms_50, obj.mms_200 = mms_20[idx][0], mms_50[idx][0], mms_200[idx][0]
-                    obj.timestamp, obj.pair = mms_20[idx][1], pair
-                    session.add(obj)
-                session.commit()
-            except Exception as err:
-                session.rollback()
-                click.echo(message=err, err=True, color=True)
-                return
+        rows = [
+            {'pair': pair, 'timestamp': mms_20[idx][1],
+             'mms_20': mms_20[idx][0], 'mms_50': mms_50[idx][0], 'mms_200': mms_200[idx][0]}
+            for idx in range(len(mms_20))
+        ]
+
+        try:
+            with db.get_db_engine().begin() as conn:
+                db.upsert_moving_averages(conn, rows, batch_size=batch_size)
+                closes_store.upsert_closes(conn, pair, rates, batch_size=batch_size)
+                indicator_store.write_series(conn, pair, closes, timestamps, batch_size=batch_size)
+                rollups.refresh_for_rows(conn, rows)
+        except Exception as err:
+            click.echo(message=err, err=True, color=True)
+            return
+        backends.invalidate_pair(pair)
 
     click.echo('Database populated.')
+
+
+@click.command('backfill')
+@click.option('--start', 'start_date', type=click.DateTime(formats=['%Y-%m-%d']), required=True,
+              help='First day of the range (YYYY-MM-DD).')
+@click.option('--end', 'end_date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day of the range (YYYY-MM-DD). Defaults to yesterday.')
+@click.option('--pair', 'pairs', multiple=True, help='Pair to backfill. Defaults to every pair in PAIRS.')
+@click.option('--chunk-days', type=click.IntRange(min=1), default=90, show_default=True,
+              help='Days fetched, computed and written per chunk.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None,
+              help='Rows written per statement (defaults to DB_BATCH_SIZE or 1000).')
+@click.option('--restart', is_flag=True, help='Ignore saved checkpoints and start from --start.')
+def backfill(start_date, end_date, pairs, chunk_days, batch_size, restart):
+    """
+    Backfills moving averages over an arbitrary date range in fixed-size, resumable chunks.
+
+    Each pair is processed as a fetch -> compute -> write pipeline, one chunk at a time. The
+    running windows carry the trailing closes across chunk boundaries, and every chunk commits
+    a checkpoint of the pair and range together with its rows, so an interrupted backfill resumes
+    where it stopped when the command is run again with the same range.
+
+    Environment Variables:
+        - `PAIRS`: A comma-separated list of currency pairs, used when no `--pair` is given.
+        - `MB_API`: The API endpoint format for fetching rate data.
+
+    Outputs:
+        - The number of rows written per pair, and 'Backfill finished.' at the end.
+        - Error messages for pairs that failed; they keep their checkpoint for the next run.
+    """
+    mb = MB_API()
+    if end_date is None:
+        end_date = datetime.strptime(
+            (datetime.now(pytz.timezone('America/Sao_Paulo')) - timedelta(days=1)).strftime('%Y-%m-%d'), '%Y-%m-%d'
+        )
+
+    start_unix = int(time.mktime(start_date.timetuple()))
+    end_unix = int(time.mktime(end_date.timetuple()))
+    pairs = list(pairs) or os.getenv('PAIRS', '').split(',')
+
+    for pair in pairs:
+        try:
+            written = backfill_mod.backfill_pair(
+                fetch=lambda start, end: mb.fetch_rate(pair=pair, start=start, end=end),
+                pair=pair, start=start_unix, end=end_unix, chunk_days=chunk_days,
+                batch_size=batch_size, resume=not restart,
+            )
+            click.echo(f'{pair}: {written} rows written.')
+        except Exception as err:
+            click.echo(message=f'{pair}: backfill interrupted: {err}', err=True)
+
+    click.echo('Backfill finished.')
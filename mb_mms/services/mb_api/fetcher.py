@@ -0,0 +1,125 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Tuple
+from urllib.parse import urlsplit
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = 'Dummy User Agent'
+
+_session = None
+_session_lock = threading.Lock()
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+_host_slots_lock = threading.Lock()
+
+
+def host_concurrency() -> int:
+    """
+    Returns the maximum number of in-flight requests per host, read from `MB_API_HOST_CONCURRENCY` (default 4).
+    """
+    return int(os.getenv('MB_API_HOST_CONCURRENCY', '4'))
+
+
+def max_workers() -> int:
+    """
+    Returns the size of the fetch thread pool, read from `MB_API_MAX_WORKERS` (default 8).
+    """
+    return int(os.getenv('MB_API_MAX_WORKERS', '8'))
+
+
+def request_timeout() -> float:
+    """
+    Returns the upstream request timeout in seconds, read from `MB_API_TIMEOUT` (default 30).
+    """
+    return float(os.getenv('MB_API_TIMEOUT', '30'))
+
+
+def get_http_session() -> Session:
+    """
+    Returns the process-wide keep-alive HTTP session, creating it on first use.
+
+    The connection pool keeps as many connections per host as requests may run concurrently,
+    so parallel fetches reuse warm TLS connections instead of opening new ones.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = Session()
+                session.headers.update({'User-Agent': USER_AGENT})
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=host_concurrency())
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+@contextmanager
+def host_slot(url: str):
+    """
+    Holds one of the `host_concurrency()` request slots of the url's host while the block runs.
+    """
+    host = urlsplit(url).netloc
+    with _host_slots_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(host_concurrency())
+    with slot:
+        yield
+
+
+def reset() -> None:
+    """
+    Closes the shared session and forgets the per-host slots.
+    """
+    global _session, _session_lock, _host_slots_lock
+    if _session is not None:
+        _session.close()
+    _session = None
+    _session_lock = threading.Lock()
+    _host_slots_lock = threading.Lock()
+    _host_slots.clear()
+
+
+def _after_fork_in_child() -> None:
+    # Never share keep-alive sockets with the parent process.
+    global _session
+    _session = None
+    reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def run_concurrently(func: Callable[[Any], Any], keys: Iterable[Any], workers: int = None) -> Tuple[Dict[Any, Any], Dict[Any, Exception]]:
+    """
+    Calls `func(key)` for every key on a bounded thread pool.
+
+    A failing key never aborts the others: its exception is collected and returned instead.
+
+    Args:
+        func (Callable[[Any], Any]): The function to call for each key.
+        keys (Iterable[Any]): The keys, e.g. currency pairs.
+        workers (int, optional): Thread pool size. Defaults to `max_workers()`.
+
+    Returns:
+        Tuple[Dict[Any, Any], Dict[Any, Exception]]: The results and the errors, both keyed by key.
+    """
+    keys = list(dict.fromkeys(keys))
+    results, errors = {}, {}
+    if not keys:
+        return results, errors
+
+    workers = min(workers or max_workers(), len(keys))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mb-fetch') as executor:
+        futures = {key: executor.submit(func, key) for key in keys}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as err:
+                errors[key] = err
+    return results, errors
@@ -0,0 +1,280 @@
+import math
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+
+from mb_mms.services.mb_api import vectorized
+from mb_mms.services.mb_api.moving_average import RunningMean
+
+np = vectorized.np
+
+DEFAULT_INDICATORS = 'ema:20,ema:50,ema:200,wma:20,wma:50,wma:200'
+
+# Largest factor the blocked EMA lets the decay weights grow to before starting a new block
+EMA_BLOCK_RANGE = 1e8
+
+
+class Indicator(ABC):
+    """
+    A streaming indicator over a series of closes.
+
+    Subclasses keep their state in `__slots__` and implement:
+        - `update(close)`: Folds the next close in O(1) and returns the current value.
+        - `compute(closes)`: Computes the value at every close in one batch, vectorized when NumPy is installed.
+        - `state()` / `restore(state)`: Export and import the state as a list of floats.
+        - `resume(closes, values)`: Sets the state as if `update` had been called with every close.
+
+    Values are None until the indicator has seen `window` closes.
+    """
+
+    name = ''
+    __slots__ = ('window',)
+
+    def __init__(self, window: int) -> None:
+        if window < 1:
+            raise ValueError('window must be at least 1')
+        self.window = window
+
+    @abstractmethod
+    def update(self, close: float) -> Optional[float]:
+        """
+        Folds the next close in and returns the current value.
+        """
+
+    def compute(self, closes: Sequence[float]) -> List[Optional[float]]:
+        """
+        Pure-Python batch path: runs a fresh indicator of the same window over the closes.
+        """
+        fresh = type(self)(self.window)
+        return [fresh.update(close) for close in closes]
+
+    @abstractmethod
+    def state(self) -> List[float]:
+        """
+        Exports the state as a list of floats.
+        """
+
+    @abstractmethod
+    def restore(self, state: Sequence[float]) -> 'Indicator':
+        """
+        Replaces the state with one exported by `state` and returns the indicator.
+        """
+
+    def resume(self, closes: Sequence[float], values: Sequence[Optional[float]]) -> 'Indicator':
+        for close in closes[-self.window:]:
+            self.update(close)
+        return self
+
+
+def _optional(values, window: int) -> List[Optional[float]]:
+    out = values.tolist()
+    for idx in range(min(window - 1, len(out))):
+        out[idx] = None
+    return out
+
+
+class SMA(Indicator):
+    """
+    Simple moving average over a compensated running sum.
+    """
+
+    name = 'sma'
+    __slots__ = ('running',)
+
+    def __init__(self, window: int) -> None:
+        super().__init__(window)
+        self.running = RunningMean(window)
+
+    def update(self, close: float) -> Optional[float]:
+        return self.running.push(close)
+
+    def compute(self, closes: Sequence[float]) -> List[Optional[float]]:
+        if np is None or not len(closes):
+            return super().compute(closes)
+        return _optional(vectorized.sliding_means_arrays(closes, [self.window])[self.window], self.window)
+
+    def state(self) -> List[float]:
+        return list(self.running.values)
+
+    def restore(self, state: Sequence[float]) -> 'SMA':
+        for close in state:
+            self.update(close)
+        return self
+
+
+class EMA(Indicator):
+    """
+    Exponential moving average with smoothing 2 / (window + 1), seeded with the simple mean of the first window.
+    """
+
+    name = 'ema'
+    __slots__ = ('alpha', 'count', 'total', 'value')
+
+    def __init__(self, window: int) -> None:
+        super().__init__(window)
+        self.alpha = 2.0 / (window + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def update(self, close: float) -> Optional[float]:
+        self.count += 1
+        if self.value is not None:
+            self.value += self.alpha * (close - self.value)
+        else:
+            self.total += close
+            if self.count == self.window:
+                self.value = self.total / self.window
+        return self.value
+
+    def compute(self, closes: Sequence[float]) -> List[Optional[float]]:
+        """
+        Batch EMA with NumPy.
+
+        The recursion y[k] = d * y[k - 1] + a * x[k] is unrolled in blocks as
+        y[k] = d ** (k + 1) * y[-1] + a * d ** k * cumsum(x[j] / d ** j), with blocks short enough
+        that d ** -j stays below `EMA_BLOCK_RANGE`, so each block is a handful of array operations.
+        """
+        if np is None or not len(closes):
+            return super().compute(closes)
+
+        values = np.ascontiguousarray(closes, dtype=np.float64)
+        size, window = values.shape[0], self.window
+        out = np.full(size, np.nan, dtype=np.float64)
+        if size < window:
+            return _optional(out, window)
+
+        out[window - 1] = values[:window].mean()
+        decay = 1.0 - self.alpha
+        if decay == 0.0:
+            out[window:] = values[window:]
+            return _optional(out, window)
+
+        block = max(1, int(math.log(EMA_BLOCK_RANGE) / -math.log(decay)))
+        previous, pos = out[window - 1], window
+        while pos < size:
+            chunk = values[pos:pos + block]
+            steps = np.arange(chunk.shape[0], dtype=np.float64)
+            powers = decay ** steps
+            out[pos:pos + chunk.shape[0]] = decay * powers * previous + self.alpha * powers * np.cumsum(chunk / powers)
+            previous = out[pos + chunk.shape[0] - 1]
+            pos += chunk.shape[0]
+        return _optional(out, window)
+
+    def state(self) -> List[float]:
+        return [float(self.count), self.total, math.nan if self.value is None else self.value]
+
+    def restore(self, state: Sequence[float]) -> 'EMA':
+        count, total, value = state
+        self.count, self.total = int(count), total
+        self.value = None if math.isnan(value) else value
+        return self
+
+    def resume(self, closes: Sequence[float], values: Sequence[Optional[float]]) -> 'EMA':
+        self.count = len(closes)
+        self.total = sum(closes[:self.window])
+        self.value = values[-1] if values else None
+        return self
+
+
+class WMA(Indicator):
+    """
+    Linearly weighted moving average: the newest close weighs `window`, the oldest 1.
+
+    Sliding the window subtracts the plain sum of the previous window from the weighted sum,
+    so each update is O(1).
+    """
+
+    name = 'wma'
+    __slots__ = ('values', 'total', 'numerator')
+
+    def __init__(self, window: int) -> None:
+        super().__init__(window)
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.numerator = 0.0
+
+    def update(self, close: float) -> Optional[float]:
+        if len(self.values) == self.window:
+            self.numerator += self.window * close - self.total
+            self.total += close - self.values[0]
+        else:
+            self.numerator += (len(self.values) + 1) * close
+            self.total += close
+        self.values.append(close)
+        if len(self.values) < self.window:
+            return None
+        return self.numerator / (self.window * (self.window + 1) / 2)
+
+    def compute(self, closes: Sequence[float]) -> List[Optional[float]]:
+        """
+        Batch WMA with NumPy from the prefix sums of x[j] and j * x[j], shifted by the first close.
+        """
+        if np is None or not len(closes):
+            return super().compute(closes)
+
+        values = np.ascontiguousarray(closes, dtype=np.float64)
+        size, window = values.shape[0], self.window
+        out = np.full(size, np.nan, dtype=np.float64)
+        if size < window:
+            return _optional(out, window)
+
+        shift = values[0]
+        shifted = values - shift
+        plain = np.concatenate(([0.0], np.cumsum(shifted)))
+        weighted = np.concatenate(([0.0], np.cumsum(np.arange(size, dtype=np.float64) * shifted)))
+        lower = np.arange(size - window + 1)
+        upper = lower + window
+        numerator = (weighted[upper] - weighted[lower]) - (lower - 1) * (plain[upper] - plain[lower])
+        out[window - 1:] = numerator / (window * (window + 1) / 2) + shift
+        return _optional(out, window)
+
+    def state(self) -> List[float]:
+        return list(self.values)
+
+    def restore(self, state: Sequence[float]) -> 'WMA':
+        for close in state:
+            self.update(close)
+        return self
+
+
+INDICATORS: Dict[str, Type[Indicator]] = {cls.name: cls for cls in (SMA, EMA, WMA)}
+
+
+def create(name: str, window: int) -> Indicator:
+    """
+    Builds an indicator by name.
+
+    Raises:
+        ValueError: If the name is unknown or the window is smaller than 1.
+    """
+    cls = INDICATORS.get(name)
+    if cls is None:
+        raise ValueError(f'unknown indicator {name}')
+    return cls(window)
+
+
+def parse_specs(text: str) -> List[Tuple[str, int]]:
+    """
+    Parses a comma-separated list of `name:window` specs, e.g. `ema:20,wma:50`.
+
+    Raises:
+        ValueError: If a spec is malformed or names an unknown indicator.
+    """
+    specs = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, window = item.partition(':')
+        create(name, int(window))
+        specs.append((name, int(window)))
+    return specs
+
+
+def configured_specs() -> List[Tuple[str, int]]:
+    """
+    Returns the indicators the writers store, from `MMS_INDICATORS` (default: EMA and WMA of 20, 50 and 200 days).
+    """
+    return parse_specs(os.getenv('MMS_INDICATORS', DEFAULT_INDICATORS))
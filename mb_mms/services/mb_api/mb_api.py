@@ -1,11 +1,23 @@
 import os
-from typing import Any, List, Tuple
-from requests import  HTTPError, Session
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from requests import HTTPError
 from http import HTTPStatus
-from sqlalchemy import select
+from sqlalchemy import func, select
 
 from mb_mms.models.pair_averages import MovingAverage
-from mb_mms.services.data import db
+from mb_mms.models.rollups import MovingAverageRollup
+from mb_mms.services.cache import backends, series
+from mb_mms.services.data import closes as closes_store
+from mb_mms.services.data import db, rollups
+from mb_mms.services.data import pairs as pair_store
+from mb_mms.services.data import indicators as indicator_store
+from mb_mms.services.data.rows import Rows
+from mb_mms.services.mb_api import candle_store, fetcher, indicators, moving_average, vectorized
+from mb_mms.services.metrics import instruments
+
+# Second item of the cache key of `stored_span`; search keys hold a precision there
+STORED_SPAN = 'stored_span'
 
 class MB_API:
     """
@@ -18,6 +30,70 @@ class MB_API:
         """
         pass
 
+    def fetch_rate(self, pair: str, start, end):
+        """
+        Fetches the rate data for a given currency pair within a specified time range, raising on failure.
+
+        When the candle store is enabled (`MB_CANDLE_STORE`), candles already downloaded are read
+        from disk and only the missing parts of the range are requested upstream.
+
+        Args:
+            pair (str): The currency pair for which the rate data is requested.
+            start: The start timestamp for the data range.
+            end: The end timestamp for the data range.
+
+        Returns:
+            List[Tuple[float, int]]: A list of tuples containing the closing rate and timestamp for each data point.
+
+        Raises:
+            ValueError: If the parameters or the response payload are invalid.
+            HTTPError: If the API answers with an error status.
+        """
+        store = candle_store.get_candle_store()
+        if store is None:
+            return self.download_rate(pair=pair, start=start, end=end)
+        return store.get(pair, start, end, lambda first, last: self.download_rate(pair=pair, start=first, end=last))
+
+    def download_rate(self, pair: str, start, end):
+        """
+        Requests the rate data of a range from the MB API, bypassing the candle store.
+
+        The request goes through the shared keep-alive session and holds one of the per-host slots.
+
+        Args:
+            pair (str): The currency pair for which the rate data is requested.
+            start: The start timestamp for the data range.
+            end: The end timestamp for the data range.
+
+        Returns:
+            List[Tuple[float, int]]: A list of tuples containing the closing rate and timestamp for each data point.
+
+        Raises:
+            ValueError: If the parameters or the response payload are invalid.
+            HTTPError: If the API answers with an error status.
+        """
+        url = os.getenv('MB_API', '').format(pair, start, end)
+        started = time.perf_counter()
+        try:
+            with fetcher.host_slot(url):
+                res = fetcher.get_http_session().get(url, timeout=fetcher.request_timeout())
+        except Exception:
+            instruments.UPSTREAM_FETCH_SECONDS.observe(time.perf_counter() - started, 'error')
+            raise
+        instruments.UPSTREAM_FETCH_SECONDS.observe(
+            time.perf_counter() - started, 'ok' if res.status_code == HTTPStatus.OK else 'error'
+        )
+        instruments.UPSTREAM_FETCH_BYTES.observe(len(res.content))
+
+        if res.status_code != HTTPStatus.OK:
+            print(res.text)
+            res.raise_for_status()
+
+        data = res.json()
+        rates = [(register['close'], register['timestamp']) for register in data['candles']]
+        instruments.UPSTREAM_CANDLES.inc(len(rates))
+        return rates
+
     def request_rate(self, pair: str, start, end):
         """
         Fetches the rate data for a given currency pair within a specified time range.
@@ -32,17 +108,7 @@ class MB_API:
                                      Returns an empty list if an error occurs.
         """
         try:
-            url = os.getenv('MB_API', '').format(pair, start, end)
-            session = Session()
-            session.headers.update({'User-Agent': 'Dummy User Agent'})
-            res = session.get(url)
-
-            if res.status_code != HTTPStatus.OK:
-                print(res.text)
-                res.raise_for_status()
-
-            data = res.json()
-            return [(register['close'], register['timestamp']) for register in data['candles']]
+            return self.fetch_rate(pair=pair, start=start, end=end)
 
         except ValueError as err:
             print('parameters error:', err)
@@ -54,6 +120,31 @@ class MB_API:
             print('unexpected error:', err)
             return []
 
+    def request_rates(self, pairs: List[str], start, end, max_workers: int = None):
+        """
+        Fetches the rate data for several currency pairs concurrently.
+
+        Pairs are fetched on a bounded thread pool sharing one keep-alive session. A failing pair
+        does not abort the others.
+
+        Args:
+            pairs (List[str]): The currency pairs for which the rate data is requested.
+            start: The start timestamp for the data range.
+            end: The end timestamp for the data range.
+            max_workers (int, optional): Thread pool size. Defaults to `MB_API_MAX_WORKERS`.
+
+        Returns:
+            Tuple[Dict[str, List[Tuple[float, int]]], Dict[str, Exception]]: The rates of the pairs that
+                                                                            succeeded and the errors of
+                                                                            the ones that failed.
+        """
+        rates, errors = fetcher.run_concurrently(
+            lambda pair: self.fetch_rate(pair=pair, start=start, end=end), pairs, workers=max_workers
+        )
+        for pair, err in errors.items():
+            print(f'request error for {pair}:', err)
+        return rates, errors
+
     def mms(self, rates: List[Tuple[Any, Any]]):
         """
         Calculates the Mean Moving Average (MMS) for a given list of rates.
@@ -68,7 +159,9 @@ class MB_API:
         if len(rates) == 0:
             return (0, 0)
 
-        return (sum([rate[0] for rate in rates]) / len(rates), rates[len(rates) - 1][1])
+        with instruments.COMPUTE_SECONDS.time('mms'):
+            instruments.COMPUTE_VALUES.inc(len(rates), 'mms')
+            return (sum([rate[0] for rate in rates]) / len(rates), rates[len(rates) - 1][1])
 
     def sliding_mms(self, delta: int, rates=None):
         """
@@ -87,24 +180,149 @@ class MB_API:
         if delta < 1:
             return []
 
-        mms = []
-        delta_offset = delta - 1
+        return self.sliding_mms_multi(deltas=[delta], rates=rates).get(delta, [])
+
+    def sliding_mms_multi(self, deltas: List[int], rates=None):
+        """
+        Calculates the sliding Mean Moving Average (MMS) for several window sizes in a single pass.
+
+        Every window keeps a compensated running sum, so the whole computation is O(n) per window
+        instead of re-summing a slice at every index.
+
+        Args:
+            deltas (List[int]): The window sizes for the sliding MMS calculation.
+            rates (List[Tuple[Any, Any]], optional): A list of tuples containing the rate and timestamp.
+                                                    Defaults to None.
+
+        Returns:
+            Dict[int, List[Tuple[Optional[float], Any]]]: For each window size, a list of tuples containing
+                                                          the calculated MMS and timestamp. Window sizes less
+                                                          than 1 are skipped. Returns an empty dict if an
+                                                          error occurs.
+        """
+        assert rates is not None
+
         try:
-            for idx in range(len(rates)):
-                if idx < delta_offset:
-                    mms.append((None, rates[idx][1]))
-                    continue
-                slice_rates = rates[idx - delta_offset:idx + 1]
-                mms.append(self.mms(slice_rates))
-            return mms
+            with instruments.COMPUTE_SECONDS.time('sliding_mms'):
+                instruments.COMPUTE_VALUES.inc(len(rates), 'sliding_mms')
+                return moving_average.sliding_means(rates=rates, deltas=[delta for delta in deltas if delta >= 1])
         except Exception as err:
             print(err)
-            return []
+            return {}
 
-    def search_mms(self, pair: str, start: int, end: int, precision: int):
+    def sliding_mms_columns(self, deltas: List[int], closes: List[float], timestamps: List[Any]):
+        """
+        Calculates the sliding Mean Moving Average (MMS) for several window sizes from column data.
+
+        This is the bulk path used by backfills: it runs vectorized with NumPy when it is installed
+        and falls back to the pure-Python running sums otherwise.
+
+        Args:
+            deltas (List[int]): The window sizes for the sliding MMS calculation.
+            closes (List[float]): The closing rates, oldest first.
+            timestamps (List[Any]): The timestamps matching `closes`.
+
+        Returns:
+            Dict[int, List[Tuple[Optional[float], Any]]]: For each window size, a list of tuples containing
+                                                          the calculated MMS and timestamp. Window sizes less
+                                                          than 1 are skipped. Returns an empty dict if an
+                                                          error occurs.
+        """
+        try:
+            with instruments.COMPUTE_SECONDS.time('sliding_mms_columns'):
+                instruments.COMPUTE_VALUES.inc(len(closes), 'sliding_mms_columns')
+                return vectorized.sliding_means_columns(
+                    closes=closes, timestamps=timestamps, deltas=[delta for delta in deltas if delta >= 1]
+                )
+        except Exception as err:
+            print(err)
+            return {}
+
+    def search_mms(self, pair: str, start: int, end: int, precision: int, resolution: str = rollups.DAILY,
+                   indicator: str = indicators.SMA.name):
         """
         Searches for the Mean Moving Average (MMS) data for a given currency pair and time range.
 
+        Results are served from the configured cache backend when possible; concurrent misses on the
+        same query share one database round trip, and writers invalidate the entries of a pair when
+        they store new moving averages. Daily precisions other than 20, 50 and 200 are computed on
+        demand from the stored closes (see `query_window`).
+
+        Args:
+            pair (str): The currency pair for which the MMS data is requested.
+            start (int): The start timestamp for the data range.
+            end (int): The end timestamp for the data range.
+            precision (int): The precision of the MMS data (e.g., 20, 50, 200, or any window of at least 1 day).
+            resolution (str, optional): `1d` (default) for the daily rows, `1w` or `1M` for the
+                                        precomputed weekly or monthly rollups.
+            indicator (str, optional): `sma` (default), or `ema`/`wma` (daily only, see `query_indicator`).
+
+        Returns:
+            Rows: The timestamp and MMS value of each day, read as a list of dictionaries.
+                        Rollups also carry the min, max and mean of the bucket.
+
+        Raises:
+            ValueError: If the precision, resolution or indicator value is not supported.
+        """
+        if indicator != indicators.SMA.name:
+            if resolution != rollups.DAILY:
+                raise ValueError
+            indicators.create(indicator, precision)
+            return backends.get_backend().get_or_compute(
+                (pair, precision, start, end, indicator),
+                lambda: self.query_indicator(pair=pair, start=start, end=end, window=precision, indicator=indicator),
+            )
+        if resolution == rollups.DAILY:
+            if precision in rollups.WINDOWS:
+                query = lambda: self.query_mms(pair=pair, start=start, end=end, precision=precision)
+            else:
+                query = lambda: self.query_window(pair=pair, start=start, end=end, window=precision)
+            return backends.get_backend().get_or_compute((pair, precision, start, end), query)
+        if resolution not in rollups.RESOLUTIONS or precision not in rollups.WINDOWS:
+            raise ValueError
+        return backends.get_backend().get_or_compute(
+            (pair, precision, start, end, resolution),
+            lambda: self.query_rollups(pair=pair, start=start, end=end, precision=precision, resolution=resolution),
+        )
+
+    def write_generation(self, pair: str) -> Optional[str]:
+        """
+        Returns the write generation of the pair, bumped by every writer, or None if it cannot be read.
+        """
+        return backends.get_backend().generation(pair)
+
+    def stored_span(self, pair: str) -> Optional[Tuple[int, int, int]]:
+        """
+        Returns the (first, last, count) timestamps and number of days stored for the pair, or None if it has none.
+
+        Cached like the searches, so writers invalidate it along with the other entries of the pair.
+        """
+        def query():
+            with instruments.QueryTimer('stored_span'), db.get_db_engine().connect() as conn:
+                return self.span_of(conn.execute(self.stored_span_statement(pair_store.get_id(conn, pair))).one())
+
+        return backends.get_backend().get_or_compute((pair, STORED_SPAN), query)
+
+    @staticmethod
+    def stored_span_statement(pair_id: Optional[int]):
+        """
+        Builds the `stored_span` query of a pair id (None for an unknown pair). Shared by the sync and async serving modes.
+        """
+        timestamp = MovingAverage.timestamp
+        return select(func.min(timestamp), func.max(timestamp), func.count()).where(MovingAverage.pair_id == pair_id)
+
+    @staticmethod
+    def span_of(row) -> Optional[Tuple[int, int, int]]:
+        """
+        Converts the row of `stored_span_statement` into the `stored_span` result.
+        """
+        first, last, count = row
+        return None if not count else (first, last, count)
+
+    def query_mms(self, pair: str, start: int, end: int, precision: int):
+        """
+        Runs the `search_mms` query against the database, bypassing the response cache.
+
         Args:
             pair (str): The currency pair for which the MMS data is requested.
             start (int): The start timestamp for the data range.
@@ -112,33 +330,247 @@ class MB_API:
             precision (int): The precision of the MMS data (e.g., 20, 50, 200).
 
         Returns:
-            List[Dict]: A list of dictionaries containing the timestamp and MMS value.
-                        Raises a ValueError if the precision is not supported.
+            Rows: The timestamp and MMS value of each day, read as a list of dictionaries.
 
         Raises:
             ValueError: If the precision value is not supported.
         """
-        with db.get_db_engine().connect() as conn:
+        with instruments.QueryTimer('mms') as query, db.get_db_engine().connect() as conn:
+            stmt = self.mms_statement(pair_id=pair_store.get_id(conn, pair), start=start, end=end, precision=precision)
+            res = Rows.from_result(conn.execute(stmt))
+            query.rows = len(res)
+            return res
+
+    @staticmethod
+    def mms_statement(pair_id: Optional[int], start: int, end: int, precision: int):
+        """
+        Builds the `search_mms` query of a fixed precision, for a pair id (None for an unknown pair,
+        which matches no row). Shared by the sync and async serving modes.
+
+        Raises:
+            ValueError: If the precision value is not supported.
+        """
+        match precision:
+            case 20:
+                return (
+                    select(MovingAverage.timestamp, MovingAverage.mms_20.label('mms'))
+                    .where(MovingAverage.pair_id == pair_id)
+                    .where(MovingAverage.timestamp.between(start, end))
+                )
+            case 50:
+                return (
+                    select(MovingAverage.timestamp, MovingAverage.mms_50.label('mms'))
+                    .where(MovingAverage.pair_id == pair_id)
+                    .where(MovingAverage.timestamp.between(start, end))
+                )
+            case 200:
+                return (
+                    select(MovingAverage.timestamp, MovingAverage.mms_200.label('mms'))
+                    .where(MovingAverage.pair_id == pair_id)
+                    .where(MovingAverage.timestamp.between(start, end))
+                )
+            case _:
+                raise ValueError
+
+    def query_window(self, pair: str, start: int, end: int, window: int):
+        """
+        Computes the moving average of an arbitrary window from the stored closes of the pair.
+
+        The closes are loaded into the process-wide series cache once per pair, and each window is
+        computed over the whole series once and memoized, so further ranges only slice it.
+
+        Args:
+            pair (str): The currency pair for which the MMS data is requested.
+            start (int): The start timestamp for the data range.
+            end (int): The end timestamp for the data range.
+            window (int): The window size in days.
+
+        Returns:
+            Rows: The timestamp and MMS value of each day, read as a list of dictionaries.
+
+        Raises:
+            ValueError: If the window is smaller than 1.
+        """
+        def load():
+            with instruments.QueryTimer('closes') as query, db.get_db_engine().connect() as conn:
+                timestamps, closes = closes_store.load_closes(conn, pair)
+                query.rows = len(timestamps)
+                return timestamps, closes
+
+        return series.get_series_cache().window(pair, window, start, end, load)
+
+    def query_indicator(self, pair: str, start: int, end: int, window: int, indicator: str):
+        """
+        Returns the values of an EMA/WMA indicator for the pair.
+
+        Indicators listed in `MMS_INDICATORS` are maintained by the writers and read from
+        `indicator_values`; any other window, or a configured one with no stored values in the
+        range yet (e.g. just added to `MMS_INDICATORS`), is computed on demand from the stored
+        closes, like `query_window`.
+
+        Args:
+            pair (str): The currency pair for which the data is requested.
+            start (int): The start timestamp for the data range.
+            end (int): The end timestamp for the data range.
+            window (int): The window size in days.
+            indicator (str): The indicator name, e.g. `ema` or `wma`.
+
+        Returns:
+            Rows: The timestamp and the indicator value as `mms` of each day.
+        """
+        if (indicator, window) in indicators.configured_specs():
+            with instruments.QueryTimer('indicator') as query, db.get_db_engine().connect() as conn:
+                res = indicator_store.query_values(conn, pair, indicator, window, start, end)
+                query.rows = len(res)
+            if res:
+                return res
+
+        def load():
+            with instruments.QueryTimer('closes') as query, db.get_db_engine().connect() as conn:
+                timestamps, closes = closes_store.load_closes(conn, pair)
+                query.rows = len(timestamps)
+                return timestamps, closes
+
+        return series.get_series_cache().window(pair, window, start, end, load, indicator=indicator)
+
+    def query_rollups(self, pair: str, start: int, end: int, precision: int, resolution: str):
+        """
+        Reads the weekly or monthly rollups of the buckets overlapping [start, end].
+
+        Args:
+            pair (str): The currency pair for which the MMS data is requested.
+            start (int): The start timestamp for the data range.
+            end (int): The end timestamp for the data range.
+            precision (int): The precision of the MMS data (20, 50 or 200).
+            resolution (str): `1w` or `1M`.
+
+        Returns:
+            Rows: The bucket start as `timestamp`, the last value of the bucket as `mms`,
+                        and its `min`, `max` and `mean`.
+        """
+        column = f'mms_{precision}'
+        stmt = (
+            select(
+                MovingAverageRollup.bucket.label('timestamp'),
+                getattr(MovingAverageRollup, f'{column}_last').label('mms'),
+                getattr(MovingAverageRollup, f'{column}_min').label('min'),
+                getattr(MovingAverageRollup, f'{column}_max').label('max'),
+                getattr(MovingAverageRollup, f'{column}_mean').label('mean'),
+            )
+            .where(MovingAverageRollup.pair == pair)
+            .where(MovingAverageRollup.resolution == resolution)
+            .where(MovingAverageRollup.bucket.between(rollups.bucket_start(start, resolution), end))
+            .order_by(MovingAverageRollup.bucket)
+        )
+        with instruments.QueryTimer('rollups') as query, db.get_db_engine().connect() as conn:
+            res = Rows.from_result(conn.execute(stmt))
+            query.rows = len(res)
+            return res
+
+    def search_mms_batch(self, pairs: List[str], start: int, end: int, precisions: List[int]):
+        """
+        Searches the Mean Moving Average (MMS) data of several pairs and precisions with a single query.
+
+        Args:
+            pairs (List[str]): The currency pairs for which the MMS data is requested.
+            start (int): The start timestamp for the data range.
+            end (int): The end timestamp for the data range.
+            precisions (List[int]): The precisions of the MMS data (e.g., 20, 50, 200).
+
+        Returns:
+            Dict[str, Rows]: For each requested pair, the rows containing the timestamp
+                             and one `mms_<precision>` value per requested precision, oldest first.
+
+        Raises:
+            ValueError: If no pair or precision is given, or a precision value is not supported.
+        """
+        pairs, columns = self.batch_columns(pairs=pairs, precisions=precisions)
+        with instruments.QueryTimer('batch') as query, db.get_db_engine().connect() as conn:
+            ids = pair_store.get_ids(conn, pairs)
+            result = conn.execute(self.batch_statement(ids.values(), start=start, end=end, columns=columns))
+            res = result.all()
+            query.rows = len(res)
+            return self.group_batch(pairs, ids, list(result.keys())[1:], res)
+
+    @staticmethod
+    def batch_columns(pairs: List[str], precisions: List[int]):
+        """
+        Validates the pairs and precisions of a batch search. Shared by the sync and async serving modes.
+
+        Returns:
+            Tuple[List[str], List[Column]]: The deduplicated pairs and the column of each precision.
+
+        Raises:
+            ValueError: If no pair or precision is given, or a precision value is not supported.
+        """
+        pairs = list(dict.fromkeys(pairs))
+        precisions = list(dict.fromkeys(precisions))
+        if not pairs or not precisions:
+            raise ValueError
+
+        columns = []
+        for precision in precisions:
             match precision:
                 case 20:
-                    stmt = (
-                        select(MovingAverage.timestamp, MovingAverage.mms_20.label('mms'))
-                        .where(MovingAverage.pair == pair)
-                        .where(MovingAverage.timestamp.between(start, end))
-                    )
+                    columns.append(MovingAverage.mms_20)
                 case 50:
-                    stmt = (
-                        select(MovingAverage.timestamp, MovingAverage.mms_50.label('mms'))
-                        .where(MovingAverage.pair == pair)
-                        .where(MovingAverage.timestamp.between(start, end))
-                    )
+                    columns.append(MovingAverage.mms_50)
                 case 200:
-                    stmt = (
-                        select(MovingAverage.timestamp, MovingAverage.mms_200.label('mms'))
-                        .where(MovingAverage.pair == pair)
-                        .where(MovingAverage.timestamp.between(start, end))
-                    )
+                    columns.append(MovingAverage.mms_200)
                 case _:
                     raise ValueError
-            res = conn.execute(stmt).all()
-            return [r._asdict() for r in res]
+        return pairs, columns
+
+    @staticmethod
+    def batch_statement(pair_ids: Iterable[int], start: int, end: int, columns: List):
+        """
+        Builds the `search_mms_batch` query of the pair ids and `batch_columns`. Shared by the sync and async serving modes.
+        """
+        return (
+            select(MovingAverage.pair_id, MovingAverage.timestamp, *columns)
+            .where(MovingAverage.pair_id.in_(list(pair_ids)))
+            .where(MovingAverage.timestamp.between(start, end))
+            .order_by(MovingAverage.pair_id, MovingAverage.timestamp)
+        )
+
+    @staticmethod
+    def group_batch(pairs: List[str], ids: Dict[str, int], columns: List[str], rows) -> Dict[str, Rows]:
+        """
+        Groups the rows of a `batch_statement` query by pair, given the pair ids and the column names after `pair_id`.
+        """
+        res = {pair: [] for pair in pairs}
+        names = {pair_id: pair for pair, pair_id in ids.items()}
+        for row in rows:
+            res[names[row[0]]].append(row[1:])
+        return {pair: Rows(columns, values) for pair, values in res.items()}
+
+    def export_mms(self, pair: str, start: int, end: int, batch_size: int = 1000):
+        """
+        Streams every precision of the Mean Moving Average (MMS) data for a pair and time range.
+
+        Rows are read through a server-side cursor `batch_size` rows at a time, so memory does not
+        grow with the size of the range. The connection stays open until the generator is exhausted
+        or closed.
+
+        Args:
+            pair (str): The currency pair for which the MMS data is requested.
+            start (int): The start timestamp for the data range.
+            end (int): The end timestamp for the data range.
+            batch_size (int, optional): Rows fetched per round trip. Defaults to 1000.
+
+        Yields:
+            Tuple[int, Optional[float], Optional[float], Optional[float]]: The timestamp, mms_20, mms_50
+                                                                          and mms_200 of each row,
+                                                                          oldest first.
+        """
+        with db.get_db_engine().connect() as conn:
+            stmt = (
+                select(MovingAverage.timestamp, MovingAverage.mms_20, MovingAverage.mms_50, MovingAverage.mms_200)
+                .where(MovingAverage.pair_id == pair_store.get_id(conn, pair))
+                .where(MovingAverage.timestamp.between(start, end))
+                .order_by(MovingAverage.timestamp)
+            )
+            res = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+            for partition in res.partitions():
+                for row in partition:
+                    yield tuple(row)
@@ -0,0 +1,83 @@
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class RunningMean:
+    """
+    Keeps the mean of the last `window` values using a compensated running sum.
+
+    Each push adds the newest value and subtracts the one leaving the window in O(1).
+    Both operations go through Neumaier summation, so the rounding error stays bounded
+    no matter how long the series is.
+    """
+
+    __slots__ = ('window', 'values', 'total', 'compensation')
+
+    def __init__(self, window: int) -> None:
+        """
+        Initializes an empty running mean.
+
+        Args:
+            window (int): The number of values averaged. Must be at least 1.
+        """
+        if window < 1:
+            raise ValueError('window must be at least 1')
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def _add(self, value: float) -> None:
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    def push(self, value: float) -> Optional[float]:
+        """
+        Adds a value to the window.
+
+        Args:
+            value (float): The newest value of the series.
+
+        Returns:
+            Optional[float]: The mean of the window, or None while fewer than `window` values were pushed.
+        """
+        if len(self.values) == self.window:
+            self._add(-self.values[0])
+        self.values.append(value)
+        self._add(value)
+        return self.mean()
+
+    def mean(self) -> Optional[float]:
+        """
+        Returns the mean of the current window, or None if the window is not full yet.
+        """
+        if len(self.values) < self.window:
+            return None
+        return (self.total + self.compensation) / self.window
+
+
+def sliding_means(rates: List[Tuple[Any, Any]], deltas: Iterable[int]) -> Dict[int, List[Tuple[Optional[float], Any]]]:
+    """
+    Calculates the sliding means for several window sizes in a single traversal of the rates.
+
+    Args:
+        rates (List[Tuple[Any, Any]]): A list of tuples containing the rate and timestamp.
+        deltas (Iterable[int]): The window sizes to compute. All of them must be at least 1.
+
+    Returns:
+        Dict[int, List[Tuple[Optional[float], Any]]]: For each window size, a list of tuples with the mean
+                                                      and the timestamp, where the mean is None until the
+                                                      window is full.
+    """
+    means = {delta: RunningMean(delta) for delta in deltas}
+    series = {delta: [] for delta in means}
+
+    for rate, timestamp in rates:
+        for delta, running in means.items():
+            series[delta].append((running.push(rate), timestamp))
+
+    return series
@@ -0,0 +1,87 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from mb_mms.services.mb_api import moving_average
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised by patching `np` in tests
+    np = None
+
+
+def has_numpy() -> bool:
+    """
+    Returns True when the NumPy backend is available.
+    """
+    return np is not None
+
+
+def sliding_means_arrays(closes: Sequence[float], deltas: Iterable[int]):
+    """
+    Calculates the sliding means of a close column for several window sizes with NumPy.
+
+    The closes are shifted by their first value before the cumulative sum, which keeps the
+    magnitude of the prefix sums (and therefore the cancellation error) small.
+
+    Args:
+        closes (Sequence[float]): The close column. Converted to a contiguous float64 array.
+        deltas (Iterable[int]): The window sizes to compute. All of them must be at least 1.
+
+    Returns:
+        Dict[int, numpy.ndarray]: For each window size, an array as long as `closes` holding NaN
+                                  until the window is full.
+
+    Raises:
+        RuntimeError: If NumPy is not installed.
+    """
+    if np is None:
+        raise RuntimeError('numpy is not installed')
+
+    values = np.ascontiguousarray(closes, dtype=np.float64)
+    size = values.shape[0]
+    shift = values[0] if size else 0.0
+    prefix = np.empty(size + 1, dtype=np.float64)
+    prefix[0] = 0.0
+    np.cumsum(values - shift, out=prefix[1:])
+
+    means = {}
+    for delta in deltas:
+        out = np.full(size, np.nan, dtype=np.float64)
+        if delta <= size:
+            out[delta - 1:] = (prefix[delta:] - prefix[:-delta]) / delta + shift
+        means[delta] = out
+    return means
+
+
+def sliding_means_columns(closes: Sequence[float], timestamps: Sequence[Any], deltas: Iterable[int]) -> Dict[int, List[Tuple[Optional[float], Any]]]:
+    """
+    Calculates the sliding means for several window sizes from the close and timestamp columns.
+
+    Uses NumPy when it is installed and falls back to the pure-Python running sums otherwise.
+    Both backends return the same shape as `moving_average.sliding_means`.
+
+    Args:
+        closes (Sequence[float]): The close column.
+        timestamps (Sequence[Any]): The timestamp column, as long as `closes`.
+        deltas (Iterable[int]): The window sizes to compute. All of them must be at least 1.
+
+    Returns:
+        Dict[int, List[Tuple[Optional[float], Any]]]: For each window size, a list of tuples with the mean
+                                                      and the timestamp, where the mean is None until the
+                                                      window is full.
+    """
+    if len(closes) != len(timestamps):
+        raise ValueError('closes and timestamps must have the same length')
+
+    deltas = list(deltas)
+    if np is None:
+        return moving_average.sliding_means(rates=list(zip(closes, timestamps)), deltas=deltas)
+
+    timestamps = list(timestamps)
+    series = {}
+    for delta, means in sliding_means_arrays(closes, deltas).items():
+        values = means.tolist()
+        series[delta] = [
+            (None if idx < delta - 1 else value, timestamp)
+            for idx, (value, timestamp) in enumerate(zip(values, timestamps))
+        ]
+    return series
@@ -0,0 +1,96 @@
+"""
+The metrics recorded on the hot paths, all in the process-wide registry.
+"""
+import time
+
+from mb_mms.services.metrics.registry import BYTE_BUCKETS, REGISTRY, SIZE_BUCKETS
+
+UPSTREAM_FETCH_SECONDS = REGISTRY.histogram(
+    'mms_upstream_fetch_seconds', 'Time spent downloading candles from the MB API.', ['outcome'])
+UPSTREAM_FETCH_BYTES = REGISTRY.histogram(
+    'mms_upstream_fetch_bytes', 'Size of the MB API candle responses.', buckets=BYTE_BUCKETS)
+UPSTREAM_CANDLES = REGISTRY.counter(
+    'mms_upstream_candles_total', 'Candles downloaded from the MB API.')
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'mms_db_query_seconds', 'Time spent running read queries, by query.', ['query'])
+DB_QUERY_ROWS = REGISTRY.histogram(
+    'mms_db_query_rows', 'Rows returned by read queries, by query.', ['query'], buckets=SIZE_BUCKETS)
+
+COMPUTE_SECONDS = REGISTRY.histogram(
+    'mms_compute_seconds', 'Time spent computing moving averages, by function.', ['function'])
+COMPUTE_VALUES = REGISTRY.counter(
+    'mms_compute_values_total', 'Input values of the moving-average computations, by function.', ['function'])
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    'mms_request_seconds', 'Time spent handling requests, by endpoint and status.', ['endpoint', 'status'])
+SERIALIZATION_SECONDS = REGISTRY.histogram(
+    'mms_serialization_seconds', 'Time spent serializing response bodies, by endpoint.', ['endpoint'])
+
+JOB_SECONDS = REGISTRY.histogram(
+    'mms_job_seconds', 'Duration of the scheduled job runs, by job.', ['job'])
+JOB_PAIR_SECONDS = REGISTRY.histogram(
+    'mms_job_pair_seconds', 'Duration of each pair of the nightly job, including its retries, by outcome.',
+    ['outcome'])
+JOB_RETRIES = REGISTRY.counter(
+    'mms_job_retries_total', 'Retries of failed pairs of the nightly job.')
+JOB_FAILURES = REGISTRY.counter(
+    'mms_job_failures_total', 'Pairs of the nightly job that ran out of retries.')
+
+PROFILES = REGISTRY.counter(
+    'mms_profiles_total', 'Requests run under the sampling profiler.')
+
+
+class QueryTimer:
+    """
+    Times a read query and records the rows it returned, when the block sets `rows`.
+
+        with QueryTimer('mms') as query:
+            res = conn.execute(stmt).all()
+            query.rows = len(res)
+    """
+
+    __slots__ = ('name', 'rows', 'started')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.rows = None
+
+    def __enter__(self) -> 'QueryTimer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - self.started, self.name)
+        if self.rows is not None:
+            DB_QUERY_ROWS.observe(self.rows, self.name)
+
+
+def _numeric(stats):
+    return [(key, value) for key, value in stats.items() if isinstance(value, (int, float)) and key != 'pid']
+
+
+def pool_samples():
+    """
+    The connection pool statistics of `/v1/stats/pool`, as gauges.
+    """
+    from mb_mms.services.data import db
+
+    for key, value in _numeric(db.get_pool_stats()):
+        yield f'mms_db_pool_{key}', 'gauge', f'Connection pool {key.replace("_", " ")}.', {}, value
+
+
+def cache_samples():
+    """
+    The result cache statistics of `/v1/stats/cache`, as gauges.
+    """
+    from mb_mms.services.cache import backends
+
+    stats = backends.get_backend().stats()
+    labels = {'backend': str(stats.get('backend'))}
+    for key, value in _numeric(stats):
+        yield f'mms_cache_{key}', 'gauge', f'Result cache {key.replace("_", " ")}.', labels, value
+
+
+REGISTRY.register_collector(pool_samples)
+REGISTRY.register_collector(cache_samples)
@@ -0,0 +1,125 @@
+import cProfile
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+ProfileHook = Callable[[str, pstats.Stats], None]
+
+UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+class SamplingProfiler:
+    """
+    Runs a random fraction of the requests under `cProfile` and hands each profile to a hook.
+
+    With a `rate` of 0 (the default) `start` is a single comparison, so the hook can stay
+    installed in production and be enabled through the environment when a slow path needs to be
+    looked at. Only one request per process is profiled at a time, since the profiler of a thread
+    cannot be nested.
+    """
+
+    def __init__(self, rate: float = 0.0, hook: Optional[ProfileHook] = None,
+                 rng: Callable[[], float] = random.random) -> None:
+        self.rate = rate
+        self.hook = hook
+        self._rng = rng
+        self._busy = threading.Lock()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """
+        Returns a running profiler if this request is sampled, and None otherwise.
+        """
+        if self.rate <= 0 or self.hook is None or self._rng() >= self.rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) already owns the hook
+            self._busy.release()
+            return None
+        return profile
+
+    def stop(self, profile: Optional[cProfile.Profile], name: str) -> None:
+        """
+        Stops a profiler returned by `start` and passes its statistics to the hook.
+        """
+        if profile is None:
+            return
+        profile.disable()
+        self._busy.release()
+        try:
+            self.hook(name, pstats.Stats(profile))
+        except Exception as err:
+            print('profile hook error: ', err)
+
+
+def directory_hook(directory: str) -> ProfileHook:
+    """
+    Returns a hook writing each profile to `<directory>/<unix ms>-<name>.prof`, for `snakeviz` or `pstats`.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    def hook(name: str, stats: pstats.Stats) -> None:
+        path = os.path.join(directory, f'{int(time.time() * 1000)}-{UNSAFE.sub("_", name)}.prof')
+        stats.dump_stats(path)
+
+    return hook
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> SamplingProfiler:
+    """
+    Returns the process-wide request profiler, creating it on first use.
+
+    Settings:
+        - `MMS_PROFILE_RATE`: Fraction of the requests to profile (default 0, disabled).
+        - `MMS_PROFILE_DIR`: Directory the profiles are written to (default `profiles`).
+    """
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                rate = float(os.getenv('MMS_PROFILE_RATE', '0'))
+                hook = directory_hook(os.getenv('MMS_PROFILE_DIR', 'profiles')) if rate > 0 else None
+                _profiler = SamplingProfiler(rate=rate, hook=hook)
+    return _profiler
+
+
+def set_profile_hook(hook: Optional[ProfileHook], rate: Optional[float] = None) -> SamplingProfiler:
+    """
+    Sends the sampled profiles to `hook` instead of the profile directory, e.g. to ship them elsewhere.
+    """
+    profiler = get_profiler()
+    profiler.hook = hook
+    if rate is not None:
+        profiler.rate = rate
+    return profiler
+
+
+def reset_profiler() -> None:
+    """
+    Drops the process-wide profiler so the next call reads the settings again.
+    """
+    global _profiler
+    with _profiler_lock:
+        _profiler = None
+
+
+def _after_fork_in_child() -> None:
+    global _profiler, _profiler_lock
+    _profiler = None
+    _profiler_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
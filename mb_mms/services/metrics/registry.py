@@ -0,0 +1,254 @@
+import math
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+                   60.0, 300.0)
+# Row and value count buckets
+SIZE_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 100000)
+# Byte count buckets
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric(ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _check(self, labelvalues: Tuple[str, ...]) -> None:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f'{self.name} takes labels {self.labelnames}, got {labelvalues}')
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    @abstractmethod
+    def reset(self) -> None:
+        """
+        Drops every recorded value.
+        """
+
+    @abstractmethod
+    def render(self) -> List[str]:
+        """
+        Returns the lines of the metric in the Prometheus text format, its header first.
+        """
+
+
+class Counter(_Metric):
+    """
+    A monotonically increasing count per label values.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labelvalues: str) -> None:
+        if len(labelvalues) != len(self.labelnames):
+            self._check(labelvalues)
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_labels(self.labelnames, labels)} {_format_value(value)}' for labels, value in values
+        ]
+
+
+class Histogram(_Metric):
+    """
+    Observations counted into fixed cumulative buckets, with their sum and count, per label values.
+
+    `observe` is a bisect and three additions under a lock, so it is cheap enough for every request.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        if len(labelvalues) != len(self.labelnames):
+            self._check(labelvalues)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labelvalues: str) -> '_Timer':
+        """
+        Returns a context manager observing the seconds spent in its block, also when it raises.
+        """
+        return _Timer(self, labelvalues)
+
+    def count(self, *labelvalues: str) -> int:
+        series = self._series.get(labelvalues)
+        return series[2] if series else 0
+
+    def sum(self, *labelvalues: str) -> float:
+        series = self._series.get(labelvalues)
+        return series[1] if series else 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count)
+                            in self._series.items())
+        lines = self.header()
+        bounds = self.buckets + (math.inf,)
+        for labels, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket in zip(bounds, counts):
+                cumulative += bucket
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {count}')
+        return lines
+
+
+class _Timer:
+    # A class rather than a generator-based context manager, at less than half the overhead
+    __slots__ = ('histogram', 'labelvalues', 'started')
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple[str, ...]) -> None:
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self) -> '_Timer':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+
+
+Collector = Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]
+
+
+class Registry:
+    """
+    The metrics of the process, rendered in the Prometheus text exposition format.
+
+    Besides its counters and histograms, the registry calls collectors at render time for values
+    kept elsewhere (pool and cache statistics). A collector yields (name, type, help, labels, value)
+    samples.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'metric {metric.name} already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        with self._lock:
+            self._collectors.append(collector)
+
+    def reset(self) -> None:
+        """
+        Zeroes every counter and histogram.
+        """
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+
+        families: Dict[str, List[str]] = {}
+        for collector in list(self._collectors):
+            try:
+                samples = list(collector())
+            except Exception as err:
+                print('metrics collector error: ', err)
+                continue
+            for name, kind, documentation, labels, value in samples:
+                family = families.get(name)
+                if family is None:
+                    family = families[name] = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+                family.append(f'{name}{_labels(list(labels), list(labels.values()))} {_format_value(value)}')
+        for family in families.values():
+            lines.extend(family)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _after_fork_in_child() -> None:
+    # A lock held by another thread at fork time would never be released in the child
+    REGISTRY._lock = threading.Lock()
+    for metric in REGISTRY._metrics.values():
+        metric._lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,200 @@
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import pytest
+from flask import Flask
+
+from mb_mms import asgi
+from mb_mms.api.routes import currency_bp
+from mb_mms.models.pair_averages import Base
+from mb_mms.services.cache import backends
+from mb_mms.services.data import async_db, db
+from mb_mms.services.mb_api import async_mb_api
+
+DAY = 86400
+
+
+class FakeAsyncConnection:
+    # Runs the statements on a sync connection, enough to exercise the async code paths
+    def __init__(self, conn, executed):
+        self.conn = conn
+        self.sync_engine = conn.engine
+        self.executed = executed
+
+    async def execute(self, stmt):
+        self.executed.append(stmt)
+        await asyncio.sleep(0)
+        return self.conn.execute(stmt)
+
+
+class FakeAsyncEngine:
+    def __init__(self, engine):
+        self.engine = engine
+        self.executed = []
+
+    @asynccontextmanager
+    async def connect(self):
+        with self.engine.connect() as conn:
+            yield FakeAsyncConnection(conn, self.executed)
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    backends.reset_backend()
+    engine = db.get_db_engine()
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        db.upsert_moving_averages(conn, [
+            {'pair': pair, 'timestamp': 1_000_000 + i * DAY, 'mms_20': i + 0.5, 'mms_50': None, 'mms_200': i / 3}
+            for pair in ('BRLBTC', 'BRLETH') for i in range(10)
+        ])
+    fake = FakeAsyncEngine(engine)
+    with patch.object(async_db, 'get_async_engine', return_value=fake):
+        yield fake
+    db.dispose_db_engine()
+    backends.reset_backend()
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(currency_bp)
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def call(path, query='', method='GET', headers=()):
+    status, response_headers, body = respond(path, query, method, headers)
+    return status, response_headers['content-type'], body
+
+
+def respond(path, query='', method='GET', headers=()):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': [(name.encode(), value.encode()) for name, value in headers]}
+    asyncio.run(asgi.app(scope, receive, send))
+    response_headers = {name.decode(): value.decode() for name, value in messages[0]['headers']}
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return messages[0]['status'], response_headers, body
+
+
+@pytest.mark.parametrize('path,query', [
+    ('/v1/', ''),
+    ('/v1/BRLBTC/mms', 'precision=20d&from=1000000&to=1500000'),
+    ('/v1/BRLBTC/mms', 'precision=200d&from=1000000'),
+    ('/v1/BRLBTC/mms', 'precision=50d&from=1000000&to=1500000&resolution=1w'),
+    ('/v1/BRLBTC/mms', 'precision=20d'),
+    ('/v1/BRLBTC/mms', 'precision=10d&from=1000000&to=1500000'),
+    ('/v1/BRLBTC/mms', 'precision=20d&from=1000000&to=1500000&indicator=rsi'),
+    ('/v1/mms/batch', 'pairs=BRLBTC,BRLETH&pairs=BRLXRP&precision=200d,20d&from=1000000&to=1500000'),
+    ('/v1/mms/batch', 'pairs=BRLBTC&precision=7d&from=1000000'),
+    ('/v1/BRLETH/mms/export', 'from=1000000&to=1500000&format=csv'),
+    ('/v1/BRLETH/mms/export', 'from=1000000&to=1500000'),
+    ('/v1/BRLETH/mms/export', 'from=1000000&format=xml'),
+])
+def test_responses_match_wsgi(sqlite_db, client, path, query):
+    expected = client.get(f'{path}?{query}')
+
+    status, content_type, body = call(path, query)
+
+    assert status == expected.status_code
+    assert content_type == expected.content_type
+    assert body == expected.data
+
+
+def test_compressed_responses_match_wsgi(sqlite_db, client, monkeypatch):
+    monkeypatch.setenv('MMS_COMPRESS_MIN_SIZE', '1')
+    query = 'precision=20d&from=1000000&to=1500000'
+    expected = client.get(f'/v1/BRLBTC/mms?{query}', headers={'Accept-Encoding': 'gzip'})
+    assert expected.headers['Content-Encoding'] == 'gzip'
+
+    status, content_type, body = call('/v1/BRLBTC/mms', query, headers=[('accept-encoding', 'gzip')])
+
+    assert status == expected.status_code
+    assert body == expected.data
+
+
+def test_conditional_responses_match_wsgi(sqlite_db, client):
+    path, query = '/v1/BRLBTC/mms', 'precision=20d&from=1000000&to=1500000'
+    expected = client.get(f'{path}?{query}')
+
+    status, headers, body = respond(path, query)
+    assert status == 200 and body == expected.data
+    assert headers['etag'] == expected.headers['ETag']
+    assert headers['cache-control'] == expected.headers['Cache-Control']
+
+    expected = client.get(f'{path}?{query}', headers={'If-None-Match': headers['etag']})
+    assert expected.status_code == 304
+    status, headers, body = respond(path, query, headers=[('if-none-match', headers['etag'])])
+    assert status == 304 and body == b''
+    assert headers['etag'] == expected.headers['ETag']
+
+
+def test_stored_span_is_invalidated_by_writers(sqlite_db):
+    api = async_mb_api.AsyncMB_API()
+    generation = asyncio.run(api.write_generation('BRLBTC'))
+    assert asyncio.run(api.stored_span('BRLBTC')) == (1_000_000, 1_000_000 + 9 * DAY, 10)
+    assert async_mb_api.MB_API().stored_span('BRLXRP') is None
+
+    with db.get_db_engine().begin() as conn:
+        db.upsert_moving_averages(conn, [{'pair': 'BRLBTC', 'timestamp': 1_000_000 + 10 * DAY, 'mms_20': 1.0,
+                                          'mms_50': None, 'mms_200': None}])
+    assert async_mb_api.MB_API().stored_span('BRLBTC') == (1_000_000, 1_000_000 + 9 * DAY, 10)
+    backends.invalidate_pair('BRLBTC')
+    assert async_mb_api.MB_API().stored_span('BRLBTC') == (1_000_000, 1_000_000 + 10 * DAY, 11)
+    assert asyncio.run(api.write_generation('BRLBTC')) != generation
+
+
+def test_search_shares_cache_and_single_flight(sqlite_db):
+    api = async_mb_api.AsyncMB_API()
+
+    async def search_many():
+        return await asyncio.gather(*[api.search_mms('BRLBTC', 1_000_000, 1_500_000, 20) for _ in range(5)])
+
+    results = asyncio.run(search_many())
+    assert all(result == results[0] for result in results)
+    assert len(sqlite_db.executed) == 1
+
+    # The sync path reads the entry stored by the async one
+    with patch.object(async_mb_api.MB_API, 'query_mms') as query:
+        assert async_mb_api.MB_API().search_mms('BRLBTC', 1_000_000, 1_500_000, 20) == results[0]
+        query.assert_not_called()
+
+
+def test_search_errors_are_not_cached(sqlite_db):
+    api = async_mb_api.AsyncMB_API()
+
+    async def failing():
+        raise RuntimeError('db down')
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(async_mb_api.get_or_compute(('BRLBTC', 20, 1, 2), failing))
+    assert async_mb_api._inflight == {}
+    assert asyncio.run(api.search_mms('BRLBTC', 1, 2, 20)) == []
+
+
+def test_not_found_and_method():
+    assert call('/v2/')[0] == 404
+    assert call('/v1/BRLBTC/mms', method='POST')[0] == 405
+
+
+def test_async_url(monkeypatch):
+    assert async_db.async_url('mysql+pymysql://u:p@db:3306/mb') == 'mysql+aiomysql://u:p@db:3306/mb'
+    assert async_db.async_url('sqlite:////tmp/mb.db') == 'sqlite+aiosqlite:////tmp/mb.db'
+    with pytest.raises(ValueError):
+        async_db.async_url('oracle://u:p@db/mb')
+
+    monkeypatch.setenv('DB_POOL_SIZE', '7')
+    options = async_db.async_engine_options('mysql+aiomysql://u:p@db/mb')
+    assert options['pool_size'] == 7 and 'poolclass' not in options
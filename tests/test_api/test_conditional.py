@@ -0,0 +1,76 @@
+import pytest
+
+from mb_mms.api import conditional
+
+DAY = 86400
+TODAY = 1_700_006_400  # 2023-11-15 00:00 UTC
+PARAMS = {'pair': 'BRLBTC', 'start': TODAY - 30 * DAY, 'end': TODAY - 2 * DAY, 'precision': 20,
+          'resolution': '1d', 'indicator': 'sma'}
+
+SPAN = (TODAY - 49 * DAY, TODAY - DAY, 49)
+
+def test_etag_depends_on_params_and_generation():
+    tag = conditional.etag(PARAMS, '1')
+
+    assert tag.startswith('W/"') and tag.endswith('"')
+    assert conditional.etag(dict(reversed(PARAMS.items())), '1') == tag
+    assert conditional.etag(PARAMS, '2') != tag
+    assert conditional.etag({**PARAMS, 'precision': 50}, '1') != tag
+    assert conditional.etag({**PARAMS, 'end': TODAY}, '1') != tag
+
+@pytest.mark.parametrize('header,expected', [
+    (None, False),
+    ('', False),
+    ('*', True),
+    ('{tag}', True),
+    ('"other", {tag}', True),
+    ('{strong}', True),
+    ('"other"', False),
+])
+def test_not_modified(header, expected):
+    tag = conditional.etag(PARAMS, '1')
+    if header:
+        header = header.format(tag=tag, strong=tag.removeprefix('W/'))
+    assert conditional.not_modified(header, tag) is expected
+
+def test_not_modified_without_etag():
+    assert conditional.not_modified('*', None) is False
+
+@pytest.mark.parametrize('params,span,expected', [
+    (PARAMS, SPAN, True),
+    (PARAMS, (TODAY - 49 * DAY, TODAY - 2 * DAY, 48), True),
+    # The last days of the range are not stored yet
+    (PARAMS, (TODAY - 49 * DAY, TODAY - 3 * DAY, 47), False),
+    # The look-back of the first day may still be backfilled
+    (PARAMS, (TODAY - 48 * DAY, TODAY - DAY, 48), False),
+    # A day of the span is missing
+    (PARAMS, (TODAY - 49 * DAY, TODAY - DAY, 48), False),
+    (PARAMS, None, False),
+    ({**PARAMS, 'end': TODAY + 3600}, (TODAY - 49 * DAY, TODAY, 50), False),
+    # 2023-11-13 is a Monday: its week runs past yesterday
+    ({**PARAMS, 'end': TODAY - 2 * DAY, 'resolution': '1w'}, SPAN, False),
+    ({**PARAMS, 'end': TODAY - 3 * DAY, 'resolution': '1w'}, SPAN, True),
+    # The week holding the start begins before the look-back is stored
+    ({**PARAMS, 'start': TODAY - 28 * DAY}, (TODAY - 47 * DAY, TODAY - DAY, 47), True),
+    ({**PARAMS, 'start': TODAY - 28 * DAY, 'end': TODAY - 3 * DAY, 'resolution': '1w'},
+     (TODAY - 47 * DAY, TODAY - DAY, 47), False),
+    # Older closes change every later EMA/WMA value, and on-demand windows are not stored
+    ({**PARAMS, 'indicator': 'ema'}, SPAN, False),
+    ({**PARAMS, 'indicator': 'wma'}, SPAN, False),
+    ({**PARAMS, 'precision': 30}, SPAN, False),
+])
+def test_is_historical(params, span, expected):
+    assert conditional.is_historical(params, span, today=TODAY) is expected
+
+def test_validators(monkeypatch):
+    monkeypatch.setenv('MMS_HISTORY_MAX_AGE', '600')
+
+    headers = conditional.validators(PARAMS, '1', SPAN, today=TODAY)
+    assert headers == {'ETag': conditional.etag(PARAMS, '1'),
+                       'Cache-Control': 'public, max-age=600, immutable'}
+    assert conditional.validators(PARAMS, '1', None, today=TODAY)['Cache-Control'] == 'public, no-cache'
+    assert conditional.validators({**PARAMS, 'indicator': 'ema'}, '1', SPAN, today=TODAY)['Cache-Control'] == (
+        'public, no-cache')
+    # Without a generation there is nothing to validate against
+    assert conditional.validators(PARAMS, None, SPAN, today=TODAY) == {
+        'Cache-Control': 'public, max-age=600, immutable'}
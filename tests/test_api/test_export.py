@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+from unittest.mock import patch
+import pytest
+from flask import Flask
+
+from mb_mms.api import export
+from mb_mms.api.routes import currency_bp
+from mb_mms.models.pair_averages import Base
+from mb_mms.services.data import db
+from mb_mms.services.mb_api.mb_api import MB_API
+
+ROWS = [
+    (1638316800, None, None, None),
+    (1638403200, 1.5, None, None),
+    (1638489600, 1.25, 2.0, 3.125),
+]
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.register_blueprint(currency_bp)
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    engine = db.get_db_engine()
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        db.upsert_moving_averages(conn, [
+            {'pair': 'BRLBTC', 'timestamp': ts, 'mms_20': a, 'mms_50': b, 'mms_200': c} for ts, a, b, c in ROWS
+        ] + [{'pair': 'BRLETH', 'timestamp': 1638316800, 'mms_20': 9.0, 'mms_50': 9.0, 'mms_200': 9.0}])
+    yield engine
+    db.dispose_db_engine()
+
+def test_ndjson():
+    lines = ''.join(export.ndjson(ROWS)).splitlines()
+    assert [json.loads(line) for line in lines] == [dict(zip(export.COLUMNS, row)) for row in ROWS]
+
+def test_csv():
+    parsed = list(csv.reader(io.StringIO(''.join(export.csv_rows(ROWS)))))
+    assert parsed[0] == list(export.COLUMNS)
+    assert parsed[1] == ['1638316800', '', '', '']
+    assert parsed[3] == ['1638489600', '1.25', '2.0', '3.125']
+
+def test_columnar():
+    body = json.loads(''.join(export.columnar(ROWS)))
+    assert body == {
+        'timestamp': [1638316800, 1638403200, 1638489600],
+        'mms_20': [None, 1.5, 1.25],
+        'mms_50': [None, None, 2.0],
+        'mms_200': [None, None, 3.125],
+    }
+
+def test_columnar_empty_and_chunked(monkeypatch):
+    assert json.loads(''.join(export.columnar([]))) == {column: [] for column in export.COLUMNS}
+
+    monkeypatch.setattr(export, 'CHUNK_ROWS', 2)
+    rows = [(ts, float(ts), None, None) for ts in range(5)]
+    assert json.loads(''.join(export.columnar(rows)))['mms_20'] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert len(''.join(export.ndjson(rows)).splitlines()) == 5
+
+def test_export_mms_streams_rows(sqlite_db):
+    rows = list(MB_API().export_mms('BRLBTC', 1638316800, 1638489600, batch_size=2))
+    assert rows == ROWS
+
+@pytest.mark.parametrize('fmt, mimetype', [('ndjson', 'application/x-ndjson'), ('csv', 'text/csv'),
+                                           ('columnar', 'application/json')])
+def test_export_route(client, sqlite_db, fmt, mimetype):
+    response = client.get(f'/v1/BRLBTC/mms/export?from=1638316800&to=1638489600&format={fmt}')
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert response.is_streamed
+    assert '1638489600' in response.get_data(as_text=True)
+    assert '9.0' not in response.get_data(as_text=True)
+
+def test_export_route_default_format(client, sqlite_db):
+    response = client.get('/v1/BRLBTC/mms/export?from=1638316800')
+    assert len(response.get_data(as_text=True).splitlines()) == 3
+
+def test_export_route_invalid_parameters(client):
+    assert client.get('/v1/BRLBTC/mms/export').status_code == 400
+    assert client.get('/v1/BRLBTC/mms/export?from=1&format=xml').status_code == 400
+
+def test_export_route_database_error(client):
+    def failing_export(**kwargs):
+        raise RuntimeError('db down')
+        yield
+
+    with patch.object(MB_API, 'export_mms', side_effect=failing_export):
+        response = client.get('/v1/BRLBTC/mms/export?from=1')
+    assert response.status_code == 500
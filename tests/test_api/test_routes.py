@@ -30,6 +30,8 @@ def test_search_route_success(client):
     with patch('mb_mms.services.mb_api.mb_api.MB_API') as mock_mb_api:
         mock_mb_instance = MagicMock(spec=MB_API)
         mock_mb_api.return_value = mock_mb_instance
+        mock_mb_instance.stored_span.return_value = None
+        mock_mb_instance.write_generation.return_value = '0'
 
         # Mock the search_mms method to return a list of results
         mock_mb_instance.search_mms.return_value = [
@@ -64,6 +66,8 @@ def test_search_route_default_end(client):
     with patch('mb_mms.services.mb_api.mb_api.MB_API') as mock_mb_api:
         mock_mb_instance = MagicMock(spec=MB_API)
         mock_mb_api.return_value = mock_mb_instance
+        mock_mb_instance.stored_span.return_value = None
+        mock_mb_instance.write_generation.return_value = '0'
 
         # Mock the search_mms method to return a list of results
         mock_mb_instance.search_mms.return_value = [
@@ -80,3 +84,130 @@ def test_search_route_default_end(client):
             {'timestamp': 1638316800, 'mms': 1.23},
             {'timestamp': 1638403200, 'mms': 1.24},
         ]
+
+def test_pool_stats_route(client):
+    with patch('mb_mms.services.data.db.get_pool_stats') as mock_stats:
+        mock_stats.return_value = {'checkouts': 3, 'timeouts': 0}
+        response = client.get('/v1/stats/pool')
+        assert response.status_code == 200
+        assert response.json == {'checkouts': 3, 'timeouts': 0}
+
+def test_cache_stats_route(client):
+    response = client.get('/v1/stats/cache')
+    assert response.status_code == 200
+    assert {'hits', 'misses', 'evictions', 'size'} <= set(response.json)
+
+def test_search_batch_route_success(client):
+    with patch('mb_mms.services.mb_api.mb_api.MB_API') as mock_mb_api:
+        mock_mb_instance = MagicMock(spec=MB_API)
+        mock_mb_api.return_value = mock_mb_instance
+        mock_mb_instance.search_mms_batch.return_value = {
+            'BRLBTC': [{'timestamp': 1638316800, 'mms_20': 1.23, 'mms_200': 1.5}],
+            'BRLETH': [],
+        }
+
+        response = client.get('/v1/mms/batch?pairs=BRLBTC,BRLETH&precision=20d&precision=200d&from=1638316800&to=1638403200')
+
+        assert response.status_code == 200
+        assert response.json == {
+            'BRLBTC': [{'timestamp': 1638316800, 'mms_20': 1.23, 'mms_200': 1.5}],
+            'BRLETH': [],
+        }
+        mock_mb_instance.search_mms_batch.assert_called_once_with(
+            pairs=['BRLBTC', 'BRLETH'], start=1638316800, end=1638403200, precisions=[20, 200]
+        )
+
+def test_search_batch_route_missing_parameters(client):
+    response = client.get('/v1/mms/batch?pairs=BRLBTC&from=1638316800')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = client.get('/v1/mms/batch?precision=20d&from=1638316800')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+def test_search_route_resolution(client):
+    with patch('mb_mms.services.mb_api.mb_api.MB_API') as mock_mb_api:
+        mock_mb_instance = MagicMock(spec=MB_API)
+        mock_mb_api.return_value = mock_mb_instance
+        mock_mb_instance.stored_span.return_value = None
+        mock_mb_instance.write_generation.return_value = '0'
+        mock_mb_instance.search_mms.return_value = [
+            {'timestamp': 1638144000, 'mms': 1.23, 'min': 1.2, 'max': 1.3, 'mean': 1.25},
+        ]
+
+        response = client.get('/v1/BRLBTC/mms?precision=20d&from=1638316800&to=1638403200&resolution=1w')
+
+        assert response.status_code == 200
+        assert response.json[0]['mean'] == 1.25
+        mock_mb_instance.search_mms.assert_called_once_with(
+            pair='BRLBTC', start=1638316800, end=1638403200, precision=20, resolution='1w', indicator='sma'
+        )
+
+        mock_mb_instance.search_mms.side_effect = ValueError
+        response = client.get('/v1/BRLBTC/mms?precision=20d&from=1638316800&to=1638403200&resolution=1y')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+def test_search_route_compresses(client, monkeypatch):
+    import gzip
+    from mb_mms.services.data.rows import Rows
+
+    monkeypatch.setenv('MMS_COMPRESS_MIN_SIZE', '1')
+    with patch('mb_mms.services.mb_api.mb_api.MB_API') as mock_mb_api:
+        mock_mb_api.return_value.search_mms.return_value = Rows(('timestamp', 'mms'), [(1638316800, 1.23)])
+        mock_mb_api.return_value.stored_span.return_value = None
+        mock_mb_api.return_value.write_generation.return_value = '0'
+
+        response = client.get('/v1/BRLBTC/mms?precision=20d&from=1638316800', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert gzip.decompress(response.data) == b'[{"mms":1.23,"timestamp":1638316800}]\n'
+
+        response = client.get('/v1/BRLBTC/mms?precision=20d&from=1638316800')
+        assert 'Content-Encoding' not in response.headers
+        assert response.json == [{'timestamp': 1638316800, 'mms': 1.23}]
+
+def test_search_route_conditional(client):
+    with patch('mb_mms.services.mb_api.mb_api.MB_API') as mock_mb_api:
+        mock_mb_instance = MagicMock(spec=MB_API)
+        mock_mb_api.return_value = mock_mb_instance
+        mock_mb_instance.write_generation.return_value = '0'
+        mock_mb_instance.stored_span.return_value = (1638316800 - 19 * 86400, 1638403200, 21)
+        mock_mb_instance.search_mms.return_value = [{'timestamp': 1638316800, 'mms': 1.23}]
+        path = '/v1/BRLBTC/mms?precision=20d&from=1638316800&to=1638403200'
+
+        response = client.get(path)
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert etag.startswith('W/"')
+        assert response.headers['Cache-Control'].endswith('immutable')
+
+        response = client.get(path, headers={'If-None-Match': etag})
+        assert response.status_code == HTTPStatus.NOT_MODIFIED
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+        assert mock_mb_instance.search_mms.call_count == 1
+
+        # Any write to the pair changes the ETag, even one that leaves the newest day unchanged
+        mock_mb_instance.write_generation.return_value = '1'
+        response = client.get(path, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+        # Without a generation the response carries no ETag and is never a 304
+        mock_mb_instance.write_generation.return_value = None
+        response = client.get(path, headers={'If-None-Match': '*'})
+        assert response.status_code == 200
+        assert 'ETag' not in response.headers
+
+def test_metrics_route(client):
+    from mb_mms.services.metrics import instruments
+
+    before = instruments.REQUEST_SECONDS.count('mms.search', '400')
+    client.get('/v1/BRLBTC/mms?precision=20')
+    assert instruments.REQUEST_SECONDS.count('mms.search', '400') == before + 1
+
+    response = client.get('/v1/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.data.decode()
+    assert '# TYPE mms_request_seconds histogram' in body
+    assert 'mms_request_seconds_count{endpoint="mms.search",status="400"}' in body
+    assert 'mms_db_pool_checkouts' in body
@@ -0,0 +1,85 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, jsonify
+
+from mb_mms.api import serialization
+from mb_mms.services.data.rows import Rows
+
+ROWS = Rows(('timestamp', 'mms'), [(1638316800, 1.23), (1638403200, None), (1638489600, 0.1 + 0.2)])
+BATCH = {
+    'BRLETH': Rows(('timestamp', 'mms_20', 'mms_200'), [(1, 2.5, None), (2, 3.0, 0.0001)]),
+    'BRLBTC': Rows(('timestamp', 'mms_20', 'mms_200'), []),
+}
+
+def as_jsonify(value):
+    app = Flask(__name__)
+    with app.app_context():
+        if isinstance(value, Rows):
+            value = list(value)
+        elif isinstance(value, dict):
+            value = {key: list(rows) if isinstance(rows, Rows) else rows for key, rows in value.items()}
+        return jsonify(value).get_data()
+
+@pytest.fixture(params=['orjson', 'stdlib'])
+def encoder(request, monkeypatch):
+    if request.param == 'stdlib':
+        monkeypatch.setattr(serialization, 'orjson', None)
+    elif serialization.orjson is None:
+        pytest.skip('orjson is not installed')
+    return request.param
+
+@pytest.mark.parametrize('value', [
+    ROWS,
+    BATCH,
+    Rows(('timestamp', 'mms'), []),
+    Rows(('timestamp', 'pair'), [(1, 'BRL,BTC'), (2, 'BRL"ETH')]),
+    [{'timestamp': 1, 'mms': 2.0}],
+    {'a': 1},
+])
+def test_dumps_matches_jsonify(encoder, value):
+    assert serialization.dumps(value) == as_jsonify(value)
+
+def test_dumps_is_equivalent_in_exponent_notation(encoder):
+    rows = Rows(('timestamp', 'mms'), [(1, 1e-07), (2, 1.5e+300)])
+    assert json.loads(serialization.dumps(rows)) == json.loads(as_jsonify(rows))
+
+def test_dumps_sorts_columns():
+    assert serialization.dumps(Rows(('timestamp', 'mms'), [(1, 2.0)])) == b'[{"mms":2.0,"timestamp":1}]\n'
+
+@pytest.mark.parametrize('header,expected', [
+    (None, None),
+    ('', None),
+    ('gzip', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('gzip;q=0', None),
+    ('*', 'gzip'),
+    ('*;q=0.1, gzip;q=0', None),
+    ('identity', None),
+    ('GZIP; Q=1.0', 'gzip'),
+    ('gzip;q=x', None),
+])
+def test_accepted_encoding(monkeypatch, header, expected):
+    monkeypatch.setattr(serialization, 'ENCODINGS', ('gzip',))
+    assert serialization.accepted_encoding(header) == expected
+
+def test_accepted_encoding_prefers_brotli(monkeypatch):
+    monkeypatch.setattr(serialization, 'ENCODINGS', ('br', 'gzip'))
+    assert serialization.accepted_encoding('gzip, deflate, br') == 'br'
+    assert serialization.accepted_encoding('gzip, br;q=0.5') == 'gzip'
+
+def test_encode_compresses_large_bodies(monkeypatch):
+    monkeypatch.setattr(serialization, 'ENCODINGS', ('gzip',))
+    rows = Rows(('timestamp', 'mms'), [(idx, idx / 7) for idx in range(500)])
+
+    body, headers = serialization.encode(rows, 'gzip')
+    assert headers == {'Vary': 'Accept-Encoding', 'Content-Encoding': 'gzip'}
+    assert gzip.decompress(body) == serialization.dumps(rows)
+    assert serialization.encode(rows, 'gzip')[0] == body
+
+    assert serialization.encode(rows, None) == (serialization.dumps(rows), {'Vary': 'Accept-Encoding'})
+    assert serialization.encode(ROWS, 'gzip') == (serialization.dumps(ROWS), {'Vary': 'Accept-Encoding'})
+
+    monkeypatch.setenv('MMS_COMPRESS_MIN_SIZE', '1')
+    assert serialization.encode(ROWS, 'gzip')[1]['Content-Encoding'] == 'gzip'
@@ -0,0 +1,72 @@
+import subprocess
+import sys
+from unittest.mock import MagicMock
+
+import click
+import pytest
+from flask import Flask
+
+import mb_mms
+from mb_mms.cli import LazyCommand
+
+HEAVY = ('sqlalchemy', 'requests', 'numpy', 'apscheduler', 'flask_apscheduler', 'mb_mms.services.mb_api.mb_api')
+
+def imported_after(code):
+    script = f'import sys\n{code}\nprint(",".join(sorted(name for name in {HEAVY!r} if name in sys.modules)))'
+    out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    return set(filter(None, out.stdout.strip().split(',')))
+
+def test_wsgi_app_imports_no_service():
+    assert imported_after('import mb_mms.wsgi') == set()
+
+def test_preload_imports_the_services():
+    assert {'sqlalchemy', 'requests', 'mb_mms.services.mb_api.mb_api'} <= imported_after(
+        'import os; os.environ["MMS_PRELOAD"] = "true"; import mb_mms.wsgi'
+    )
+
+def test_first_request_imports_the_services():
+    assert 'mb_mms.services.mb_api.mb_api' in imported_after(
+        'import mb_mms.wsgi; mb_mms.wsgi.app.test_client().get("/v1/BRLBTC/mms?precision=20")'
+    )
+
+def test_lazy_command_runs_the_real_command():
+    ran = []
+
+    @click.command('hello')
+    @click.option('--name', default='world')
+    def hello(name):
+        """Says hello."""
+        ran.append(name)
+
+    module = MagicMock(hello=hello)
+    app = Flask(__name__)
+    lazy = LazyCommand('hello', 'tests.fake:hello')
+    app.cli.add_command(lazy)
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setitem(sys.modules, 'tests.fake', module)
+        assert lazy._command is None
+        result = app.test_cli_runner().invoke(args=['hello', '--name', 'mms'])
+        assert result.exit_code == 0, result.output
+        assert ran == ['mms']
+
+        listing = app.test_cli_runner().invoke(args=['--help']).output
+        assert 'Says hello.' in listing
+
+def test_create_app_registers_the_commands():
+    app = mb_mms.create_app()
+    assert set(mb_mms.COMMANDS) <= set(app.cli.commands)
+    assert all(isinstance(app.cli.commands[name], LazyCommand) for name in mb_mms.COMMANDS)
+    # Every import name resolves to a click command
+    assert all(isinstance(app.cli.commands[name].load(), click.Command) for name in mb_mms.COMMANDS)
+
+def test_start_scheduler_retries(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(mb_mms.time, 'sleep', sleeps.append)
+    scheduler = MagicMock()
+    scheduler.start.side_effect = [OSError('db down'), OSError('db down'), OSError('db down'), None]
+
+    mb_mms.start_scheduler(scheduler, wait=1.0, max_wait=3.0)
+
+    assert scheduler.start.call_count == 4
+    assert sleeps == [1.0, 2.0, 3.0]
@@ -0,0 +1,101 @@
+import socketserver
+import threading
+import time
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    # Speaks just enough RESP2 for the shared cache backend
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, str):
+            self.wfile.write(b'+%s\r\n' % value.encode())
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            self.server.commands.append(args)
+            self.reply(self.server.dispatch(args))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f'redis://{host}:{port}/0'
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def dispatch(self, args):
+        name, args = args[0].decode().upper(), args[1:]
+        with self.lock:
+            if name == 'GET':
+                return self.data[args[0]] if self._alive(args[0]) else None
+            if name == 'SET':
+                key, value, options = args[0], args[1], [a.decode().upper() for a in args[2:]]
+                if 'NX' in options and self._alive(key):
+                    return None
+                self.data[key] = value
+                self.expires.pop(key, None)
+                if 'PX' in options:
+                    self.expires[key] = time.monotonic() + int(options[options.index('PX') + 1]) / 1000
+                return 'OK'
+            if name == 'DEL':
+                existed = self._alive(args[0])
+                self.data.pop(args[0], None)
+                return int(existed)
+            if name == 'INCR':
+                value = int(self.data[args[0]]) + 1 if self._alive(args[0]) else 1
+                self.data[args[0]] = str(value).encode()
+                return value
+            if name == 'EVAL':
+                # Only the lock release script: delete KEYS[1] if it holds ARGV[1]
+                key, token = args[2], args[3]
+                if self._alive(key) and self.data[key] == token:
+                    del self.data[key]
+                    self.expires.pop(key, None)
+                    return 1
+                return 0
+            if name in ('PING', 'SELECT'):
+                return 'OK'
+        raise ValueError(name)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,217 @@
+import threading
+import time
+import pytest
+
+from mb_mms.services.cache import backends
+from mb_mms.services.cache.backends import MemoryBackend, SharedBackend, decode_payload, encode_payload
+from mb_mms.services.cache.resp import RespClient
+from mb_mms.services.data.rows import Rows
+from tests.test_cache.fake_redis import FakeRedisServer
+
+ROWS = [{'timestamp': 1638316800 + idx * 86400, 'mms': 100.0 + idx} for idx in range(3)]
+
+
+@pytest.fixture
+def server():
+    server = FakeRedisServer().start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def shared(server):
+    client = RespClient.from_url(server.url)
+    yield SharedBackend(client=client, ttl=60, lock_ttl=1.0, poll_interval=0.01)
+    client.close()
+
+@pytest.fixture
+def reset_backend():
+    backends.reset_backend()
+    yield
+    backends.reset_backend()
+
+class Counter:
+    def __init__(self, value, delay=0.0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+def run_threads(target, count):
+    results = [None] * count
+
+    def worker(idx):
+        results[idx] = target()
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+@pytest.mark.parametrize('value', [ROWS, ROWS * 100, [], {'a': 1}, [1, 2]])
+def test_payload_round_trip(value):
+    assert decode_payload(encode_payload(value)) == value
+
+def test_payload_keeps_rows():
+    rows = Rows(('timestamp', 'mms'), [(1, 2.0), (2, None)])
+    decoded = decode_payload(encode_payload(rows))
+    assert isinstance(decoded, Rows) and decoded == rows
+
+def test_payload_is_columnar_and_compressed():
+    small = encode_payload(ROWS)
+    assert small.startswith(b'j') and small.count(b'timestamp') == 1
+    assert encode_payload(ROWS * 100).startswith(b'z')
+
+def test_cache_backend_is_abstract():
+    with pytest.raises(TypeError):
+        backends.CacheBackend()
+
+def test_memory_backend_single_flight():
+    backend = MemoryBackend(maxsize=8, ttl=60)
+    compute = Counter(ROWS, delay=0.05)
+
+    results = run_threads(lambda: backend.get_or_compute(('BRLBTC', 20, 0, 1), compute), 8)
+
+    assert compute.calls == 1
+    assert all(result == ROWS for result in results)
+
+def test_memory_backend_invalidate_pair():
+    backend = MemoryBackend(maxsize=8, ttl=60)
+    compute = Counter(ROWS)
+    backend.get_or_compute(('BRLBTC', 20, 0, 1), compute)
+    backend.invalidate_pair('BRLBTC')
+    backend.get_or_compute(('BRLBTC', 20, 0, 1), compute)
+    assert compute.calls == 2
+
+def test_memory_backend_skips_values_invalidated_during_compute():
+    backend = MemoryBackend(maxsize=10, ttl=60)
+
+    def compute():
+        backend.invalidate_pair('BRLBTC')
+        return ROWS
+
+    assert backend.get_or_compute(('BRLBTC', 20, 0, 1), compute) == ROWS
+    assert backend.lookup(('BRLBTC', 20, 0, 1)) is backends.MISSING
+
+def test_memory_backend_generation():
+    backend = MemoryBackend(maxsize=10, ttl=3600)
+    before = backend.generation('BRLBTC')
+    backend.invalidate_pair('BRLBTC')
+
+    assert backend.generation('BRLBTC') != before
+    assert backend.generation('BRLETH') != backend.generation('BRLBTC')
+
+def test_memory_backend_does_not_cache_errors():
+    backend = MemoryBackend(maxsize=8, ttl=60)
+
+    def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        backend.get_or_compute(('BRLBTC', 10, 0, 1), fail)
+    assert backend.get_or_compute(('BRLBTC', 10, 0, 1), lambda: ROWS) == ROWS
+
+def test_shared_backend_hit(shared):
+    compute = Counter(ROWS)
+    assert shared.get_or_compute(('BRLBTC', 20, 0, 1), compute) == ROWS
+    assert shared.get_or_compute(('BRLBTC', 20, 0, 1), compute) == ROWS
+    assert compute.calls == 1
+    assert shared.stats()['hits'] == 1
+
+def test_shared_backend_is_shared_across_workers(server, shared):
+    other = SharedBackend(client=RespClient.from_url(server.url), ttl=60)
+    compute = Counter(ROWS)
+    shared.get_or_compute(('BRLBTC', 20, 0, 1), compute)
+    assert other.get_or_compute(('BRLBTC', 20, 0, 1), compute) == ROWS
+    assert compute.calls == 1
+
+    # One worker writes new rows, every worker misses afterwards
+    other.invalidate_pair('BRLBTC')
+    shared.get_or_compute(('BRLBTC', 20, 0, 1), compute)
+    assert compute.calls == 2
+    other.client.close()
+
+def test_shared_backend_single_flight(shared):
+    compute = Counter(ROWS, delay=0.1)
+    results = run_threads(lambda: shared.get_or_compute(('BRLBTC', 50, 0, 1), compute), 6)
+
+    assert compute.calls == 1
+    assert all(result == ROWS for result in results)
+    assert shared.stats()['waits'] + shared.stats()['hits'] == 5
+
+def test_shared_backend_failed_leader_hands_over(shared):
+    state = {'calls': 0}
+
+    def flaky():
+        state['calls'] += 1
+        if state['calls'] == 1:
+            time.sleep(0.05)
+            raise RuntimeError('db down')
+        return ROWS
+
+    results = []
+
+    def call():
+        try:
+            results.append(shared.get_or_compute(('BRLBTC', 200, 0, 1), flaky))
+        except RuntimeError:
+            results.append('error')
+
+    run_threads(call, 2)
+    assert sorted(map(str, results)) == sorted(map(str, ['error', ROWS]))
+    assert shared.stats()['lock_timeouts'] == 0
+
+def test_shared_backend_expired_leader_keeps_new_lock(server):
+    client = RespClient.from_url(server.url)
+    backend = SharedBackend(client=client, ttl=60, lock_ttl=0.05, poll_interval=0.01)
+    lock_key = backend._key(('BRLBTC', 20, 0, 1)) + ':lock'
+
+    def slow():
+        # The lock expires meanwhile and another worker takes it
+        time.sleep(0.1)
+        assert client.set(lock_key, b'other', nx=True)
+        return ROWS
+
+    assert backend.get_or_compute(('BRLBTC', 20, 0, 1), slow) == ROWS
+    assert client.get(lock_key) == b'other'
+    client.close()
+
+def test_shared_backend_generation(server, shared):
+    other = SharedBackend(client=RespClient.from_url(server.url), ttl=60)
+    assert shared.generation('BRLBTC') == other.generation('BRLBTC') == '0'
+
+    other.invalidate_pair('BRLBTC')
+    assert shared.generation('BRLBTC') == '1'
+    assert shared.generation('BRLETH') == '0'
+    other.client.close()
+
+def test_shared_backend_server_down():
+    backend = SharedBackend(client=RespClient(host='127.0.0.1', port=1, timeout=0.1), ttl=60)
+    assert backend.get_or_compute(('BRLBTC', 20, 0, 1), lambda: ROWS) == ROWS
+    backend.invalidate_pair('BRLBTC')
+    assert backend.generation('BRLBTC') is None
+    assert backend.stats()['errors'] == 3
+
+def test_create_backend(reset_backend, monkeypatch, server):
+    monkeypatch.setenv('MMS_CACHE_BACKEND', 'memory')
+    monkeypatch.setenv('MMS_CACHE_SIZE', '3')
+    backend = backends.get_backend()
+    assert isinstance(backend, MemoryBackend)
+    assert backend.cache.maxsize == 3
+    assert backends.get_backend() is backend
+
+    backends.reset_backend()
+    monkeypatch.setenv('MMS_CACHE_BACKEND', 'shared')
+    monkeypatch.setenv('MMS_CACHE_URL', server.url)
+    assert isinstance(backends.get_backend(), SharedBackend)
+
+    monkeypatch.setenv('MMS_CACHE_BACKEND', 'nope')
+    with pytest.raises(ValueError):
+        backends.create_backend()
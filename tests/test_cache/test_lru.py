@@ -0,0 +1,70 @@
+import pytest
+
+from mb_mms.services.cache.lru import MISSING, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_get_missing(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    assert cache.get('a') is MISSING
+    assert cache.stats()['misses'] == 1
+
+def test_set_and_hit(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set('a', [1])
+    assert cache.get('a') == [1]
+    assert cache.stats()['hits'] == 1
+
+def test_lru_eviction(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')  # 'b' becomes the least recently used entry
+    cache.set('c', 3)
+
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_ttl_expiration(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set('a', 1)
+    clock.now = 9.9
+    assert cache.get('a') == 1
+    clock.now = 10
+    assert cache.get('a') is MISSING
+    assert cache.stats()['expirations'] == 1
+    assert len(cache) == 0
+
+def test_disabled_cache(clock):
+    cache = TTLCache(maxsize=0, ttl=10, clock=clock)
+    cache.set('a', 1)
+    assert cache.get('a') is MISSING
+
+def test_peek_does_not_count(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set('a', 1)
+    assert cache.peek('a') == 1
+    assert cache.peek('b') is MISSING
+    assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+
+def test_invalidate(clock):
+    cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+    cache.set(('BRLBTC', 20), [])
+    cache.set(('BRLBTC', 50), [])
+    cache.set(('BRLETH', 20), [])
+
+    assert cache.invalidate(lambda key: key[0] == 'BRLBTC') == 2
+    assert cache.get(('BRLETH', 20)) == []
+    assert cache.stats()['invalidations'] == 2
@@ -0,0 +1,97 @@
+from array import array
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from mb_mms.services.cache import backends, series
+from mb_mms.services.cache.series import SeriesCache
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    series.reset_series_cache()
+    backends.reset_backend()
+    yield
+    series.reset_series_cache()
+    backends.reset_backend()
+
+
+def loader(days=10):
+    return MagicMock(return_value=(array('q', range(100, 100 + days)), array('d', [float(i) for i in range(days)])))
+
+
+def test_window_slices_range():
+    cache = SeriesCache(maxsize=4, ttl=60)
+    load = loader()
+
+    assert cache.window('BRLBTC', 3, 101, 104, load) == [
+        {'timestamp': 101, 'mms': None},
+        {'timestamp': 102, 'mms': 1.0},
+        {'timestamp': 103, 'mms': 2.0},
+        {'timestamp': 104, 'mms': 3.0},
+    ]
+    assert cache.window('BRLBTC', 1, 0, 100, load) == [{'timestamp': 100, 'mms': 0.0}]
+    assert cache.window('BRLBTC', 3, 200, 300, load) == []
+    load.assert_called_once_with()
+
+
+def test_windows_are_memoized_per_pair():
+    cache = SeriesCache(maxsize=4, ttl=60)
+    load = loader()
+
+    with patch('mb_mms.services.cache.series.indicators.create', wraps=series.indicators.create) as create:
+        cache.window('BRLBTC', 4, 100, 109, load)
+        cache.window('BRLBTC', 4, 105, 106, load)
+        cache.window('BRLBTC', 9, 105, 106, load)
+        cache.window('BRLBTC', 9, 105, 106, load, indicator='ema')
+        # one validation per call, one computation per new (indicator, window)
+        assert create.call_count == 4 + 3
+
+    assert sorted(cache.series('BRLBTC', load).means) == [('ema', 9), ('sma', 4), ('sma', 9)]
+    assert cache.stats()['loads'] == 1
+
+
+def test_memoized_windows_are_bounded():
+    cache = SeriesCache(maxsize=4, ttl=60, max_windows=2)
+    load = loader()
+
+    for window in (2, 3, 2, 4):
+        cache.window('BRLBTC', window, 100, 109, load)
+    means = cache.series('BRLBTC', load).means
+
+    # Least recently used first; window 3 was evicted
+    assert list(means) == [('sma', 2), ('sma', 4)]
+    assert all(isinstance(values, array) and values.typecode == 'd' for values in means.values())
+    assert cache.window('BRLBTC', 3, 100, 102, load) == [
+        {'timestamp': 100, 'mms': None}, {'timestamp': 101, 'mms': None}, {'timestamp': 102, 'mms': 1.0},
+    ]
+
+
+def test_invalid_window():
+    with pytest.raises(ValueError):
+        SeriesCache(maxsize=4, ttl=60).window('BRLBTC', 0, 100, 109, loader())
+    with pytest.raises(ValueError):
+        SeriesCache(maxsize=4, ttl=60).window('BRLBTC', 3, 100, 109, loader(), indicator='rsi')
+
+
+def test_ttl_and_invalidation():
+    now = [0.0]
+    cache = SeriesCache(maxsize=4, ttl=10, clock=lambda: now[0])
+    load = loader()
+
+    cache.window('BRLBTC', 2, 100, 109, load)
+    now[0] = 11
+    cache.window('BRLBTC', 2, 100, 109, load)
+    cache.invalidate('BRLBTC')
+    cache.window('BRLBTC', 2, 100, 109, load)
+    assert load.call_count == 3
+
+
+def test_invalidate_pair_drops_process_series():
+    load = loader()
+    series.get_series_cache().window('BRLBTC', 2, 100, 109, load)
+
+    backends.invalidate_pair('BRLBTC')
+
+    series.get_series_cache().window('BRLBTC', 2, 100, 109, load)
+    assert load.call_count == 2
@@ -0,0 +1,51 @@
+import pytest
+
+from mb_mms.models.pair_averages import Base
+from mb_mms.services.cache import backends, series
+from mb_mms.services.data import closes, db
+from mb_mms.services.mb_api import backfill
+from mb_mms.services.mb_api.mb_api import MB_API
+
+DAY = 86400
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    backends.reset_backend()
+    series.reset_series_cache()
+    engine = db.get_db_engine()
+    Base.metadata.create_all(engine)
+    yield engine
+    db.dispose_db_engine()
+    backends.reset_backend()
+    series.reset_series_cache()
+
+
+def test_upsert_and_load_closes(sqlite_db):
+    with sqlite_db.begin() as conn:
+        assert closes.upsert_closes(conn, 'BRLBTC', [(2.0, 20), (1.0, 10)], batch_size=1) == 2
+        closes.upsert_closes(conn, 'BRLBTC', [(3.0, 20)])
+        closes.upsert_closes(conn, 'BRLETH', [(9.0, 10)])
+
+    with sqlite_db.connect() as conn:
+        timestamps, values = closes.load_closes(conn, 'BRLBTC')
+    assert list(timestamps) == [10, 20]
+    assert list(values) == [1.0, 3.0]
+
+
+def test_query_window_matches_stored_columns(sqlite_db):
+    rates = [(float(i % 17) + i / 10, 1_000_000 + i * DAY) for i in range(300)]
+    backfill.backfill_pair(fetch=lambda start, end: [r for r in rates if start <= r[1] <= end],
+                           pair='BRLBTC', start=rates[0][1], end=rates[-1][1], chunk_days=45)
+
+    mb = MB_API()
+    start, end = rates[150][1], rates[299][1]
+    stored = mb.search_mms('BRLBTC', start, end, 50)
+    computed = mb.query_window('BRLBTC', start, end, 50)
+    assert [row['timestamp'] for row in computed] == [row['timestamp'] for row in stored]
+    assert [row['mms'] for row in computed] == pytest.approx([row['mms'] for row in stored])
+
+    nine = mb.search_mms('BRLBTC', start, end, 9)
+    assert nine[0]['mms'] == pytest.approx(sum(rate for rate, _ in rates[142:151]) / 9)
@@ -0,0 +1,106 @@
+import pytest
+
+from mb_mms.models.pair_averages import Base
+from mb_mms.services.cache import backends, series
+from mb_mms.services.data import closes, db
+from mb_mms.services.data import indicators as indicator_store
+from mb_mms.services.mb_api import backfill, indicators
+from mb_mms.services.mb_api.mb_api import MB_API
+
+DAY = 86400
+SPECS = [('ema', 5), ('wma', 3)]
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    monkeypatch.setenv('MMS_INDICATORS', 'ema:5,wma:3')
+    db.dispose_db_engine()
+    backends.reset_backend()
+    series.reset_series_cache()
+    engine = db.get_db_engine()
+    Base.metadata.create_all(engine)
+    yield engine
+    db.dispose_db_engine()
+    backends.reset_backend()
+    series.reset_series_cache()
+
+
+@pytest.fixture
+def rates():
+    return [(100.0 + (i * 7) % 13, 1_000_000 + i * DAY) for i in range(40)]
+
+
+def stored_values(engine, pair, name, period):
+    with engine.connect() as conn:
+        return indicator_store.query_values(conn, pair, name, period, 0, 2 ** 40)
+
+
+def test_advance_matches_batch(sqlite_db, rates):
+    with sqlite_db.begin() as conn:
+        indicator_store.write_series(conn, 'BRLBTC', [r for r, _ in rates[:25]], [t for _, t in rates[:25]])
+    for day in range(25, 40):
+        with sqlite_db.begin() as conn:
+            # Overlapping candles are skipped, only the new one is folded in
+            assert indicator_store.advance(conn, 'BRLBTC', rates[day - 2:day + 1]) == len(SPECS)
+
+    for name, period in SPECS:
+        expected = indicators.create(name, period).compute([r for r, _ in rates])
+        values = stored_values(sqlite_db, 'BRLBTC', name, period)
+        assert [row['timestamp'] for row in values] == [t for _, t in rates]
+        assert [row['mms'] for row in values] == pytest.approx(expected, nan_ok=True)
+
+
+def test_advance_bootstraps_from_stored_closes(sqlite_db, rates):
+    with sqlite_db.begin() as conn:
+        closes.upsert_closes(conn, 'BRLBTC', rates)
+        assert indicator_store.advance(conn, 'BRLBTC', rates[-1:]) == 2 * len(rates)
+        assert indicator_store.advance(conn, 'BRLBTC', rates[-1:]) == 0
+
+        state, timestamp = indicator_store.load_state(conn, 'BRLBTC', 'ema', 5)
+    assert timestamp == rates[-1][1]
+    assert state.value == pytest.approx(stored_values(sqlite_db, 'BRLBTC', 'ema', 5)[-1]['mms'])
+
+
+def test_search_mms_indicator(sqlite_db, rates):
+    with sqlite_db.begin() as conn:
+        closes.upsert_closes(conn, 'BRLBTC', rates)
+        indicator_store.advance(conn, 'BRLBTC', rates)
+
+    mb = MB_API()
+    start, end = rates[10][1], rates[20][1]
+    stored = mb.search_mms('BRLBTC', start, end, 5, indicator='ema')
+    assert stored == stored_values(sqlite_db, 'BRLBTC', 'ema', 5)[10:21]
+
+    # Not in MMS_INDICATORS: computed on demand from the closes
+    on_demand = mb.search_mms('BRLBTC', start, end, 4, indicator='wma')
+    expected = indicators.WMA(4).compute([r for r, _ in rates])[10:21]
+    assert [row['mms'] for row in on_demand] == pytest.approx(expected)
+
+    for kwargs in ({'indicator': 'rsi'}, {'indicator': 'ema', 'resolution': '1w'}):
+        with pytest.raises(ValueError):
+            mb.search_mms('BRLBTC', start, end, 5, **kwargs)
+
+
+def test_configured_indicator_without_values_uses_closes(sqlite_db, rates):
+    with sqlite_db.begin() as conn:
+        closes.upsert_closes(conn, 'BRLBTC', rates)
+
+    res = MB_API().search_mms('BRLBTC', rates[10][1], rates[20][1], 5, indicator='ema')
+    expected = indicators.EMA(5).compute([r for r, _ in rates])[10:21]
+    assert [row['mms'] for row in res] == pytest.approx(expected)
+
+
+def test_backfill_writes_indicator_values(sqlite_db, rates):
+    def fetch(start, end):
+        return [rate for rate in rates if start <= rate[1] <= end]
+
+    # The later days first, then the earlier ones: every value after them changes
+    backfill.backfill_pair(fetch, 'BRLBTC', rates[25][1], rates[-1][1], chunk_days=4)
+    backfill.backfill_pair(fetch, 'BRLBTC', rates[0][1], rates[24][1], chunk_days=4)
+
+    for name, period in SPECS:
+        expected = indicators.create(name, period).compute([r for r, _ in rates])
+        values = stored_values(sqlite_db, 'BRLBTC', name, period)
+        assert [row['timestamp'] for row in values] == [t for _, t in rates]
+        assert [row['mms'] for row in values] == pytest.approx(expected, nan_ok=True)
@@ -0,0 +1,99 @@
+import pytest
+from sqlalchemy import event, select
+
+from mb_mms.models.pair_averages import Base, MovingAverage, Pair
+from mb_mms.services.data import db, pairs
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    pairs.reset_pair_ids()
+    engine = db.get_db_engine()
+    Base.metadata.create_all(engine)
+    yield engine
+    db.dispose_db_engine()
+    pairs.reset_pair_ids()
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_ensure_ids_creates_missing_pairs_once(sqlite_db):
+    with sqlite_db.begin() as conn:
+        first = pairs.ensure_ids(conn, ['BRLBTC', 'BRLETH', 'BRLBTC'])
+        again = pairs.ensure_ids(conn, ['BRLETH', 'BRLXRP'])
+
+    assert set(first) == {'BRLBTC', 'BRLETH'}
+    assert again == {'BRLETH': first['BRLETH'], 'BRLXRP': again['BRLXRP']}
+    assert len({*first.values(), *again.values()}) == 3
+    with sqlite_db.connect() as conn:
+        assert dict(conn.execute(select(Pair.name, Pair.id)).all()) == {**first, **again}
+
+
+def test_committed_ids_are_resolved_without_queries(sqlite_db):
+    with sqlite_db.begin() as conn:
+        ids = pairs.ensure_ids(conn, ['BRLBTC'])
+
+    statements = count_statements(sqlite_db)
+    with sqlite_db.connect() as conn:
+        assert pairs.get_id(conn, 'BRLBTC') == ids['BRLBTC']
+        assert pairs.get_ids(conn, ['BRLBTC', 'BRLLTC']) == ids
+        assert pairs.get_id(conn, 'BRLLTC') is None
+    # Unknown pairs are looked up every time, since another process may create them
+    assert len(statements) == 2
+
+
+def test_ids_created_by_other_processes_are_cached_on_read(sqlite_db):
+    with sqlite_db.begin() as conn:
+        conn.execute(Pair.__table__.insert(), [{'name': 'BRLBTC'}])
+
+    with sqlite_db.connect() as conn:
+        pair_id = pairs.get_id(conn, 'BRLBTC')
+    assert pairs.cached_ids(sqlite_db, ['BRLBTC']) == {'BRLBTC': pair_id}
+
+
+def test_rolled_back_ids_are_not_cached(sqlite_db):
+    with pytest.raises(RuntimeError):
+        with sqlite_db.begin() as conn:
+            pairs.ensure_ids(conn, ['BRLBTC'])
+            raise RuntimeError
+    assert pairs.cached_ids(sqlite_db, ['BRLBTC']) == {}
+
+    with sqlite_db.begin() as conn:
+        conn.execute(Pair.__table__.insert(), [{'name': 'BRLETH'}])
+        ids = pairs.ensure_ids(conn, ['BRLBTC'])
+    assert pairs.cached_ids(sqlite_db, ['BRLBTC', 'BRLETH']) == ids
+    with sqlite_db.connect() as conn:
+        assert conn.execute(select(Pair.id).where(Pair.name == 'BRLBTC')).scalar() == ids['BRLBTC']
+
+
+def test_upsert_moving_averages_maps_names_to_ids(sqlite_db):
+    rows = [{'pair': pair, 'timestamp': ts, 'mms_20': ts, 'mms_50': None, 'mms_200': None}
+            for pair in ('BRLBTC', 'BRLETH') for ts in (1, 2)]
+    with sqlite_db.begin() as conn:
+        db.upsert_moving_averages(conn, rows)
+
+    with sqlite_db.connect() as conn:
+        stored = conn.execute(
+            select(Pair.name, MovingAverage.timestamp).join(MovingAverage).order_by(Pair.name, MovingAverage.timestamp)
+        ).all()
+    assert [tuple(row) for row in stored] == [('BRLBTC', 1), ('BRLBTC', 2), ('BRLETH', 1), ('BRLETH', 2)]
+
+
+def test_cache_is_per_engine(sqlite_db, tmp_path):
+    from sqlalchemy import create_engine
+
+    with sqlite_db.begin() as conn:
+        conn.execute(Pair.__table__.insert(), [{'name': 'BRLETH'}])
+        pairs.ensure_ids(conn, ['BRLBTC'])
+
+    other = create_engine(f'sqlite:///{tmp_path}/other.db')
+    Base.metadata.create_all(other)
+    with other.begin() as conn:
+        assert pairs.ensure_ids(conn, ['BRLBTC']) == {'BRLBTC': 1}
+    other.dispose()
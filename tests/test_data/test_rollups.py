@@ -0,0 +1,116 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import select
+
+from mb_mms.models.pair_averages import Base
+from mb_mms.models.rollups import MovingAverageRollup
+from mb_mms.services.cache import backends
+from mb_mms.services.data import db, rollups
+from mb_mms.services.mb_api.mb_api import MB_API
+
+DAY = 86400
+
+
+def utc(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    backends.reset_backend()
+    engine = db.get_db_engine()
+    Base.metadata.create_all(engine)
+    yield engine
+    db.dispose_db_engine()
+    backends.reset_backend()
+
+
+def daily_rows(pair, first, days):
+    return [
+        {'pair': pair, 'timestamp': first + i * DAY, 'mms_20': float(i), 'mms_50': float(2 * i), 'mms_200': None}
+        for i in range(days)
+    ]
+
+
+def stored(engine, resolution):
+    table = MovingAverageRollup.__table__
+    stmt = select(table).where(table.c.resolution == resolution).order_by(table.c.bucket)
+    with engine.connect() as conn:
+        return [row._asdict() for row in conn.execute(stmt).all()]
+
+
+def test_bucket_start_and_end():
+    # 2024-02-29 is a Thursday
+    ts = utc(2024, 2, 29, 15, 30)
+    assert rollups.bucket_start(ts, rollups.WEEKLY) == utc(2024, 2, 26)
+    assert rollups.bucket_end(ts, rollups.WEEKLY) == utc(2024, 3, 4)
+    assert rollups.bucket_start(ts, rollups.MONTHLY) == utc(2024, 2, 1)
+    assert rollups.bucket_end(ts, rollups.MONTHLY) == utc(2024, 3, 1)
+    assert rollups.bucket_end(utc(2024, 12, 31), rollups.MONTHLY) == utc(2025, 1, 1)
+
+    with pytest.raises(ValueError):
+        rollups.bucket_start(ts, '1y')
+
+
+def test_refresh_rollups(sqlite_db):
+    # Monday 2024-01-29 to Sunday 2024-02-11: two weeks across two months
+    rows = daily_rows('BRLBTC', utc(2024, 1, 29), 14)
+    with sqlite_db.begin() as conn:
+        db.upsert_moving_averages(conn, rows)
+        assert rollups.refresh_for_rows(conn, rows) == 4
+
+    weekly = stored(sqlite_db, rollups.WEEKLY)
+    assert [row['bucket'] for row in weekly] == [utc(2024, 1, 29), utc(2024, 2, 5)]
+    assert weekly[0]['count'] == 7
+    assert weekly[0]['last_timestamp'] == utc(2024, 2, 4)
+    assert (weekly[0]['mms_20_last'], weekly[0]['mms_20_min'], weekly[0]['mms_20_max']) == (6.0, 0.0, 6.0)
+    assert weekly[0]['mms_20_mean'] == 3.0
+    assert weekly[1]['mms_50_mean'] == 20.0
+    assert weekly[1]['mms_200_last'] is None and weekly[1]['mms_200_mean'] is None
+
+    monthly = stored(sqlite_db, rollups.MONTHLY)
+    assert [(row['bucket'], row['count']) for row in monthly] == [(utc(2024, 1, 1), 3), (utc(2024, 2, 1), 11)]
+    assert monthly[1]['mms_20_mean'] == 8.0
+
+
+def test_refresh_rollups_is_idempotent_and_incremental(sqlite_db):
+    rows = daily_rows('BRLBTC', utc(2024, 1, 29), 10)
+    with sqlite_db.begin() as conn:
+        db.upsert_moving_averages(conn, rows[:9])
+        rollups.refresh_for_rows(conn, rows[:9])
+        rollups.refresh_for_rows(conn, rows[:9])
+    with sqlite_db.begin() as conn:
+        db.upsert_moving_averages(conn, rows[9:])
+        rollups.refresh_for_rows(conn, rows[9:])
+    incremental = stored(sqlite_db, rollups.WEEKLY) + stored(sqlite_db, rollups.MONTHLY)
+
+    with sqlite_db.begin() as conn:
+        conn.execute(MovingAverageRollup.__table__.delete())
+        assert rollups.rebuild_rollups(conn, 'BRLBTC') == 4
+        assert rollups.rebuild_rollups(conn, 'BRLETH') == 0
+
+    assert stored(sqlite_db, rollups.WEEKLY) + stored(sqlite_db, rollups.MONTHLY) == incremental
+
+
+def test_search_mms_resolution(sqlite_db):
+    rows = daily_rows('BRLBTC', utc(2024, 1, 29), 14)
+    with sqlite_db.begin() as conn:
+        db.upsert_moving_averages(conn, rows)
+        rollups.refresh_for_rows(conn, rows)
+
+    mb = MB_API()
+    weekly = mb.search_mms('BRLBTC', utc(2024, 2, 1), utc(2024, 2, 11), 20, resolution='1w')
+    assert weekly == [
+        {'timestamp': utc(2024, 1, 29), 'mms': 6.0, 'min': 0.0, 'max': 6.0, 'mean': 3.0},
+        {'timestamp': utc(2024, 2, 5), 'mms': 13.0, 'min': 7.0, 'max': 13.0, 'mean': 10.0},
+    ]
+    monthly = mb.search_mms('BRLBTC', utc(2024, 2, 1), utc(2024, 2, 11), 50, resolution='1M')
+    assert [row['timestamp'] for row in monthly] == [utc(2024, 2, 1)]
+    assert len(mb.search_mms('BRLBTC', utc(2024, 2, 1), utc(2024, 2, 11), 20)) == 11
+
+    for precision, resolution in ((20, '1y'), (10, '1w')):
+        with pytest.raises(ValueError):
+            mb.search_mms('BRLBTC', utc(2024, 2, 1), utc(2024, 2, 11), precision, resolution=resolution)
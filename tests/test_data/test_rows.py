@@ -0,0 +1,13 @@
+from mb_mms.services.data.rows import Rows
+
+def test_rows_behave_as_a_list_of_dicts():
+    rows = Rows(['timestamp', 'mms'], [(1, 2.0), (2, None)])
+
+    assert len(rows) == 2
+    assert rows[0] == {'timestamp': 1, 'mms': 2.0}
+    assert rows[-1] == {'timestamp': 2, 'mms': None}
+    assert list(rows) == [{'timestamp': 1, 'mms': 2.0}, {'timestamp': 2, 'mms': None}]
+    assert rows[1:] == Rows(('timestamp', 'mms'), [[2, None]])
+    assert rows == [{'timestamp': 1, 'mms': 2.0}, {'timestamp': 2, 'mms': None}]
+    assert rows != [{'timestamp': 1, 'mms': 2.0}]
+    assert Rows(('timestamp',), []) == []
@@ -0,0 +1,112 @@
+import pytest
+from sqlalchemy import select
+
+from mb_mms.models.pair_averages import Base, MovingAverage, Pair
+from mb_mms.services.cache import backends
+from mb_mms.services.data import db
+from mb_mms.services.job import incremental
+from mb_mms.services.job.incremental import DAY, RollingWindows
+from mb_mms.services.mb_api.mb_api import MB_API
+
+ORIGIN = 1577836800  # 2020-01-01
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    backends.reset_backend()
+    Base.metadata.create_all(db.get_db_engine())
+    yield db.get_db_engine()
+    db.dispose_db_engine()
+
+class FakeUpstream:
+    def __init__(self, last_day):
+        self.last_day = last_day
+        self.calls = []
+
+    def __call__(self, start, end):
+        self.calls.append((start, end))
+        end = min(end, ORIGIN + self.last_day * DAY)
+        first = ORIGIN + max(0, -(-(start - ORIGIN) // DAY)) * DAY
+        return [(1000.0 + ((ts - ORIGIN) // DAY) % 23, ts) for ts in range(first, end + 1, DAY)]
+
+def day(n):
+    return ORIGIN + n * DAY
+
+def stored(engine):
+    with engine.connect() as conn:
+        stmt = select(MovingAverage.timestamp, MovingAverage.mms_20, MovingAverage.mms_50, MovingAverage.mms_200) \
+            .join(Pair).where(Pair.name == 'BRLBTC').order_by(MovingAverage.timestamp)
+        return {row.timestamp: tuple(row)[1:] for row in conn.execute(stmt)}
+
+def expected(upstream, timestamp):
+    rates = [rate for rate in upstream(ORIGIN, timestamp)]
+    mb = MB_API()
+    return tuple(mb.mms(rates[-window:])[0] for window in (20, 50, 200))
+
+def test_rolling_windows_pack_round_trip():
+    state = RollingWindows(closes=[float(i) for i in range(250)], timestamp=7)
+    restored = RollingWindows.unpack(state.pack(), 7)
+
+    assert len(state.pack()) == 200 * 8
+    assert restored.closes() == [float(i) for i in range(50, 250)]
+    assert restored.push(1.0, 8) == state.push(1.0, 8)
+
+def test_update_pair_bootstraps_new_pair(sqlite_db):
+    upstream = FakeUpstream(last_day=400)
+
+    assert incremental.update_pair(upstream, 'BRLBTC', day(400)) == 1
+    assert stored(sqlite_db)[day(400)] == pytest.approx(expected(upstream, day(400)))
+
+def test_update_pair_fetches_only_new_days(sqlite_db):
+    upstream = FakeUpstream(last_day=400)
+    incremental.update_pair(upstream, 'BRLBTC', day(400))
+
+    upstream.last_day = 401
+    upstream.calls.clear()
+    assert incremental.update_pair(upstream, 'BRLBTC', day(401)) == 1
+    assert upstream.calls == [(day(400) + 1, day(401))]
+    assert stored(sqlite_db)[day(401)] == pytest.approx(expected(upstream, day(401)))
+
+def test_update_pair_backfills_gaps(sqlite_db):
+    upstream = FakeUpstream(last_day=400)
+    incremental.update_pair(upstream, 'BRLBTC', day(400))
+
+    # The job did not run for five days
+    upstream.last_day = 405
+    assert incremental.update_pair(upstream, 'BRLBTC', day(405)) == 5
+
+    rows = stored(sqlite_db)
+    for n in range(401, 406):
+        assert rows[day(n)] == pytest.approx(expected(upstream, day(n)))
+
+def test_update_pair_rebuilds_state_from_stored_rows(sqlite_db):
+    upstream = FakeUpstream(last_day=400)
+    incremental.update_pair(upstream, 'BRLBTC', day(400))
+    with sqlite_db.begin() as conn:
+        conn.execute(incremental.RollingState.__table__.delete())
+
+    upstream.last_day = 402
+    assert incremental.update_pair(upstream, 'BRLBTC', day(402)) == 2
+    assert stored(sqlite_db)[day(402)] == pytest.approx(expected(upstream, day(402)))
+
+def test_update_pair_up_to_date(sqlite_db):
+    upstream = FakeUpstream(last_day=400)
+    incremental.update_pair(upstream, 'BRLBTC', day(400))
+    assert incremental.update_pair(upstream, 'BRLBTC', day(400)) == 0
+
+def test_update_pair_missed_registers(sqlite_db):
+    upstream = FakeUpstream(last_day=400)
+    incremental.update_pair(upstream, 'BRLBTC', day(400))
+
+    with pytest.raises(Exception, match='missed registers'):
+        incremental.update_pair(upstream, 'BRLBTC', day(403))
+
+def test_update_pair_missing_last_day_is_retried(sqlite_db):
+    upstream = FakeUpstream(last_day=400)
+    incremental.update_pair(upstream, 'BRLBTC', day(400))
+
+    # The nightly run for day 401 before upstream published it
+    with pytest.raises(Exception, match='missed registers'):
+        incremental.update_pair(upstream, 'BRLBTC', day(401))
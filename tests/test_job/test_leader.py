@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from mb_mms.models.leases import Lease
+from mb_mms.models.pair_averages import Base
+from mb_mms.services.data import db
+from mb_mms.services.job import commands
+from mb_mms.services.job.leader import JobRunner, LeaderLock
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    Base.metadata.create_all(db.get_db_engine())
+    yield db.get_db_engine()
+    db.dispose_db_engine()
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeScheduler:
+    def __init__(self):
+        self.calls = []
+
+    def start(self, paused=False):
+        self.calls.append(('start', paused))
+
+    def pause(self):
+        self.calls.append('pause')
+
+    def resume(self):
+        self.calls.append('resume')
+
+    def shutdown(self):
+        self.calls.append('shutdown')
+
+def test_only_one_owner_holds_the_lease(sqlite_db):
+    clock = Clock()
+    first = LeaderLock(owner='a', ttl=60, clock=clock)
+    second = LeaderLock(owner='b', ttl=60, clock=clock)
+
+    assert first.acquire()
+    assert not second.acquire()
+    clock.now += 30
+    assert first.acquire()
+    clock.now += 59
+    assert not second.acquire()
+
+def test_expired_lease_is_taken_over(sqlite_db):
+    clock = Clock()
+    first = LeaderLock(owner='a', ttl=60, clock=clock)
+    second = LeaderLock(owner='b', ttl=60, clock=clock)
+
+    assert first.acquire()
+    clock.now += 61
+    assert second.acquire()
+    assert not first.acquire()
+
+def test_release_frees_the_lease(sqlite_db):
+    first = LeaderLock(owner='a', ttl=60, clock=Clock())
+    second = LeaderLock(owner='b', ttl=60, clock=Clock())
+
+    assert first.acquire()
+    second.release()
+    assert not second.acquire()
+
+    first.release()
+    assert second.acquire()
+
+def test_runner_pauses_when_the_lease_is_lost(sqlite_db):
+    clock = Clock()
+    scheduler = FakeScheduler()
+    runner = JobRunner(scheduler, LeaderLock(owner='a', ttl=60, clock=clock), interval=20)
+
+    assert runner.step()
+    assert runner.step()
+    assert scheduler.calls == ['resume']
+
+    clock.now += 61
+    assert LeaderLock(owner='b', ttl=60, clock=clock).acquire()
+    assert not runner.step()
+    assert scheduler.calls == ['resume', 'pause']
+
+def test_runner_treats_lock_errors_as_lost_lease(sqlite_db):
+    scheduler = FakeScheduler()
+    lock = LeaderLock(owner='a', ttl=60, clock=Clock())
+    runner = JobRunner(scheduler, lock, interval=20)
+    assert runner.step()
+
+    with sqlite_db.begin() as conn:
+        Lease.__table__.drop(conn)
+    assert not runner.step()
+    assert scheduler.calls == ['resume', 'pause']
+
+def test_runner_releases_the_lease_on_stop(sqlite_db):
+    scheduler = FakeScheduler()
+    runner = JobRunner(scheduler, LeaderLock(owner='a', ttl=60, clock=Clock()), interval=20)
+    stop = threading.Event()
+    scheduler.resume = lambda: (scheduler.calls.append('resume'), stop.set())
+
+    runner.run(stop)
+
+    assert scheduler.calls == [('start', True), 'resume', 'shutdown']
+    assert LeaderLock(owner='b', ttl=60, clock=Clock()).acquire()
+
+def test_run_jobs_command(sqlite_db, mocker):
+    run = mocker.patch.object(JobRunner, 'run')
+    scheduler = mocker.patch('mb_mms.services.job.scheduler.Scheduler')
+    app = Flask(__name__)
+    app.cli.add_command(commands.run_jobs)
+
+    result = app.test_cli_runner().invoke(args=['run-jobs', '--lease-ttl', '30'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Job runner stopped.' in result.output
+    scheduler.assert_called_once_with(app, leading=mocker.ANY)
+    run.assert_called_once()
+
+def test_create_app_leaves_the_scheduler_to_the_job_runner(monkeypatch, mocker):
+    from mb_mms import create_app
+
+    scheduler = mocker.patch('mb_mms.services.job.scheduler.Scheduler')
+    monkeypatch.delenv('SCHEDULER_ENABLED', raising=False)
+    app = create_app()
+    scheduler.assert_not_called()
+    assert 'run-jobs' in app.cli.commands
+
+    # The scheduler starts in the background, since its job store needs the database
+    thread = mocker.patch('mb_mms.threading.Thread')
+    monkeypatch.setenv('SCHEDULER_ENABLED', 'true')
+    create_app()
+    assert thread.call_args.kwargs['args'] == (scheduler.return_value.scheduler,)
+    thread.return_value.start.assert_called_once_with()
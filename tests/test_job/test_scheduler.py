@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import func, select
+
+from mb_mms.models.pair_averages import Base, MovingAverage, Pair
+from mb_mms.services.cache import backends
+from mb_mms.services.data import db
+from mb_mms.services.job.incremental import DAY
+from mb_mms.services.job.scheduler import Scheduler
+from mb_mms.services.metrics import instruments
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    monkeypatch.setenv('PAIRS', 'BRLBTC,BRLETH,BRLXRP')
+    monkeypatch.setenv('SCHEDULER_RETRY_WAIT', '0')
+    db.dispose_db_engine()
+    backends.reset_backend()
+    Base.metadata.create_all(db.get_db_engine())
+    yield db.get_db_engine()
+    db.dispose_db_engine()
+
+@pytest.fixture
+def scheduler(mocker):
+    def build(**kwargs):
+        mocker.patch.object(Scheduler.scheduler, 'init_app')
+        mocker.patch.object(Scheduler.scheduler, 'add_job')
+        mocker.patch.object(Scheduler.scheduler, '_scheduler')
+        return Scheduler(Flask(__name__), **kwargs)
+    return build
+
+class FlakyUpstream:
+    """
+    Serves 200 daily candles ending at `end`, failing the first `failures[pair]` calls of a pair.
+    """
+
+    def __init__(self, failures):
+        self.failures = dict(failures)
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, pair, start, end):
+        with self.lock:
+            self.calls[pair] = self.calls.get(pair, 0) + 1
+            if self.failures.get(pair, 0) > 0:
+                self.failures[pair] -= 1
+                raise ConnectionError(f'{pair} unavailable')
+        return [(100.0 + idx, end - (199 - idx) * DAY) for idx in range(200)]
+
+def count_rows(engine, pair):
+    with engine.connect() as conn:
+        stmt = select(func.count()).select_from(MovingAverage).join(Pair).where(Pair.name == pair)
+        return conn.execute(stmt).scalar()
+
+@pytest.mark.parametrize('incremental', [True, False])
+def test_failing_pair_is_retried_alone(sqlite_db, scheduler, mocker, incremental):
+    upstream = FlakyUpstream({'BRLETH': 2})
+    mocker.patch('mb_mms.services.job.scheduler.MB_API.fetch_rate',
+                 side_effect=lambda pair, start, end: upstream(pair, start, end))
+    s = scheduler(max_retries=3, incremental=incremental)
+    retries = instruments.JOB_RETRIES.value()
+
+    report = s.compute_mms(workers=3)
+
+    assert instruments.JOB_RETRIES.value() == retries + 2
+
+    assert sorted(report['completed']) == ['BRLBTC', 'BRLETH', 'BRLXRP']
+    assert report['failed'] == {}
+    assert upstream.calls == {'BRLBTC': 1, 'BRLETH': 3, 'BRLXRP': 1}
+    assert all(count_rows(sqlite_db, pair) == 1 for pair in ('BRLBTC', 'BRLETH', 'BRLXRP'))
+
+def test_pair_out_of_attempts_is_reported(sqlite_db, scheduler, mocker):
+    upstream = FlakyUpstream({'BRLXRP': 10})
+    mocker.patch('mb_mms.services.job.scheduler.MB_API.fetch_rate',
+                 side_effect=lambda pair, start, end: upstream(pair, start, end))
+    s = scheduler(max_retries=2, incremental=False)
+
+    report = s.compute_mms()
+
+    assert sorted(report['completed']) == ['BRLBTC', 'BRLETH']
+    assert report['failed'] == {'BRLXRP': 'BRLXRP unavailable'}
+    assert upstream.calls['BRLXRP'] == 3
+    assert s.failures == 1
+    assert count_rows(sqlite_db, 'BRLXRP') == 0
+
+def test_rerun_is_idempotent(sqlite_db, scheduler, mocker):
+    upstream = FlakyUpstream({})
+    mocker.patch('mb_mms.services.job.scheduler.MB_API.fetch_rate',
+                 side_effect=lambda pair, start, end: upstream(pair, start, end))
+    s = scheduler(incremental=False)
+
+    s.compute_mms()
+    report = s.compute_mms()
+
+    assert report['failed'] == {}
+    assert count_rows(sqlite_db, 'BRLBTC') == 1
+
+def test_pairs_after_a_lost_lease_are_aborted(sqlite_db, scheduler, mocker):
+    upstream = FlakyUpstream({})
+    mocker.patch('mb_mms.services.job.scheduler.MB_API.fetch_rate',
+                 side_effect=lambda pair, start, end: upstream(pair, start, end))
+    leading = iter([True, False, False])
+    s = scheduler(incremental=False, leading=lambda: next(leading))
+    failures = instruments.JOB_FAILURES.value()
+
+    report = s.compute_mms(workers=1)
+
+    assert sorted(report['completed']) == ['BRLBTC']
+    assert report['failed'] == {}
+    assert report['aborted'] == ['BRLETH', 'BRLXRP']
+    assert instruments.JOB_FAILURES.value() == failures
+    assert count_rows(sqlite_db, 'BRLETH') == 0
@@ -0,0 +1,133 @@
+import pytest
+from flask import Flask
+from unittest.mock import patch
+from sqlalchemy import select
+
+from mb_mms.models.checkpoints import BackfillCheckpoint
+from mb_mms.models.pair_averages import Base, MovingAverage, Pair
+from mb_mms.services.data import db
+from mb_mms.services.mb_api import backfill, commands
+from mb_mms.services.mb_api.mb_api import MB_API
+
+DAY = backfill.DAY
+ORIGIN = 1577836800  # 2020-01-01
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    Base.metadata.create_all(db.get_db_engine())
+    yield db.get_db_engine()
+    db.dispose_db_engine()
+
+def close_at(timestamp):
+    return 1000.0 + ((timestamp - ORIGIN) // DAY) % 37
+
+def fake_fetch(start, end, calls=None):
+    # One candle per day, inclusive on both ends like the upstream API
+    if calls is not None:
+        calls.append((start, end))
+    first = ORIGIN + max(0, -(-(start - ORIGIN) // DAY)) * DAY
+    return [(close_at(ts), ts) for ts in range(first, end + 1, DAY)]
+
+def stored_rows(engine, pair='BRLBTC'):
+    with engine.connect() as conn:
+        stmt = (
+            select(MovingAverage.timestamp, MovingAverage.mms_20, MovingAverage.mms_50, MovingAverage.mms_200)
+            .join(Pair)
+            .where(Pair.name == pair)
+            .order_by(MovingAverage.timestamp)
+        )
+        return [tuple(row) for row in conn.execute(stmt)]
+
+def expected_rows(start, end):
+    rates = fake_fetch(ORIGIN, end)
+    mms = MB_API().sliding_mms_multi(deltas=[20, 50, 200], rates=rates)
+    return [
+        (ts, mms[20][idx][0], mms[50][idx][0], mms[200][idx][0])
+        for idx, (_, ts) in enumerate(rates) if ts >= start
+    ]
+
+def assert_rows_equal(actual, expected):
+    assert [row[0] for row in actual] == [row[0] for row in expected]
+    for got, want in zip(actual, expected):
+        assert got[1:] == tuple(pytest.approx(v) if v is not None else None for v in want[1:])
+
+def test_iter_ranges():
+    assert list(backfill.iter_ranges(0, 9, 4)) == [(0, 3), (4, 7), (8, 9)]
+    with pytest.raises(ValueError):
+        list(backfill.iter_ranges(0, 9, 0))
+
+def test_fetch_chunks_drops_overlap():
+    chunks = list(backfill.fetch_chunks(lambda s, e: [(1.0, s), (1.0, e)], [(0, 5), (5, 9)]))
+    assert chunks == [[(1.0, 0), (1.0, 5)], [(1.0, 9)]]
+
+def test_compute_chunks_carries_windows_across_chunks():
+    rates = [(float(i), i) for i in range(30)]
+    chunked = list(backfill.compute_chunks('BRLBTC', [rates[:7], rates[7:19], rates[19:]], windows=(5,)))
+    flat = [row['mms_5'] for rows in chunked for row in rows]
+    whole = [value for value, _ in MB_API().sliding_mms(delta=5, rates=rates)]
+    assert flat == [pytest.approx(v) if v is not None else None for v in whole]
+
+def test_backfill_pair_matches_single_pass(sqlite_db):
+    start, end = ORIGIN + 300 * DAY, ORIGIN + 700 * DAY
+    written = backfill.backfill_pair(fake_fetch, 'BRLBTC', start, end, chunk_days=45, batch_size=50)
+
+    assert written == 401
+    assert_rows_equal(stored_rows(sqlite_db), expected_rows(start, end))
+
+def test_backfill_pair_resumes_from_checkpoint(sqlite_db):
+    start, end = ORIGIN + 300 * DAY, ORIGIN + 700 * DAY
+    calls = []
+
+    def flaky_fetch(s, e):
+        if len(calls) == 4:
+            raise RuntimeError('upstream down')
+        return fake_fetch(s, e, calls)
+
+    with pytest.raises(RuntimeError):
+        backfill.backfill_pair(flaky_fetch, 'BRLBTC', start, end, chunk_days=30)
+
+    with sqlite_db.connect() as conn:
+        checkpoint = backfill.get_checkpoint(conn, 'BRLBTC', start, end)
+    assert checkpoint == start + 3 * 30 * DAY - DAY
+    assert stored_rows(sqlite_db)[-1][0] == checkpoint
+
+    calls.clear()
+    written = backfill.backfill_pair(lambda s, e: fake_fetch(s, e, calls), 'BRLBTC', start, end, chunk_days=30)
+
+    assert written == 401 - 90
+    assert calls[0] == (checkpoint + 1 - 199 * DAY, checkpoint)
+    assert_rows_equal(stored_rows(sqlite_db), expected_rows(start, end))
+
+def test_backfill_pair_restart_ignores_checkpoint(sqlite_db):
+    start, end = ORIGIN + 300 * DAY, ORIGIN + 330 * DAY
+    backfill.backfill_pair(fake_fetch, 'BRLBTC', start, end)
+    assert backfill.backfill_pair(fake_fetch, 'BRLBTC', start, end) == 0
+    assert backfill.backfill_pair(fake_fetch, 'BRLBTC', start, end, resume=False) == 31
+
+def test_backfill_pair_checkpoint_is_per_range(sqlite_db):
+    later = (ORIGIN + 600 * DAY, ORIGIN + 630 * DAY)
+    backfill.backfill_pair(fake_fetch, 'BRLBTC', *later)
+
+    # An earlier range, and one overlapping the range already done, are backfilled in full
+    assert backfill.backfill_pair(fake_fetch, 'BRLBTC', ORIGIN + 300 * DAY, ORIGIN + 330 * DAY) == 31
+    assert backfill.backfill_pair(fake_fetch, 'BRLBTC', ORIGIN + 500 * DAY, ORIGIN + 700 * DAY) == 201
+    assert backfill.backfill_pair(fake_fetch, 'BRLBTC', *later) == 0
+
+def test_backfill_command(sqlite_db, monkeypatch):
+    monkeypatch.setenv('PAIRS', 'BRLBTC,BRLETH')
+    app = Flask(__name__)
+    app.cli.add_command(commands.backfill)
+
+    with patch('mb_mms.services.mb_api.commands.MB_API.fetch_rate',
+               side_effect=lambda pair, start, end: fake_fetch(start, end)):
+        result = app.test_cli_runner().invoke(
+            args=['backfill', '--start', '2020-06-01', '--end', '2020-06-30', '--chunk-days', '7']
+        )
+
+    assert 'Backfill finished.' in result.output
+    assert 'BRLBTC:' in result.output and 'BRLETH:' in result.output
+    with sqlite_db.connect() as conn:
+        assert len(conn.execute(select(BackfillCheckpoint.pair)).all()) == 2
@@ -0,0 +1,121 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from mb_mms.services.mb_api import candle_store
+from mb_mms.services.mb_api.candle_store import DAY, CandleStore, merge_ranges, subtract_ranges
+from mb_mms.services.mb_api.mb_api import MB_API
+
+NOW = 1_000 * DAY
+
+
+@pytest.fixture
+def upstream():
+    # One candle per day; the range is inclusive like the MB API
+    def fetch(start, end):
+        first = -(-start // DAY) * DAY
+        return [(ts / DAY, ts) for ts in range(first, end + 1, DAY)]
+    return MagicMock(side_effect=fetch)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CandleStore(str(tmp_path), clock=lambda: NOW)
+
+
+def test_merge_and_subtract_ranges():
+    assert merge_ranges([(10, 20), (1, 5), (6, 8), (19, 25)]) == [(1, 8), (10, 25)]
+    covered = [(1, 8), (10, 25)]
+    assert subtract_ranges(0, 30, covered) == [(0, 0), (9, 9), (26, 30)]
+    assert subtract_ranges(2, 7, covered) == []
+    assert subtract_ranges(26, 27, []) == [(26, 27)]
+
+
+def test_get_fetches_only_missing_ranges(store, upstream):
+    assert store.get('BRLBTC', 10 * DAY, 20 * DAY, upstream) == upstream(10 * DAY, 20 * DAY)
+    upstream.reset_mock()
+
+    rates = store.get('BRLBTC', 5 * DAY, 25 * DAY, upstream)
+    assert [ts for _, ts in rates] == list(range(5 * DAY, 25 * DAY + 1, DAY))
+    assert [call.args for call in upstream.call_args_list] == [(5 * DAY, 10 * DAY - 1), (20 * DAY + 1, 25 * DAY)]
+
+    upstream.reset_mock()
+    assert store.get('BRLBTC', 12 * DAY, 14 * DAY, upstream) == [(12.0, 12 * DAY), (13.0, 13 * DAY), (14.0, 14 * DAY)]
+    upstream.assert_not_called()
+    assert (store.fetches, store.hits) == (3, 1)
+
+
+def test_store_persists_across_instances(tmp_path, upstream):
+    CandleStore(str(tmp_path), clock=lambda: NOW).get('BRLBTC', 10 * DAY, 20 * DAY, upstream)
+    upstream.reset_mock()
+
+    reopened = CandleStore(str(tmp_path), clock=lambda: NOW)
+    assert len(reopened.get('BRLBTC', 10 * DAY, 20 * DAY, upstream)) == 11
+    upstream.assert_not_called()
+
+
+def test_unsettled_candles_are_fetched_again(store, upstream):
+    store.get('BRLBTC', NOW - 3 * DAY, NOW, upstream)
+    assert store.missing('BRLBTC', NOW - 3 * DAY, NOW) == [(NOW - DAY + 1, NOW)]
+
+    upstream.side_effect = lambda start, end: [(42.0, NOW)]
+    assert store.get('BRLBTC', NOW - DAY, NOW, upstream)[-1] == (42.0, NOW)
+
+
+def test_failed_fetch_keeps_earlier_ranges(store, upstream):
+    store.add('BRLBTC', upstream(10 * DAY, 20 * DAY), 10 * DAY, 20 * DAY)
+    fetch = MagicMock(side_effect=[upstream(0, 10 * DAY - 1), ConnectionError('down')])
+
+    with pytest.raises(ConnectionError):
+        store.get('BRLBTC', 0, 30 * DAY, fetch)
+    assert store.missing('BRLBTC', 0, 30 * DAY) == [(20 * DAY + 1, 30 * DAY)]
+
+
+def test_closes_are_read_from_the_mapping(tmp_path, store):
+    store.add('BRLBTC', [(3.0, 3 * DAY), (1.0, DAY)], DAY, 3 * DAY)
+    # Older and refetched candles are appended out of order; the latest record wins
+    store.add('BRLBTC', [(2.0, 2 * DAY), (1.5, DAY)], DAY, 2 * DAY)
+
+    expected = [(1.5, DAY), (2.0, 2 * DAY), (3.0, 3 * DAY)]
+    assert store.read('BRLBTC', 0, 4 * DAY) == expected
+    assert CandleStore(str(tmp_path)).read('BRLBTC', 0, 4 * DAY) == expected
+    pair = store._pair('BRLBTC')
+    assert list(pair.positions) == [3, 2, 0]
+
+
+def test_partial_tail_record_is_ignored(tmp_path, store, upstream):
+    store.add('BRLBTC', [(1.5, DAY)], DAY, DAY)
+    with open(tmp_path / 'BRLBTC.candles', 'ab') as file:
+        file.write(b'\x00' * 5)
+    assert CandleStore(str(tmp_path)).read('BRLBTC', 0, 2 * DAY) == [(1.5, DAY)]
+
+
+def test_append_after_partial_tail_record(tmp_path, store):
+    store.add('BRLBTC', [(1.5, DAY)], DAY, DAY)
+    with open(tmp_path / 'BRLBTC.candles', 'ab') as file:
+        file.write(b'\x00' * 5)
+    store.add('BRLBTC', [(2.5, 2 * DAY)], 2 * DAY, 2 * DAY)
+
+    assert store.read('BRLBTC', 0, 3 * DAY) == [(1.5, DAY), (2.5, 2 * DAY)]
+    assert CandleStore(str(tmp_path)).read('BRLBTC', 0, 3 * DAY) == [(1.5, DAY), (2.5, 2 * DAY)]
+
+
+def test_invalid_pair(store, upstream):
+    with pytest.raises(ValueError):
+        store.get('../etc', 0, DAY, upstream)
+
+
+def test_fetch_rate_uses_store(monkeypatch, tmp_path):
+    monkeypatch.setenv('MB_CANDLE_STORE', str(tmp_path))
+    candle_store.reset_candle_store()
+    try:
+        with patch.object(MB_API, 'download_rate', return_value=[(1.5, DAY)]) as download:
+            mb = MB_API()
+            assert mb.fetch_rate('BRLBTC', DAY, 2 * DAY) == [(1.5, DAY)]
+            assert mb.fetch_rate('BRLBTC', DAY, 2 * DAY) == [(1.5, DAY)]
+            download.assert_called_once_with(pair='BRLBTC', start=DAY, end=2 * DAY)
+    finally:
+        candle_store.reset_candle_store()
+
+    monkeypatch.delenv('MB_CANDLE_STORE')
+    assert candle_store.get_candle_store() is None
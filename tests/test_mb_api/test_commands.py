@@ -0,0 +1,56 @@
+from unittest.mock import patch
+import pytest
+from flask import Flask
+from sqlalchemy import func, select
+
+from mb_mms.models.pair_averages import Base, MovingAverage, Pair
+from mb_mms.services.data import db
+from mb_mms.services.mb_api import commands
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch, tmp_path):
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    monkeypatch.setenv('PAIRS', 'BRLBTC,BRLETH')
+    db.dispose_db_engine()
+    Base.metadata.create_all(db.get_db_engine())
+    yield db.get_db_engine()
+    db.dispose_db_engine()
+
+@pytest.fixture
+def runner():
+    app = Flask(__name__)
+    app.cli.add_command(commands.populate_db)
+    return app.test_cli_runner()
+
+@pytest.fixture
+def rates():
+    return [(100.0 + idx, 1638316800 + idx * 86400) for idx in range(250)]
+
+def count_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(MovingAverage)).scalar()
+
+def test_populate_db_rerun_is_idempotent(sqlite_db, runner, rates):
+    with patch('mb_mms.services.mb_api.commands.MB_API.fetch_rate', return_value=rates):
+        result = runner.invoke(args=['populate-db', '--batch-size', '64'])
+        assert 'Database populated.' in result.output
+
+        result = runner.invoke(args=['populate-db'])
+        assert 'Database populated.' in result.output
+
+    assert count_rows(sqlite_db) == 500
+
+    with sqlite_db.connect() as conn:
+        row = conn.execute(
+            select(MovingAverage.mms_20, MovingAverage.mms_200)
+            .join(Pair)
+            .where(Pair.name == 'BRLETH', MovingAverage.timestamp == rates[-1][1])
+        ).one()
+    assert row.mms_20 == pytest.approx(sum(r[0] for r in rates[-20:]) / 20)
+    assert row.mms_200 == pytest.approx(sum(r[0] for r in rates[-200:]) / 200)
+
+def test_populate_db_invalid_batch_size(sqlite_db, runner):
+    result = runner.invoke(args=['populate-db', '--batch-size', '0'])
+    assert result.exit_code != 0
+    assert count_rows(sqlite_db) == 0
@@ -0,0 +1,75 @@
+import threading
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+from requests import Session
+
+from mb_mms.services.mb_api import fetcher
+from mb_mms.services.mb_api.mb_api import MB_API
+
+
+@pytest.fixture(autouse=True)
+def reset_fetcher():
+    fetcher.reset()
+    yield
+    fetcher.reset()
+
+@pytest.fixture
+def mock_mb_api_env(monkeypatch):
+    monkeypatch.setenv('MB_API', 'https://api.fake.com/{}?from{}&to{}')
+
+def test_get_http_session_is_shared():
+    session = fetcher.get_http_session()
+    assert fetcher.get_http_session() is session
+    assert session.headers['User-Agent'] == fetcher.USER_AGENT
+
+def test_run_concurrently_isolates_errors():
+    def work(key):
+        if key == 'BAD':
+            raise RuntimeError('boom')
+        return key.lower()
+
+    results, errors = fetcher.run_concurrently(work, ['BRLBTC', 'BAD', 'BRLETH'], workers=2)
+    assert results == {'BRLBTC': 'brlbtc', 'BRLETH': 'brleth'}
+    assert list(errors) == ['BAD']
+    assert isinstance(errors['BAD'], RuntimeError)
+
+def test_run_concurrently_empty():
+    assert fetcher.run_concurrently(lambda key: key, []) == ({}, {})
+
+def test_host_slot_limits_concurrency(monkeypatch):
+    monkeypatch.setenv('MB_API_HOST_CONCURRENCY', '2')
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def work(key):
+        with fetcher.host_slot('https://api.fake.com/x'):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.02)
+            with lock:
+                state['running'] -= 1
+
+    fetcher.run_concurrently(work, range(8), workers=8)
+    assert state['peak'] == 2
+
+def test_request_rates_per_pair_isolation(mock_mb_api_env):
+    def get(url, timeout):
+        response = MagicMock()
+        if 'BAD' in url:
+            response.status_code = 500
+            response.raise_for_status.side_effect = RuntimeError('server error')
+        else:
+            response.status_code = 200
+            response.json.return_value = {'candles': [{'close': 1.5, 'timestamp': 10}]}
+        return response
+
+    with patch('mb_mms.services.mb_api.fetcher.get_http_session') as mock_session:
+        mock_session.return_value = MagicMock(spec=Session)
+        mock_session.return_value.get.side_effect = get
+
+        rates, errors = MB_API().request_rates(pairs=['BRLBTC', 'BAD'], start=0, end=10)
+
+    assert rates == {'BRLBTC': [(1.5, 10)]}
+    assert list(errors) == ['BAD']
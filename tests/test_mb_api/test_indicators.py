@@ -0,0 +1,86 @@
+import random
+import pytest
+
+from mb_mms.services.mb_api import indicators
+from mb_mms.services.mb_api.indicators import EMA, SMA, WMA
+
+WINDOWS = [1, 2, 9, 20, 200]
+
+
+@pytest.fixture
+def closes():
+    rng = random.Random(11)
+    return [rng.uniform(100000, 400000) for _ in range(1500)]
+
+def reference_wma(closes, window):
+    weights = range(1, window + 1)
+    return [
+        None if idx < window - 1 else
+        sum(w * c for w, c in zip(weights, closes[idx - window + 1:idx + 1])) / sum(weights)
+        for idx in range(len(closes))
+    ]
+
+def reference_ema(closes, window):
+    alpha, out, value = 2 / (window + 1), [], None
+    for idx, close in enumerate(closes):
+        if idx == window - 1:
+            value = sum(closes[:window]) / window
+        elif value is not None:
+            value = alpha * close + (1 - alpha) * value
+        out.append(value)
+    return out
+
+def assert_series(values, expected):
+    assert len(values) == len(expected)
+    for value, expected_value in zip(values, expected):
+        if expected_value is None:
+            assert value is None
+        else:
+            assert value == pytest.approx(expected_value, rel=1e-9)
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+@pytest.mark.parametrize('window', WINDOWS)
+@pytest.mark.parametrize('cls,reference', [(WMA, reference_wma), (EMA, reference_ema)])
+def test_compute_and_update_match_reference(closes, monkeypatch, use_numpy, window, cls, reference):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(indicators, 'np', None)
+    expected = reference(closes, window)
+
+    assert_series(cls(window).compute(closes), expected)
+    streaming = cls(window)
+    assert_series([streaming.update(close) for close in closes], expected)
+
+@pytest.mark.parametrize('cls', [SMA, EMA, WMA])
+def test_short_and_empty_series(cls):
+    assert cls(5).compute([]) == []
+    assert cls(5).compute([1.0, 2.0]) == [None, None]
+
+@pytest.mark.parametrize('cls', [SMA, EMA, WMA])
+def test_state_round_trip_and_resume(closes, cls):
+    head, tail = closes[:700], closes[700:]
+    full = cls(50).compute(closes)
+
+    restored = cls(50).restore(cls(50).resume(head, cls(50).compute(head)).state())
+    assert_series([restored.update(close) for close in tail], full[700:])
+
+def test_resume_before_warmup():
+    ema = EMA(5).resume([1.0, 2.0], [None, None])
+    assert [ema.update(close) for close in (3.0, 4.0, 5.0)] == [None, None, 3.0]
+
+def test_create_and_parse_specs(monkeypatch):
+    assert isinstance(indicators.create('ema', 3), EMA)
+    assert indicators.parse_specs(' ema:20, wma:5,') == [('ema', 20), ('wma', 5)]
+    for spec in ('rsi:14', 'ema', 'ema:0'):
+        with pytest.raises(ValueError):
+            indicators.parse_specs(spec)
+
+    monkeypatch.setenv('MMS_INDICATORS', 'wma:9')
+    assert indicators.configured_specs() == [('wma', 9)]
+    monkeypatch.delenv('MMS_INDICATORS')
+    assert ('ema', 200) in indicators.configured_specs()
+
+def test_indicator_is_abstract():
+    with pytest.raises(TypeError):
+        indicators.Indicator(3)
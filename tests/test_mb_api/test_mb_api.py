@@ -2,9 +2,11 @@ from unittest.mock import patch, MagicMock
 import pytest
 from requests import Session, HTTPError
 from http import HTTPStatus
+from mb_mms.services.cache import backends
 from mb_mms.services.mb_api.mb_api import MB_API
 from mb_mms.models.pair_averages import MovingAverage
-from sqlalchemy import select
+from sqlalchemy import event, select
+from mb_mms.services.data import db
 from sqlalchemy.engine import Connection
 
 
@@ -12,6 +14,12 @@ from sqlalchemy.engine import Connection
 def mock_mb_api_env(monkeypatch):
     monkeypatch.setenv('MB_API', 'https://api.fake.com/{}?from{}&to{}')
 
+@pytest.fixture(autouse=True)
+def reset_mms_cache():
+    backends.reset_backend()
+    yield
+    backends.reset_backend()
+
 @pytest.fixture
 def mb_api_instance():
     # Create an instance of the MB_API class
@@ -20,7 +28,7 @@ def mb_api_instance():
 def test_request_rate_http_error(mock_mb_api_env):
     mb_api = MB_API()
 
-    with patch('requests.Session') as mock_session:
+    with patch('mb_mms.services.mb_api.fetcher.get_http_session') as mock_session:
         mock_session_instance = MagicMock(spec=Session)
         mock_session.return_value = mock_session_instance
 
@@ -35,7 +43,7 @@ def test_request_rate_http_error(mock_mb_api_env):
 def test_request_rate_value_error(mock_mb_api_env):
     mb_api = MB_API()
 
-    with patch('requests.Session') as mock_session:
+    with patch('mb_mms.services.mb_api.fetcher.get_http_session') as mock_session:
         mock_session_instance = MagicMock(spec=Session)
         mock_session.return_value = mock_session_instance
 
@@ -47,7 +55,7 @@ def test_request_rate_value_error(mock_mb_api_env):
 def test_request_rate_unexpected_error(mock_mb_api_env):
     mb_api = MB_API()
 
-    with patch('requests.Session') as mock_session:
+    with patch('mb_mms.services.mb_api.fetcher.get_http_session') as mock_session:
         mock_session_instance = MagicMock(spec=Session)
         mock_session.return_value = mock_session_instance
 
@@ -113,17 +121,16 @@ def test_sliding_mms_exception_handling(mb_api_instance):
 
 def test_search_mms_precision_20(mb_api_instance):
     # Mock the database connection and query execution
-    with patch('mb_mms.services.mb_api.mb_api.db.get_db_engine') as mock_get_db_engine:
+    with patch('mb_mms.services.mb_api.mb_api.db.get_db_engine') as mock_get_db_engine, \
+         patch('mb_mms.services.mb_api.mb_api.pair_store.get_id', return_value=7) as mock_get_id:
         # Create a mock connection
         mock_conn = MagicMock(spec=Connection)
         mock_get_db_engine.return_value.connect.return_value.__enter__.return_value = mock_conn
 
         # Mock the query result
         mock_result = MagicMock()
-        mock_result.all.return_value = [
-            MagicMock(_asdict=lambda: {'timestamp': 1638316800, 'mms': 1.23}),
-            MagicMock(_asdict=lambda: {'timestamp': 1638403200, 'mms': 1.24}),
-        ]
+        mock_result.keys.return_value = ['timestamp', 'mms']
+        mock_result.all.return_value = [(1638316800, 1.23), (1638403200, 1.24)]
         mock_conn.execute.return_value = mock_result
 
         # Call the search_mms method
@@ -134,12 +141,13 @@ def test_search_mms_precision_20(mb_api_instance):
         # Assert that the query was executed with the correct parameters
         expected_stmt = (
             select(MovingAverage.timestamp, MovingAverage.mms_20.label('mms'))
-            .where(MovingAverage.pair == 'BTC-USD')
+            .where(MovingAverage.pair_id == 7)
             .where(MovingAverage.timestamp.between(1638316800, 1638403200))
         )
 
         # Compare the actual and expected statements
         assert str(actual_stmt) == str(expected_stmt)
+        mock_get_id.assert_called_once_with(mock_conn, 'BTC-USD')
 
         # Assert that the result is as expected
         expected_result = [
@@ -150,17 +158,16 @@ def test_search_mms_precision_20(mb_api_instance):
 
 def test_search_mms_precision_50(mb_api_instance):
     # Mock the database connection and query execution
-    with patch('mb_mms.services.mb_api.mb_api.db.get_db_engine') as mock_get_db_engine:
+    with patch('mb_mms.services.mb_api.mb_api.db.get_db_engine') as mock_get_db_engine, \
+         patch('mb_mms.services.mb_api.mb_api.pair_store.get_id', return_value=7) as mock_get_id:
         # Create a mock connection
         mock_conn = MagicMock(spec=Connection)
         mock_get_db_engine.return_value.connect.return_value.__enter__.return_value = mock_conn
 
         # Mock the query result
         mock_result = MagicMock()
-        mock_result.all.return_value = [
-            MagicMock(_asdict=lambda: {'timestamp': 1638316800, 'mms': 1.23}),
-            MagicMock(_asdict=lambda: {'timestamp': 1638403200, 'mms': 1.24}),
-        ]
+        mock_result.keys.return_value = ['timestamp', 'mms']
+        mock_result.all.return_value = [(1638316800, 1.23), (1638403200, 1.24)]
         mock_conn.execute.return_value = mock_result
 
         # Call the search_mms method
@@ -171,12 +178,13 @@ def test_search_mms_precision_50(mb_api_instance):
         # Assert that the query was executed with the correct parameters
         expected_stmt = (
             select(MovingAverage.timestamp, MovingAverage.mms_50.label('mms'))
-            .where(MovingAverage.pair == 'BTC-USD')
+            .where(MovingAverage.pair_id == 7)
             .where(MovingAverage.timestamp.between(1638316800, 1638403200))
         )
 
         # Compare the actual and expected statements
         assert str(actual_stmt) == str(expected_stmt)
+        mock_get_id.assert_called_once_with(mock_conn, 'BTC-USD')
 
         # Assert that the result is as expected
         expected_result = [
@@ -187,17 +195,16 @@ def test_search_mms_precision_50(mb_api_instance):
 
 def test_search_mms_precision_200(mb_api_instance):
     # Mock the database connection and query execution
-    with patch('mb_mms.services.mb_api.mb_api.db.get_db_engine') as mock_get_db_engine:
+    with patch('mb_mms.services.mb_api.mb_api.db.get_db_engine') as mock_get_db_engine, \
+         patch('mb_mms.services.mb_api.mb_api.pair_store.get_id', return_value=7) as mock_get_id:
         # Create a mock connection
         mock_conn = MagicMock(spec=Connection)
         mock_get_db_engine.return_value.connect.return_value.__enter__.return_value = mock_conn
 
         # Mock the query result
         mock_result = MagicMock()
-        mock_result.all.return_value = [
-            MagicMock(_asdict=lambda: {'timestamp': 1638316800, 'mms': 1.23}),
-            MagicMock(_asdict=lambda: {'timestamp': 1638403200, 'mms': 1.24}),
-        ]
+        mock_result.keys.return_value = ['timestamp', 'mms']
+        mock_result.all.return_value = [(1638316800, 1.23), (1638403200, 1.24)]
         mock_conn.execute.return_value = mock_result
 
         # Call the search_mms method
@@ -208,12 +215,13 @@ def test_search_mms_precision_200(mb_api_instance):
         # Assert that the query was executed with the correct parameters
         expected_stmt = (
             select(MovingAverage.timestamp, MovingAverage.mms_200.label('mms'))
-            .where(MovingAverage.pair == 'BTC-USD')
+            .where(MovingAverage.pair_id == 7)
             .where(MovingAverage.timestamp.between(1638316800, 1638403200))
         )
 
         # Compare the actual and expected statements
         assert str(actual_stmt) == str(expected_stmt)
+        mock_get_id.assert_called_once_with(mock_conn, 'BTC-USD')
 
         # Assert that the result is as expected
         expected_result = [
@@ -221,3 +229,64 @@ def test_search_mms_precision_200(mb_api_instance):
             {'timestamp': 1638403200, 'mms': 1.24},
         ]
         assert result == expected_result
+
+def test_search_mms_uses_cache(mb_api_instance):
+    with patch.object(MB_API, 'query_mms', return_value=[{'timestamp': 1638316800, 'mms': 1.23}]) as mock_query:
+        first = mb_api_instance.search_mms('BTC-USD', 1638316800, 1638403200, 20)
+        second = mb_api_instance.search_mms('BTC-USD', 1638316800, 1638403200, 20)
+        mb_api_instance.search_mms('BTC-USD', 1638316800, 1638403200, 50)
+
+        assert first == second == [{'timestamp': 1638316800, 'mms': 1.23}]
+        assert mock_query.call_count == 2
+
+        backends.invalidate_pair('BTC-USD')
+        mb_api_instance.search_mms('BTC-USD', 1638316800, 1638403200, 20)
+        assert mock_query.call_count == 3
+
+def test_search_mms_invalid_precision_not_cached(mb_api_instance):
+    with patch.object(MB_API, 'query_window', side_effect=ValueError) as mock_query:
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                mb_api_instance.search_mms('BTC-USD', 1638316800, 1638403200, 0)
+        assert mock_query.call_count == 2
+
+def test_search_mms_other_windows_use_closes(mb_api_instance):
+    with patch.object(MB_API, 'query_mms') as mock_fixed, \
+         patch.object(MB_API, 'query_window', return_value=[{'timestamp': 1638316800, 'mms': 1.5}]) as mock_window:
+        assert mb_api_instance.search_mms('BTC-USD', 1638316800, 1638403200, 9) == [{'timestamp': 1638316800, 'mms': 1.5}]
+        mb_api_instance.search_mms('BTC-USD', 1638316800, 1638403200, 9)
+
+        mock_window.assert_called_once_with(pair='BTC-USD', start=1638316800, end=1638403200, window=9)
+        mock_fixed.assert_not_called()
+
+def test_search_mms_batch(mb_api_instance, monkeypatch, tmp_path):
+    from mb_mms.models.pair_averages import Base
+    monkeypatch.setenv('DB_URL', f'sqlite:///{tmp_path}/mb.db')
+    db.dispose_db_engine()
+    engine = db.get_db_engine()
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        db.upsert_moving_averages(conn, [
+            {'pair': pair, 'timestamp': ts, 'mms_20': ts + 0.5, 'mms_50': ts + 0.25, 'mms_200': None}
+            for pair in ('BRLBTC', 'BRLETH', 'BRLXRP') for ts in (1, 2, 3)
+        ])
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    result = mb_api_instance.search_mms_batch(['BRLBTC', 'BRLETH', 'BRLLTC'], 2, 3, [200, 20])
+    db.dispose_db_engine()
+
+    # The pairs written by this process are cached, so only the unknown BRLLTC is looked up
+    assert len(statements) == 2
+    assert 'FROM pairs' in statements[0]
+    assert result == {
+        'BRLBTC': [{'timestamp': 2, 'mms_200': None, 'mms_20': 2.5}, {'timestamp': 3, 'mms_200': None, 'mms_20': 3.5}],
+        'BRLETH': [{'timestamp': 2, 'mms_200': None, 'mms_20': 2.5}, {'timestamp': 3, 'mms_200': None, 'mms_20': 3.5}],
+        'BRLLTC': [],
+    }
+
+def test_search_mms_batch_invalid_precision(mb_api_instance):
+    with pytest.raises(ValueError):
+        mb_api_instance.search_mms_batch(['BRLBTC'], 1, 2, [20, 10])
+    with pytest.raises(ValueError):
+        mb_api_instance.search_mms_batch([], 1, 2, [20])
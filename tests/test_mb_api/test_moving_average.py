@@ -0,0 +1,58 @@
+import math
+import random
+import pytest
+
+from mb_mms.services.mb_api.mb_api import MB_API
+from mb_mms.services.mb_api.moving_average import RunningMean, sliding_means
+
+
+@pytest.fixture
+def rates():
+    rng = random.Random(42)
+    return [(rng.uniform(100000, 400000), 1638316800 + idx * 86400) for idx in range(500)]
+
+def test_running_mean_invalid_window():
+    with pytest.raises(ValueError):
+        RunningMean(0)
+
+def test_running_mean_fills_window():
+    running = RunningMean(3)
+    assert running.push(1.0) is None
+    assert running.push(2.0) is None
+    assert running.push(3.0) == pytest.approx(2.0)
+    assert running.push(4.0) == pytest.approx(3.0)
+
+def test_sliding_means_matches_naive_sum(rates):
+    # Compare each window against a brute force recomputation
+    result = sliding_means(rates=rates, deltas=[20, 50, 200])
+
+    for delta, series in result.items():
+        assert len(series) == len(rates)
+        for idx, (value, timestamp) in enumerate(series):
+            assert timestamp == rates[idx][1]
+            if idx < delta - 1:
+                assert value is None
+            else:
+                window = [rate[0] for rate in rates[idx - delta + 1:idx + 1]]
+                assert value == pytest.approx(math.fsum(window) / delta, rel=1e-12)
+
+def test_sliding_means_bounded_drift():
+    # Alternating huge and tiny values make a plain running sum drift quickly
+    rates = [((1e16 if idx % 2 else 1.0), idx) for idx in range(10001)]
+    series = sliding_means(rates=rates, deltas=[2])[2]
+
+    assert series[-1][0] == pytest.approx((1e16 + 1.0) / 2, rel=1e-15)
+
+def test_sliding_mms_multi_matches_mms(rates):
+    # Every full window must match MB_API.mms over the same slice
+    mb = MB_API()
+    multi = mb.sliding_mms_multi(deltas=[20, 50, 200], rates=rates)
+
+    for delta in (20, 50, 200):
+        for idx in range(delta - 1, len(rates)):
+            value, timestamp = mb.mms(rates[idx - delta + 1:idx + 1])
+            assert multi[delta][idx] == (pytest.approx(value), timestamp)
+
+def test_sliding_mms_multi_skips_invalid_windows(rates):
+    result = MB_API().sliding_mms_multi(deltas=[0, 20], rates=rates)
+    assert list(result.keys()) == [20]
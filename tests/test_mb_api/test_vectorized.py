@@ -0,0 +1,78 @@
+import random
+import pytest
+
+from mb_mms.services.mb_api import vectorized
+from mb_mms.services.mb_api.mb_api import MB_API
+
+WINDOWS = [1, 9, 20, 50, 200]
+
+
+@pytest.fixture
+def rates():
+    rng = random.Random(7)
+    return [(rng.uniform(100000, 400000), 1638316800 + idx * 86400) for idx in range(1500)]
+
+def reference(rates, delta):
+    # The original per-index implementation: slice and average every window
+    mb = MB_API()
+    return [
+        (None, rates[idx][1]) if idx < delta - 1 else mb.mms(rates[idx - delta + 1:idx + 1])
+        for idx in range(len(rates))
+    ]
+
+def assert_parity(series, expected):
+    assert len(series) == len(expected)
+    for (value, timestamp), (expected_value, expected_timestamp) in zip(series, expected):
+        assert timestamp == expected_timestamp
+        if expected_value is None:
+            assert value is None
+        else:
+            assert value == pytest.approx(expected_value, rel=1e-9)
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_sliding_means_columns_parity(rates, monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(vectorized, 'np', None)
+
+    closes, timestamps = [r[0] for r in rates], [r[1] for r in rates]
+    result = vectorized.sliding_means_columns(closes=closes, timestamps=timestamps, deltas=WINDOWS)
+
+    assert sorted(result) == WINDOWS
+    for delta in WINDOWS:
+        assert_parity(result[delta], reference(rates, delta))
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_sliding_means_columns_short_series(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(vectorized, 'np', None)
+
+    result = vectorized.sliding_means_columns(closes=[1.0, 2.0], timestamps=[10, 20], deltas=[3])
+    assert result == {3: [(None, 10), (None, 20)]}
+
+    result = vectorized.sliding_means_columns(closes=[], timestamps=[], deltas=[3])
+    assert result == {3: []}
+
+def test_sliding_means_columns_length_mismatch():
+    with pytest.raises(ValueError):
+        vectorized.sliding_means_columns(closes=[1.0], timestamps=[], deltas=[1])
+
+def test_sliding_means_arrays_without_numpy(monkeypatch):
+    monkeypatch.setattr(vectorized, 'np', None)
+    assert not vectorized.has_numpy()
+    with pytest.raises(RuntimeError):
+        vectorized.sliding_means_arrays([1.0], [1])
+
+def test_sliding_mms_columns_matches_sliding_mms(rates):
+    mb = MB_API()
+    closes, timestamps = [r[0] for r in rates], [r[1] for r in rates]
+    result = mb.sliding_mms_columns(deltas=[20, 50, 200], closes=closes, timestamps=timestamps)
+
+    for delta in (20, 50, 200):
+        assert_parity(result[delta], mb.sliding_mms(delta=delta, rates=rates))
+
+def test_sliding_mms_columns_error(rates):
+    assert MB_API().sliding_mms_columns(deltas=[20], closes=[1.0], timestamps=[]) == {}
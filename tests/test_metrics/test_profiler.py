@@ -0,0 +1,50 @@
+import pstats
+
+from flask import Flask
+
+from mb_mms.api.routes import currency_bp
+from mb_mms.services.metrics import profiler
+from mb_mms.services.metrics.profiler import SamplingProfiler, directory_hook
+
+
+def work():
+    return sum(range(1000))
+
+def test_sampling_rate():
+    profiles = []
+    sampled = SamplingProfiler(rate=0.5, hook=lambda name, stats: profiles.append(name), rng=lambda: 0.4)
+    skipped = SamplingProfiler(rate=0.5, hook=lambda name, stats: profiles.append(name), rng=lambda: 0.6)
+
+    assert skipped.start() is None
+    profile = sampled.start()
+    assert profile is not None
+    # One request per process at a time
+    assert sampled.start() is None
+    work()
+    sampled.stop(profile, 'work')
+    assert profiles == ['work']
+    assert SamplingProfiler(rate=0.0, hook=lambda *_: None).start() is None
+
+def test_directory_hook(tmp_path):
+    sampler = SamplingProfiler(rate=1.0, hook=directory_hook(str(tmp_path)))
+    profile = sampler.start()
+    work()
+    sampler.stop(profile, 'mms.search/../x')
+
+    (path,) = tmp_path.iterdir()
+    assert path.name.endswith('-mms.search_.._x.prof')
+    assert pstats.Stats(str(path)).total_calls > 0
+
+def test_requests_are_profiled(monkeypatch):
+    profiles = []
+    profiler.reset_profiler()
+    profiler.set_profile_hook(lambda name, stats: profiles.append((name, stats.total_calls)), rate=1.0)
+    try:
+        app = Flask(__name__)
+        app.register_blueprint(currency_bp)
+        app.test_client().get('/v1/')
+    finally:
+        profiler.reset_profiler()
+
+    assert [name for name, _ in profiles] == ['mms.root']
+    assert profiles[0][1] > 0
@@ -0,0 +1,61 @@
+import pytest
+
+from mb_mms.services.metrics.registry import Registry
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+def test_histogram_renders_cumulative_buckets(registry):
+    histogram = registry.histogram('test_seconds', 'Test latency.', ['route'], buckets=(0.1, 1.0))
+    histogram.observe(0.05, 'a')
+    histogram.observe(0.5, 'a')
+    histogram.observe(2.0, 'a')
+    histogram.observe(0.1, 'b')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP test_seconds Test latency.', '# TYPE test_seconds histogram']
+    assert 'test_seconds_bucket{route="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{route="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_sum{route="a"} 2.55' in lines
+    assert 'test_seconds_count{route="a"} 3' in lines
+    # Bucket bounds are inclusive
+    assert 'test_seconds_bucket{route="b",le="0.1"} 1' in lines
+
+def test_histogram_time_observes_on_error(registry):
+    histogram = registry.histogram('test_seconds', 'Test latency.')
+    with pytest.raises(RuntimeError):
+        with histogram.time():
+            raise RuntimeError
+    assert histogram.count() == 1
+
+def test_counter_and_label_checks(registry):
+    counter = registry.counter('test_total', 'Test count.', ['kind'])
+    counter.inc(2, 'x')
+    counter.inc(1, 'x')
+    assert counter.value('x') == 3
+    assert 'test_total{kind="x"} 3' in registry.render()
+
+    with pytest.raises(ValueError):
+        counter.inc(1)
+    with pytest.raises(ValueError):
+        registry.counter('test_total', 'Again.')
+
+def test_label_values_are_escaped(registry):
+    counter = registry.counter('test_total', 'Test count.', ['path'])
+    counter.inc(1, 'a"b\\c\nd')
+    assert 'test_total{path="a\\"b\\\\c\\nd"} 1' in registry.render()
+
+def test_collectors_and_reset(registry):
+    counter = registry.counter('test_total', 'Test count.')
+    counter.inc()
+    registry.register_collector(lambda: [('test_size', 'gauge', 'Test size.', {'backend': 'memory'}, 3)])
+    registry.register_collector(lambda: 1 / 0)
+
+    body = registry.render()
+    assert '# TYPE test_size gauge\ntest_size{backend="memory"} 3' in body
+
+    registry.reset()
+    assert 'test_total 1' not in registry.render()